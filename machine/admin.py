@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Student, Product, AmountInserted, ChangeReturn, Order
+from .models import Student, Product, AmountInserted, ChangeReturn, Order, CashBox
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -18,16 +18,25 @@ class ProductAdmin(admin.ModelAdmin):
 class AmountInsertedAdmin(admin.ModelAdmin):
     list_display = ('student', 'date_time', 'total_amount', 'notes_200', 'notes_100', 'notes_50', 'notes_25',
                     'coins_20', 'coins_10', 'coins_5', 'coins_1')
+    list_select_related = ('student',)
 
 
 @admin.register(ChangeReturn)
 class ChangeReturnAdmin(admin.ModelAdmin):
     list_display = ('student', 'date_time', 'total_return', 'notes_200', 'notes_100', 'notes_50', 'notes_25',
                     'coins_20', 'coins_10', 'coins_5', 'coins_1')
+    list_select_related = ('student',)
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('student', 'product', 'date_time', 'amount_inserted', 'balance', 'total_purchase')
     list_filter = ('date_time', 'student')
+    list_select_related = ('student', 'product')
     search_fields = ('student__name', 'product__name')
+
+
+@admin.register(CashBox)
+class CashBoxAdmin(admin.ModelAdmin):
+    list_display = ('denomination', 'count')
+    list_editable = ('count',)
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Now
+from .models import Product
+from .money import Money
+import logging
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'machine:catalog:version'
+
+# Columns a bulk upsert may set; product_id is the key.
+UPSERT_FIELDS = ('name', 'qty', 'price', 'category')
+
+# Each worker keeps the last few catalog versions it has loaded.
+LOCAL_SIZE = getattr(settings, 'CATALOG_LOCAL_CACHE_SIZE', 4)
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+# -------- Version --------
+def catalog_version():
+    """Current catalog version, shared by the workers on this host through the cache."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a cleared cache never reuses an old number
+        # that some worker still has in memory.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    """catalog_version() for async views."""
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every worker's copy of the catalog once the current transaction commits."""
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    # A fresh value rather than cache.incr(): incr is a read-modify-write on
+    # the file based cache, so two workers bumping at once could both write
+    # the same number. Versions only need to differ, not to count.
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+# -------- Catalog --------
+def get_catalog(version=None):
+    """
+    All products as a list, read from the database only when the catalog
+    version has moved since this worker last loaded it.
+    """
+    if version is None:
+        version = catalog_version()
+    products = _local_catalog(version)
+    if products is None:
+        products = _remember_catalog(version, list(Product.objects.all()))
+    return products
+
+
+async def aget_catalog(version=None):
+    """get_catalog() for async views; the same per-worker copies."""
+    if version is None:
+        version = await acatalog_version()
+    products = _local_catalog(version)
+    if products is None:
+        products = _remember_catalog(version, [product async for product in Product.objects.all()])
+    return products
+
+
+def _local_catalog(version):
+    with _lock:
+        products = _local.get(version)
+        if products is not None:
+            _local.move_to_end(version)
+        return products
+
+
+def _remember_catalog(version, products):
+    logger.info(f"Catalog version {version} loaded: {len(products)} products")
+    with _lock:
+        _local[version] = products
+        _local.move_to_end(version)
+        while len(_local) > LOCAL_SIZE:
+            _local.popitem(last=False)
+    return products
+
+
+def clear_catalog_cache():
+    with _lock:
+        _local.clear()
+    cache.delete(VERSION_KEY)
+
+
+# -------- Bulk upsert --------
+class CatalogImportError(Exception):
+    """Raised with one message per bad row; nothing is written."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def _clean_row(row):
+    """Validated ``{field: value}`` for one upsert row; missing or blank fields are left out."""
+    values = {}
+    name = str(row.get('name') or '').strip()
+    if name:
+        if len(name) > Product._meta.get_field('name').max_length:
+            raise ValueError('name is too long')
+        values['name'] = name
+
+    if row.get('qty') not in (None, ''):
+        try:
+            qty = int(row['qty'])
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid qty {row['qty']!r}")
+        if qty < 0:
+            raise ValueError('qty cannot be negative')
+        values['qty'] = qty
+
+    if row.get('price') not in (None, ''):
+        price = Money.parse(row['price'])
+        if price < 0:
+            raise ValueError('price cannot be negative')
+        values['price'] = price
+
+    category = str(row.get('category') or '').strip()
+    if category:
+        if category not in dict(Product.CATEGORY_CHOICES):
+            raise ValueError(f"unknown category {category!r}")
+        values['category'] = category
+    return values
+
+
+def upsert_products(rows, dry_run=False):
+    """
+    Create or update products keyed on ``product_id`` from dicts with any of
+    name, qty, price and category.
+
+    Current rows are read with one query and diffed. New products go in
+    with one bulk INSERT and changed ones with one UPDATE that only touches
+    the fields that differ, so a concurrent sale's qty is not overwritten by
+    a price change. Both run in one transaction and the catalog version is
+    bumped once. Returns ``{'created': n, 'updated': n, 'unchanged': n}``.
+    """
+    errors = []
+    cleaned = {}
+    for number, row in enumerate(rows, 1):
+        product_id = str(row.get('product_id') or '').strip() if isinstance(row, dict) else ''
+        if not product_id:
+            errors.append(f"Row {number}: product_id is required.")
+            continue
+        if product_id in cleaned:
+            errors.append(f"Row {number}: {product_id} appears more than once.")
+            continue
+        try:
+            cleaned[product_id] = _clean_row(row)
+        except ValueError as e:
+            errors.append(f"Row {number} ({product_id}): {e}.")
+
+    existing = Product.objects.in_bulk(list(cleaned), field_name='product_id')
+    for product_id, values in cleaned.items():
+        missing = [f for f in ('name', 'price', 'category') if f not in values]
+        if product_id not in existing and missing:
+            errors.append(f"{product_id}: new products need {', '.join(missing)}.")
+    if errors:
+        raise CatalogImportError(errors)
+
+    created = []
+    changes = {}
+    for product_id, values in cleaned.items():
+        product = existing.get(product_id)
+        if product is None:
+            created.append(Product(product_id=product_id, **values))
+            continue
+        diff = {f: v for f, v in values.items() if getattr(product, f) != v}
+        if diff:
+            changes[product.pk] = diff
+
+    summary = {'created': len(created), 'updated': len(changes),
+               'unchanged': len(cleaned) - len(created) - len(changes)}
+    if dry_run or not (created or changes):
+        return summary
+
+    with transaction.atomic():
+        if created:
+            # A product added by someone else since the read above is
+            # updated instead of failing on the unique product_id.
+            Product.objects.bulk_create(
+                created,
+                update_conflicts=True,
+                unique_fields=['product_id'],
+                update_fields=[*UPSERT_FIELDS, 'updated_at'],
+            )
+        if changes:
+            updates = {}
+            for field in UPSERT_FIELDS:
+                model_field = Product._meta.get_field(field)
+                whens = [
+                    When(pk=pk, then=Value(diff[field], output_field=model_field))
+                    for pk, diff in changes.items() if field in diff
+                ]
+                if whens:
+                    updates[field] = Case(*whens, default=F(field), output_field=model_field)
+            Product.objects.filter(pk__in=changes).update(**updates, updated_at=Now())
+        bump_catalog_version()
+
+    logger.info(f"Catalog upsert: {summary}")
+    return summary
@@ -0,0 +1,185 @@
+from functools import lru_cache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from .models import AmountInserted, CashBox
+from .money import Money
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTES = (200, 100, 50, 25)
+COINS = (20, 10, 5, 1)
+DENOMINATIONS = NOTES + COINS
+
+# Change plans remembered per worker, keyed by (cash box counts, amount).
+CHANGE_CACHE_SIZE = getattr(settings, 'CHANGE_CACHE_SIZE', 256)
+
+
+class ChangeError(Exception):
+    """Raised when the cash box cannot pay out the exact change."""
+
+
+# -------- Denomination dicts --------
+def as_denominations(counts):
+    """Turn counts aligned with DENOMINATIONS into the ``{"notes": ..., "coins": ...}`` dict."""
+    by_value = dict(zip(DENOMINATIONS, counts))
+    return {
+        "notes": {str(v): by_value[v] for v in NOTES},
+        "coins": {str(v): by_value[v] for v in COINS},
+    }
+
+
+def denomination_counts(denoms):
+    """``{value: count}`` for every non-zero entry of a denominations dict."""
+    counts = {}
+    for group in ("notes", "coins"):
+        for value, count in denoms.get(group, {}).items():
+            if int(count):
+                counts[int(value)] = counts.get(int(value), 0) + int(count)
+    return counts
+
+
+def denomination_fields(denoms):
+    """Keyword arguments for the notes_*/coins_* columns of AmountInserted/ChangeReturn."""
+    fields = {f"notes_{v}": denoms.get("notes", {}).get(str(v), 0) for v in NOTES}
+    fields.update({f"coins_{v}": denoms.get("coins", {}).get(str(v), 0) for v in COINS})
+    return fields
+
+
+# -------- Change making --------
+def _change_table(stock, limit):
+    """
+    Fewest-pieces way to pay every amount up to ``limit`` from ``stock``.
+
+    Bounded knapsack: each denomination is split into 1, 2, 4, ... piece
+    bundles and run as 0/1 items. Entry ``a`` holds the piece counts for
+    amount ``a`` or None when it cannot be paid.
+    """
+    impossible = limit + 1
+    pieces = [0] + [impossible] * limit
+    counts = [(0,) * len(DENOMINATIONS)] + [None] * limit
+
+    for index, (value, available) in enumerate(zip(DENOMINATIONS, stock)):
+        bundle = 1
+        while available > 0:
+            take = min(bundle, available)
+            available -= take
+            bundle *= 2
+            step = take * value
+            for amount in range(limit, step - 1, -1):
+                candidate = pieces[amount - step] + take
+                if candidate < pieces[amount]:
+                    pieces[amount] = candidate
+                    best = list(counts[amount - step])
+                    best[index] += take
+                    counts[amount] = tuple(best)
+    return counts
+
+
+@lru_cache(maxsize=CHANGE_CACHE_SIZE)
+def _fewest_pieces(stock, amount):
+    """
+    Piece counts paying ``amount`` from ``stock``, or None. A preview and
+    its confirm ask for the same change from the same box, so the confirm,
+    which runs under the write lock, is a lookup.
+    """
+    return _change_table(stock, amount)[amount]
+
+
+def cash_stock():
+    """Pieces of each denomination in the cash box, aligned with DENOMINATIONS."""
+    counts = dict(CashBox.objects.values_list('denomination', 'count'))
+    return tuple(counts.get(value, 0) for value in DENOMINATIONS)
+
+
+def make_change(amount, stock=None):
+    """
+    Fewest notes and coins the cash box can actually pay for ``amount``.
+
+    Raises ChangeError when no combination of the pieces in stock adds up to
+    it. Plans are cached per cash box state and amount.
+    """
+    if stock is None:
+        stock = cash_stock()
+
+    cents = Money.parse(amount).cents
+    if cents % 100:
+        raise ChangeError('The machine cannot give change below Rs 1.')
+    amount = cents // 100
+    if amount <= 0:
+        return as_denominations((0,) * len(DENOMINATIONS))
+
+    total = sum(value * count for value, count in zip(DENOMINATIONS, stock))
+    if amount > total:
+        raise ChangeError('The machine cannot give exact change for this order.')
+
+    counts = _fewest_pieces(tuple(stock), amount)
+    if counts is None:
+        raise ChangeError('The machine cannot give exact change for this order.')
+    return as_denominations(counts)
+
+
+# -------- Cash box --------
+def credit_cash(denoms):
+    """Add inserted notes and coins to the cash box in one UPDATE."""
+    counts = denomination_counts(denoms)
+    if not counts:
+        return
+    CashBox.objects.filter(denomination__in=counts).update(
+        count=Case(
+            *[When(denomination=value, then=F('count') + n) for value, n in counts.items()],
+            default=F('count'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+
+
+def debit_cash(denoms):
+    """
+    Take paid-out change from the cash box in one conditional UPDATE.
+
+    Returns False when another sale emptied a denomination first; the caller
+    must roll back.
+    """
+    counts = denomination_counts(denoms)
+    if not counts:
+        return True
+
+    condition = Q()
+    for value, n in counts.items():
+        condition |= Q(denomination=value, count__gte=n)
+
+    updated = CashBox.objects.filter(condition).update(
+        count=Case(
+            *[When(denomination=value, then=F('count') - n) for value, n in counts.items()],
+            default=F('count'),
+            output_field=PositiveIntegerField(),
+        )
+    )
+    return updated == len(counts)
+
+
+def refill_cash_box(count=None):
+    """Set every denomination to ``count`` pieces (default: settings.CASH_FLOAT)."""
+    if count is None:
+        count = settings.CASH_FLOAT
+    with transaction.atomic():
+        CashBox.objects.update(count=count)
+        present = set(CashBox.objects.values_list('denomination', flat=True))
+        CashBox.objects.bulk_create([
+            CashBox(denomination=value, count=count)
+            for value in DENOMINATIONS if value not in present
+        ])
+
+
+def record_insertion(student, denoms):
+    """Save one AmountInserted row for ``denoms`` and put the money in the cash box."""
+    with transaction.atomic():
+        inserted = AmountInserted.objects.create(
+            student=student,
+            denominations=denoms,
+            **denomination_fields(denoms)
+        )
+        credit_cash(denoms)
+    return inserted
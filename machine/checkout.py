@@ -0,0 +1,163 @@
+from django.db import transaction
+from .models import Product, Order, ChangeReturn
+from .money import Money
+from .change import ChangeError, debit_cash, denomination_fields, make_change
+from .reservations import apply_stock_deltas, claim_holds, create_holds, stock_deltas
+from .rollups import record_sales
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be sold; the message is shown to the student."""
+
+
+# -------- Cart --------
+def build_cart(product_ids, qtys):
+    """Turn the posted ``product_id``/``qty`` lists into ``{product_id: qty}``."""
+    if len(qtys) < len(product_ids):
+        raise CheckoutError('Invalid order data. Please try again.')
+
+    cart = {}
+    for pid, qty in zip(product_ids, qtys):
+        try:
+            pid = int(pid)
+            qty = int(qty)
+        except (TypeError, ValueError):
+            raise CheckoutError('Invalid order data. Please try again.')
+        if qty <= 0:
+            continue
+        cart[pid] = cart.get(pid, 0) + qty
+    return cart
+
+
+def price_cart(cart):
+    """Load every product in the cart with one query and price each line."""
+    products = Product.objects.in_bulk(list(cart))
+    lines = []
+    total = Money()
+    for pid, qty in cart.items():
+        product = products.get(pid)
+        if product is None:
+            raise CheckoutError('Selected product is no longer available.')
+        cost = product.price * qty
+        lines.append((product, qty, cost))
+        total += cost
+    return lines, total
+
+
+# -------- Preview --------
+def reserve_cart(student, balance, cart):
+    """
+    Price ``cart`` and hold its stock for ``student`` until the order is
+    confirmed or the hold expires. Any earlier hold of the student is replaced.
+    """
+    if not cart:
+        raise CheckoutError('Select at least one product.')
+
+    balance = Money.parse(balance)
+    lines, total_cost = price_cart(cart)
+
+    if total_cost > balance:
+        raise CheckoutError(f'Insufficient balance! Need Rs {total_cost - balance:.2f} more.')
+    try:
+        make_change(balance - total_cost)
+    except ChangeError as e:
+        raise CheckoutError(str(e))
+
+    with transaction.atomic():
+        held = claim_holds(student)
+        if held is None:
+            raise CheckoutError('Your reservation expired. Please try again.')
+
+        for product, qty, cost in lines:
+            if qty > product.qty + held.get(product.pk, 0):
+                raise CheckoutError(f'Not enough stock for {product.name}.')
+
+        if not apply_stock_deltas(stock_deltas(cart, held)):
+            raise CheckoutError('Not enough stock for one of the selected products.')
+
+        create_holds(student, cart)
+
+    return lines, total_cost
+
+
+# -------- Checkout --------
+def checkout(student, balance, cart):
+    """
+    Sell ``cart`` to ``student`` out of ``balance``.
+
+    Stock held by a previous preview is used first, and the sale is refused
+    before anything is written when the cash box cannot pay the change. The
+    number of queries does not depend on the cart size: one read each for the
+    products and the cash box, one read and one delete for the holds, one
+    conditional UPDATE each for stock and cash, one bulk INSERT for the orders
+    and one INSERT for the change return, and an INSERT plus an UPDATE each
+    for the sales and cash rollups.
+    """
+    if not cart:
+        raise CheckoutError('Please select at least one product.')
+
+    balance = Money.parse(balance)
+    lines, total_purchase = price_cart(cart)
+
+    if total_purchase > balance:
+        raise CheckoutError(f'Insufficient balance! Need Rs {total_purchase - balance:.2f} more.')
+
+    change_amount = balance - total_purchase
+    try:
+        change_denoms = make_change(change_amount)
+    except ChangeError as e:
+        raise CheckoutError(str(e))
+
+    with transaction.atomic():
+        held = claim_holds(student)
+        if held is None:
+            raise CheckoutError('Your reservation expired. Please try again.')
+
+        for product, qty, cost in lines:
+            if qty > product.qty + held.get(product.pk, 0):
+                raise CheckoutError(f'Not enough stock for {product.name}.')
+
+        # Someone else bought the last units between our read and this write.
+        if not apply_stock_deltas(stock_deltas(cart, held)):
+            raise CheckoutError('Not enough stock for one of the selected products.')
+
+        orders = Order.objects.bulk_create([
+            Order(
+                student=student,
+                product=product,
+                balance=balance,
+                total_purchase=cost,
+                change_amount=Money(),
+                amount_inserted=cost
+            )
+            for product, qty, cost in lines
+        ])
+        record_sales(orders)
+
+        # Another sale may have paid out the same notes since we read the box.
+        if not debit_cash(change_denoms):
+            raise CheckoutError('The machine cannot give exact change for this order.')
+
+        ChangeReturn.objects.create(
+            student=student,
+            denominations=change_denoms,
+            **denomination_fields(change_denoms)
+        )
+
+    ordered_items = [
+        {
+            'name': product.name,
+            'qty': qty,
+            'price': product.price,
+            'cost': cost
+        }
+        for product, qty, cost in lines
+    ]
+    return {
+        'ordered_items': ordered_items,
+        'total_purchase': total_purchase,
+        'change': change_amount,
+    }
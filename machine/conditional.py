@@ -0,0 +1,63 @@
+import hashlib
+import time
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+DELETED_KEY = 'machine:deleted:{}'
+
+
+# -------- Validators --------
+def make_etag(*parts):
+    """A strong ETag from anything that changes whenever the response would."""
+    digest = hashlib.md5('|'.join(map(str, parts)).encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def mark_deleted(model):
+    """
+    Remember when rows of ``model`` were last deleted. MAX(updated_at) cannot
+    see a deletion, so list validators fold this timestamp in.
+    """
+    key = DELETED_KEY.format(model._meta.label_lower)
+    transaction.on_commit(lambda: cache.set(key, time.time(), timeout=None))
+
+
+def last_deleted(model):
+    return cache.get(DELETED_KEY.format(model._meta.label_lower))
+
+
+# -------- Responses --------
+def not_modified(request, etag=None, last_modified=None, private=False):
+    """
+    A 304 response when the request's If-None-Match/If-Modified-Since match,
+    otherwise None. ``last_modified`` is a datetime or a POSIX timestamp.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if last_modified is not None and not isinstance(last_modified, (int, float)):
+        last_modified = last_modified.timestamp()
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified) if last_modified is not None else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified, private)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None, private=False):
+    """
+    Attach ETag/Last-Modified and make clients revalidate before reusing
+    the response.
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        if not isinstance(last_modified, (int, float)):
+            last_modified = last_modified.timestamp()
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True, **({'private': True} if private else {}))
+    return response
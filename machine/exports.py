@@ -0,0 +1,103 @@
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from .models import Order, AmountInserted, ChangeReturn
+from .money import Money
+
+EXPORT_MODELS = {
+    'orders': Order,
+    'amountinserted': AmountInserted,
+    'changereturn': ChangeReturn,
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+CHUNK_SIZE = 2000
+
+
+class ExportError(Exception):
+    """Raised for an unknown table or format; the message is sent back to the caller."""
+
+
+def export_columns(model):
+    """Every concrete column, foreign keys as their ``*_id``, in model order."""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def export_rows(model, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """
+    Stream ``values_list`` tuples oldest first. The database cursor is read
+    ``chunk_size`` rows at a time, so memory does not grow with the table,
+    and rows come off the (date_time, id) index in order, so the database
+    does not sort the table first.
+    """
+    queryset = model.objects.all()
+    if since is not None:
+        queryset = queryset.filter(date_time__gte=since)
+    if until is not None:
+        queryset = queryset.filter(date_time__lt=until)
+    return (
+        queryset.order_by('date_time', 'id')
+        .values_list(*export_columns(model))
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _plain(value):
+    if isinstance(value, Money):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            json.dumps(value) if isinstance(value, (dict, list)) else _plain(value)
+            for value in row
+        ])
+
+
+def _ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, map(_plain, row)))) + '\n'
+
+
+def export_chunks(table, fmt, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield the export of ``table`` as strings of at most ``chunk_size`` lines
+    each, ready for a StreamingHttpResponse or a file. Raises ExportError up
+    front for an unknown table or format so nothing has been sent yet.
+    """
+    model = EXPORT_MODELS.get(table)
+    if model is None:
+        raise ExportError(f"Unknown table {table!r}; choose from {', '.join(EXPORT_MODELS)}.")
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}.")
+
+    columns = export_columns(model)
+    rows = export_rows(model, since, until, chunk_size)
+    lines = _csv_lines(columns, rows) if fmt == 'csv' else _ndjson_lines(columns, rows)
+
+    def chunks():
+        while True:
+            chunk = ''.join(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    return chunks()
@@ -0,0 +1,108 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from PIL import Image, ImageOps
+from .models import Product
+from .catalog import bump_catalog_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The dashboard shows images in a box this size (CSS pixels); variants are
+# made for 1x and 2x screens and never upscaled.
+IMAGE_BOX = getattr(settings, 'PRODUCT_IMAGE_BOX', (240, 180))
+SCALES = (1, 2)
+VARIANT_DIR = 'products/variants'
+
+# Encoder settings per format, best compression first.
+FORMATS = {
+    'avif': {'quality': 55, 'speed': 6},
+    'webp': {'quality': 80, 'method': 6},
+}
+
+# Uploads are processed after the request on one background thread
+# (IMAGE_VARIANTS_ASYNC = False builds them in the on_commit callback).
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-variants')
+
+
+def needs_variants(product):
+    return bool(product.image) and (product.image_variants or {}).get('source') != product.image.name
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt.upper(), **FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def build_variants(product, force=False):
+    """
+    Write AVIF and WebP thumbnails of ``product.image`` and record them on the
+    product. Names are derived from the original's content hash, so the same
+    picture always maps to the same files and re-runs reuse them.
+    Returns the variants dict, or None when the product has no image.
+    """
+    if not product.image:
+        return None
+    if not force and not needs_variants(product):
+        return product.image_variants
+
+    source = product.image.name
+    with product.image.open('rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        has_alpha = 'A' in original.getbands() or 'transparency' in original.info
+        original = original.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {'source': source, 'digest': digest, **{fmt: [] for fmt in FORMATS}}
+    seen = set()
+    for scale in SCALES:
+        image = original.copy()
+        image.thumbnail((IMAGE_BOX[0] * scale, IMAGE_BOX[1] * scale), Image.LANCZOS)
+        if image.size in seen:
+            # The original is too small for this scale; the last one covers it.
+            continue
+        seen.add(image.size)
+        if scale == 1:
+            variants['width'], variants['height'] = image.size
+
+        for fmt in FORMATS:
+            path = f"{VARIANT_DIR}/{digest}-{image.width}x{image.height}.{fmt}"
+            if not default_storage.exists(path):
+                path = default_storage.save(path, ContentFile(_encode(image, fmt)))
+            variants[fmt].append([scale, path])
+
+    # Skip the write if the image was replaced while we worked.
+    if Product.objects.filter(pk=product.pk, image=source).update(image_variants=variants, updated_at=Now()):
+        bump_catalog_version()
+    product.image_variants = variants
+    logger.info(f"Image variants for product {product.pk} ({source}): {digest}")
+    return variants
+
+
+def _build_in_background(product_id):
+    try:
+        product = Product.objects.filter(pk=product_id).first()
+        if product is not None:
+            build_variants(product)
+    except Exception:
+        logger.exception(f"Building image variants for product {product_id} failed")
+    finally:
+        # This thread's own connection.
+        connection.close()
+
+
+def schedule_variants(product):
+    """Build the variants of a newly uploaded image once the upload is committed."""
+    if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: _executor.submit(_build_in_background, product.pk))
+    else:
+        transaction.on_commit(lambda: build_variants(product))
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from typing import NamedTuple
+from urllib.parse import urlencode, urlparse
+from django.conf import settings
+from django.db import connection
+
+# A tiny asyncio HTTP/1.1 client for the benchmarks. It keeps one
+# keep-alive connection per simulated kiosk, which is what the kiosks do,
+# and adds no thread or pool of its own to the latencies it measures.
+
+
+class Response(NamedTuple):
+    status: int
+    headers: dict
+    body: bytes
+
+
+class HttpConnection:
+    """
+    One client connection with its own cookie jar. Reconnects when the
+    server closes the connection, as the sync gunicorn worker does after
+    every response.
+    """
+
+    def __init__(self, host, port, cookies=None, timeout=30):
+        self.host = host
+        self.port = port
+        self.cookies = dict(cookies or {})
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, path, form=None, headers=None):
+        body = urlencode(form, doseq=True).encode() if form is not None else b''
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if form is not None:
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+        if body or method not in ('GET', 'HEAD'):
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{k}: {v}" for k, v in (headers or {}).items())
+        raw = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+        reused = self.writer is not None
+        try:
+            return await asyncio.wait_for(self._exchange(raw, method), self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            if not reused:
+                raise
+        # The server dropped an idle keep-alive connection; try once more.
+        return await asyncio.wait_for(self._exchange(raw, method), self.timeout)
+
+    async def _exchange(self, raw, method):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(raw)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode('latin-1').split("\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        for line in filter(None, header_lines):
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                self._store_cookie(value)
+            else:
+                headers[name] = value
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked()
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return Response(status, headers, body)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await self.reader.readuntil(b"\r\n")
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    def _store_cookie(self, header):
+        for name, morsel in SimpleCookie(header).items():
+            if morsel['max-age'] == '0' or not morsel.value:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = morsel.value
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+# -------- Scratch database --------
+@contextmanager
+def scratch_database(keep=False, log=None):
+    """
+    Create and migrate a throwaway database (a temporary file for SQLite,
+    ``bench_<name>`` elsewhere) and point the default connection at it.
+    Yields the environment a server needs to use it, with its own cache
+    directories. The configured database and caches are never written to;
+    the scratch database is dropped on exit unless ``keep``.
+    """
+    creation = connection.creation
+    test_settings = connection.settings_dict['TEST']
+    old_name, old_test_name = connection.settings_dict['NAME'], test_settings['NAME']
+    directory = tempfile.mkdtemp(prefix='vending-bench-')
+    if connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    else:
+        test_settings['NAME'] = f"bench_{old_name}"
+
+    # close() leaves an in-memory database (a test run's) open; set its
+    # handle aside so the scratch database gets a connection of its own.
+    connection.close()
+    kept, connection.connection = connection.connection, None
+    try:
+        name = creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        if connection.vendor == 'sqlite':
+            url = f"sqlite:///{name}"
+        else:
+            url = urlparse(os.environ['DATABASE_URL'])._replace(path=f"/{name}").geturl()
+        try:
+            yield {
+                'DATABASE_URL': url,
+                'CACHE_DIR': os.path.join(directory, 'cache'),
+                'SESSION_CACHE_DIR': os.path.join(directory, 'sessions'),
+            }
+        finally:
+            if keep:
+                connection.close()
+                if log:
+                    log(f"kept the scratch database at {url}")
+            else:
+                creation.destroy_test_db(verbosity=0)
+    finally:
+        test_settings['NAME'] = old_test_name
+        settings.DATABASES[connection.alias]['NAME'] = connection.settings_dict['NAME'] = old_name
+        connection.connection = kept
+        if not keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+# -------- Servers --------
+# gunicorn command line and extra environment of each deployment profile.
+PROFILES = {
+    'wsgi': (['vending_machine.wsgi:application'], {}),
+    'asgi': (['vending_machine.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'], {'ASYNC_VIEWS': '1'}),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not listen on port {port} within {timeout}s")
+
+
+@contextmanager
+def gunicorn(profile='wsgi', workers=4, backlog=2048, env=None, log=None):
+    """
+    Run the site under gunicorn with one of PROFILES on a free local port,
+    against the configured database; yields the port.
+    """
+    app_args, profile_env = PROFILES[profile]
+    port = free_port()
+    command = [
+        sys.executable, '-m', 'gunicorn', *app_args, '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), '--backlog', str(backlog), '--log-level', 'warning',
+    ]
+    if log:
+        log(f"{profile}: {' '.join(command[2:])}")
+    # Server output goes to stderr so it cannot mix with a JSON report on stdout.
+    server = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=sys.stderr,
+                              env={**os.environ, **profile_env, **(env or {})})
+    try:
+        wait_for_port(port, server)
+        yield port
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# -------- Load --------
+class Sample(NamedTuple):
+    target: str
+    seconds: float
+    status: int
+    queries: int = None
+
+
+async def timed(connection, target, method, path, **kwargs):
+    """
+    ``(Sample, Response)``; a failed request is a Sample with status 0.
+    ``queries`` comes from the X-DB-Queries header, see QueryCountMiddleware.
+    """
+    started = time.perf_counter()
+    try:
+        response = await connection.request(method, path, **kwargs)
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+        await connection.close()
+        response = None
+    elapsed = time.perf_counter() - started
+    if response is None:
+        return Sample(target, elapsed, 0), None
+    queries = response.headers.get('x-db-queries')
+    return Sample(target, elapsed, response.status, int(queries) if queries else None), response
+
+
+async def hammer(host, port, paths, connections=200, duration=10.0, cookies=None):
+    """
+    Open ``connections`` connections and have each GET ``paths`` in turn,
+    back to back, for ``duration`` seconds. Returns the Samples.
+    """
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    async def kiosk(offset):
+        connection = HttpConnection(host, port, cookies)
+        i = offset
+        try:
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                sample, response = await timed(connection, path, 'GET', path)
+                samples.append(sample)
+                i += 1
+        finally:
+            await connection.close()
+
+    await asyncio.gather(*(kiosk(n) for n in range(connections)))
+    return samples
+
+
+# -------- Stats --------
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples, duration, ok=lambda status: 200 <= status < 400):
+    """
+    ``{target: {count, rps, errors, p50_ms, p95_ms, p99_ms}}`` plus an
+    ``'all'`` entry, with ``queries_mean``/``queries_max`` when the server
+    reported query counts. Latencies include failed requests; ``ok``
+    decides which statuses count as errors.
+    """
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample.target].append(sample)
+        groups['all'].append(sample)
+
+    summary = {}
+    for target, group in groups.items():
+        latencies = sorted(s.seconds * 1000 for s in group)
+        summary[target] = {
+            'count': len(group),
+            'rps': round(len(group) / duration, 1) if duration else None,
+            'errors': sum(1 for s in group if not ok(s.status)),
+            **{f'p{p}_ms': round(percentile(latencies, p), 2) for p in (50, 95, 99)},
+        }
+        queries = [s.queries for s in group if s.queries is not None]
+        if queries:
+            summary[target]['queries_mean'] = round(sum(queries) / len(queries), 2)
+            summary[target]['queries_max'] = max(queries)
+    return summary
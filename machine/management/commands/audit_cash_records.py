@@ -0,0 +1,102 @@
+import time
+from itertools import islice
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from machine.change import COINS, DENOMINATIONS, NOTES, as_denominations
+from machine.models import AmountInserted, ChangeReturn
+from machine.money import Money
+
+COLUMNS = [f"notes_{v}" for v in NOTES] + [f"coins_{v}" for v in COINS]
+VALUES = np.array(DENOMINATIONS, dtype=np.int64)
+
+TABLES = {
+    'amountinserted': (AmountInserted, 'total_amount'),
+    'changereturn': (ChangeReturn, 'total_return'),
+}
+
+NOTE_KEYS = [str(v) for v in NOTES]
+COIN_KEYS = [str(v) for v in COINS]
+BROKEN = [-1] * len(DENOMINATIONS)
+
+
+def json_vector(denoms):
+    """Piece counts stored in the ``denominations`` JSON, aligned with DENOMINATIONS."""
+    try:
+        notes = denoms.get("notes") or {}
+        coins = denoms.get("coins") or {}
+        return [int(notes.get(k, 0)) for k in NOTE_KEYS] + [int(coins.get(k, 0)) for k in COIN_KEYS]
+    except (AttributeError, TypeError, ValueError):
+        # Never equal to real counts, so the row gets flagged.
+        return BROKEN
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every AmountInserted/ChangeReturn row: the total and the denominations "
+        "JSON must agree with the notes_*/coins_* columns. Use --fix to rewrite them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=sorted(TABLES), action='append',
+                            help="Only audit this table (repeatable). Default: all.")
+        parser.add_argument('--chunk-size', type=int, default=50000)
+        parser.add_argument('--fix', action='store_true',
+                            help="Rewrite mismatching totals and JSON from the count columns.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        for name in options['table'] or sorted(TABLES):
+            model, total_field = TABLES[name]
+            start = time.perf_counter()
+            checked, flagged = self.audit(model, total_field, options['chunk_size'], options['fix'])
+            elapsed = time.perf_counter() - start
+            action = "fixed" if options['fix'] else "flagged"
+            self.stdout.write(f"{name}: {checked} rows checked, {flagged} {action} in {elapsed:.2f}s")
+
+    def audit(self, model, total_field, chunk_size, fix):
+        rows = (
+            model.objects.order_by('pk')
+            .values_list('pk', total_field, 'denominations', *COLUMNS)
+            .iterator(chunk_size=chunk_size)
+        )
+        checked = flagged = 0
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            n = len(chunk)
+            checked += n
+
+            ids = np.fromiter((r[0] for r in chunk), dtype=np.int64, count=n)
+            stored = np.fromiter((r[1].cents for r in chunk), dtype=np.int64, count=n)
+            counts = np.array([r[3:] for r in chunk], dtype=np.int64).reshape(n, len(DENOMINATIONS))
+            stored_json = np.array([json_vector(r[2]) for r in chunk], dtype=np.int64)
+
+            totals = counts @ VALUES
+            bad = (stored != totals * 100) | (stored_json != counts).any(axis=1)
+
+            bad_rows = np.flatnonzero(bad)
+            if not len(bad_rows):
+                continue
+            flagged += len(bad_rows)
+
+            if self.verbosity > 1:
+                for i in bad_rows:
+                    self.stdout.write(f"  {model.__name__} #{ids[i]}: stored total {Money(int(stored[i]))}, counts say {totals[i]}")
+
+            if fix:
+                now = timezone.now()
+                fixes = [
+                    model(pk=int(ids[i]), updated_at=now, **{
+                        total_field: Money(int(totals[i]) * 100),
+                        'denominations': as_denominations(counts[i].tolist()),
+                    })
+                    for i in bad_rows
+                ]
+                with transaction.atomic():
+                    model.objects.bulk_update(fixes, [total_field, 'denominations', 'updated_at'], batch_size=1000)
+
+        return checked, flagged
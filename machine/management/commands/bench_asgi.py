@@ -0,0 +1,90 @@
+import asyncio
+import json
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from machine.loadgen import PROFILES, gunicorn, hammer, scratch_database, summarize
+from machine.models import Student
+from machine.money import Money
+
+TARGETS = ['/api/products/', '/api/reports/', '/student/dashboard/', '/receipt/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Start gunicorn with the sync WSGI profile and with the uvicorn ASGI profile "
+        "(async views) in turn, hold --connections keep-alive connections against the "
+        "read-heavy views and compare requests/s and p99 latency. Runs on a scratch "
+        "database with its own caches; the configured database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=200)
+        parser.add_argument('--duration', type=float, default=15.0, help="Seconds per server.")
+        parser.add_argument('--workers', type=int, default=4, help="gunicorn workers for both servers.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        with scratch_database() as env:
+            student = Student.objects.create(name='Bench kiosk', campus=Student._meta.get_field('campus').choices[0][0])
+            session = self.bench_session(student)
+            cookies = {settings.SESSION_COOKIE_NAME: session.session_key}
+            try:
+                results = {
+                    name: self.run_server(name, options, cookies, env)
+                    for name in PROFILES
+                }
+            finally:
+                # Also drops its entry from this process's session cache.
+                session.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.report(results, options)
+
+    def bench_session(self, student):
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        price = Money.parse('25')
+        session['student_id'] = student.id
+        session['balance'] = Money.parse('100').to_json()
+        session['receipt'] = {
+            'student_name': student.name,
+            'campus': student.campus,
+            'ordered_items': [{'name': 'Bench item', 'qty': 2, 'price': price.to_json(), 'cost': (price * 2).to_json()}],
+            'total_purchase': (price * 2).to_json(),
+            'change': Money.parse('50').to_json(),
+            'inserted_money': Money.parse('100').to_json(),
+            'date': timezone.localtime().strftime("%Y-%m-%d %H:%M"),
+        }
+        session.create()
+        return session
+
+    def run_server(self, name, options, cookies, env):
+        backlog = max(2048, options['connections'] * 2)
+        try:
+            with gunicorn(name, options['workers'], backlog, env, log=self.stderr.write) as port:
+                # Warm every worker's catalog and template caches before timing.
+                asyncio.run(hammer('127.0.0.1', port, TARGETS, options['workers'] * 2, 1.0, cookies))
+                samples = asyncio.run(hammer('127.0.0.1', port, TARGETS, options['connections'],
+                                             options['duration'], cookies))
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        return summarize(samples, options['duration'])
+
+    def report(self, results, options):
+        self.stdout.write(f"{options['connections']} connections, {options['workers']} workers, "
+                          f"{options['duration']:.0f}s per server")
+        self.stdout.write(f"{'target':<22}{'server':<7}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for target in TARGETS + ['all']:
+            for name, summary in results.items():
+                row = summary.get(target)
+                if row is None:
+                    continue
+                self.stdout.write(f"{target:<22}{name:<7}{row['rps']:>9}{row['p50_ms']:>10}"
+                                  f"{row['p99_ms']:>10}{row['errors']:>8}")
+        wsgi, asgi = results['wsgi']['all'], results['asgi']['all']
+        self.stdout.write(self.style.SUCCESS(
+            f"ASGI: {asgi['rps'] / wsgi['rps']:.2f}x the requests/s, p99 {asgi['p99_ms']} ms vs {wsgi['p99_ms']} ms"
+        ))
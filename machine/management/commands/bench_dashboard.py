@@ -0,0 +1,61 @@
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from machine.models import Student, Product
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time student_dashboard.html renders with and without the cached product grid."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['products'], options['iterations'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, product_count, iterations):
+        products = Product.objects.bulk_create([
+            Product(product_id=f"BENCH{i:05d}", name=f"Bench product {i}", qty=50,
+                    price=Decimal('25.00'), category='Cake')
+            for i in range(product_count)
+        ])
+        student = Student.objects.create(name='Bench', campus='Ebene')
+        request = RequestFactory().get('/student/dashboard/')
+        version = f"bench-{time.time_ns()}"
+
+        def render(n):
+            start = time.perf_counter()
+            for _ in range(n):
+                render_to_string('student_dashboard.html', {
+                    'student': student,
+                    'products': products,
+                    'catalog_version': version,
+                    'balance': Decimal('100.00'),
+                }, request=request)
+            return (time.perf_counter() - start) / n * 1000
+
+        # The dummy cache never stores anything, so every render builds the
+        # whole grid, as before fragment caching.
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            before = render(iterations)
+
+        render(1)  # warm the fragment
+        after = render(iterations)
+
+        self.stdout.write(f"{product_count} products, {iterations} renders each")
+        self.stdout.write(f"full grid render:   {before:.3f} ms/request")
+        self.stdout.write(f"cached grid render: {after:.3f} ms/request")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {before / after:.1f}x"))
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Sum
+from machine.change import DENOMINATIONS, NOTES
+from machine.loadgen import PROFILES, HttpConnection, gunicorn, scratch_database, summarize, timed
+from machine.models import Student, Product, AmountInserted, ChangeReturn, Order, StockHold, CashBox
+from machine.money import Money
+
+STUDENT_PREFIX = 'Bench kiosk '
+PRODUCT_PREFIX = 'BENCH'
+PRICES = [15, 20, 25, 35, 40, 50]
+# What a student feeds the machine: mostly notes, a coin now and then.
+PIECES = [100, 50, 25, 20, 10, 5]
+
+ERROR_MESSAGE = re.compile(r'class="error">\s*✗\s*([^<]+)<')
+# error.html, which the views render (with a 200) when they raise.
+ERROR_PAGE = b'Something went wrong'
+
+
+class JourneyFailed(Exception):
+    """A step of a journey got a response a real kiosk could not go on from."""
+
+
+def piece_column(value):
+    return f"notes_{value}" if value in NOTES else f"coins_{value}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate kiosks buying end to end against a local gunicorn: login, coin and note "
+        "insertions, dashboard, preview, confirm and receipt, with think time and a skewed "
+        "catalog mix over seeded bench products. Reports throughput, p50/p95/p99 and SQL "
+        "queries per view, and checks stock, cash box and orders for oversells and lost "
+        "writes afterwards. Runs on a scratch database with its own caches, dropped "
+        "afterwards; the configured database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kiosks', type=int, default=50, help="Concurrent simulated students.")
+        parser.add_argument('--duration', type=float, default=30.0,
+                            help="Seconds to start new journeys for; started journeys finish.")
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help="Mean seconds between steps (exponential); coin clicks take a quarter.")
+        parser.add_argument('--products', type=int, default=20, help="Bench products to seed.")
+        parser.add_argument('--stock', type=int, default=40, help="Units of each bench product.")
+        parser.add_argument('--mix-skew', type=float, default=1.0,
+                            help="Zipf exponent of product popularity; 0 picks products uniformly.")
+        parser.add_argument('--max-items', type=int, default=3, help="Most products in one cart.")
+        parser.add_argument('--profile', choices=sorted(PROFILES), default='wsgi')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        parser.add_argument('--output', help="Also write the JSON results to this file.")
+        parser.add_argument('--keep', action='store_true', help="Keep the scratch database for inspection.")
+
+    def prepare(self, options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.samples = []
+        self.outcomes = Counter()
+        self.failures = Counter()
+        self.violations = []
+        # What each student saw succeed, to compare with the database afterwards.
+        self.inserted = defaultdict(Money)
+        self.bought = defaultdict(Counter)
+
+    def handle(self, *args, **options):
+        self.prepare(options)
+        with scratch_database(keep=options['keep'], log=self.stderr.write) as env:
+            self.seed()
+            cash_start = dict(CashBox.objects.values_list('denomination', 'count'))
+            try:
+                with gunicorn(options['profile'], options['workers'], env={**env, 'QUERY_COUNT_HEADER': '1'},
+                              log=self.stderr.write) as port:
+                    started = time.perf_counter()
+                    asyncio.run(self.run(port))
+                    elapsed = time.perf_counter() - started
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            self.check_stock()
+            self.check_cash_box(cash_start)
+            self.check_students()
+
+        results = self.results(elapsed)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.report(results)
+        if self.violations:
+            raise CommandError(f"{len(self.violations)} consistency violations")
+
+    # -------- Setup --------
+    def seed(self):
+        """Create the bench products and top up the cash box."""
+        self.products = Product.objects.bulk_create([
+            Product(product_id=f"{PRODUCT_PREFIX}{i:04d}", name=f"Bench item {i}", qty=self.options['stock'],
+                    price=Money.parse(PRICES[i % len(PRICES)]), category='Cake')
+            for i in range(self.options['products'])
+        ])
+        self.weights = [1 / (rank + 1) ** self.options['mix_skew'] for rank in range(len(self.products))]
+
+        CashBox.objects.bulk_create([CashBox(denomination=value, count=0) for value in DENOMINATIONS],
+                                    ignore_conflicts=True)
+        # Enough change for every sale, so refusals come from stock only.
+        CashBox.objects.update(count=F('count') + 1000)
+
+    # -------- Kiosks --------
+    async def run(self, port):
+        deadline = time.perf_counter() + self.options['duration']
+
+        async def kiosk(n):
+            await self.think()
+            while time.perf_counter() < deadline:
+                await self.journey(n, port)
+                await self.think()
+
+        await asyncio.gather(*(kiosk(n) for n in range(self.options['kiosks'])))
+
+    async def think(self, scale=1.0):
+        if self.options['think_time'] > 0:
+            await asyncio.sleep(self.random.expovariate(1 / (self.options['think_time'] * scale)))
+
+    async def step(self, connection, view, method, path, form=None, expect=200):
+        headers = {'X-CSRFToken': connection.cookies.get('csrftoken', '')} if method == 'POST' else None
+        sample, response = await timed(connection, view, method, path, form=form, headers=headers)
+        self.samples.append(sample)
+        if response is None or (expect is not None and response.status != expect):
+            status = response.status if response is not None else 'no response'
+            raise JourneyFailed(f"{view}: {status}")
+        return response
+
+    def pick_cart(self):
+        """``{product: qty}`` of 1..max_items distinct products, popular ones more often."""
+        size = self.random.randint(1, min(self.options['max_items'], len(self.products)))
+        cart = {}
+        while len(cart) < size:
+            product = self.random.choices(self.products, self.weights)[0]
+            cart.setdefault(product, self.random.randint(1, 2))
+        return cart
+
+    def pieces_for(self, cost):
+        """Notes and coins adding up to at least ``cost``, sometimes with change to give."""
+        target = cost.cents // 100 + self.random.choice([0, 0, 5, 25])
+        pieces = []
+        while sum(pieces) < target:
+            pieces.append(self.random.choice([p for p in PIECES if p <= max(target - sum(pieces), 5)]))
+        return pieces
+
+    async def journey(self, n, port):
+        name = f"{STUDENT_PREFIX}{n:03d}"
+        cart = self.pick_cart()
+        cost = sum((product.price * qty for product, qty in cart.items()), Money())
+        connection = HttpConnection('127.0.0.1', port)
+        try:
+            await self.step(connection, 'GET student_login', 'GET', '/student/login/')
+            await self.step(connection, 'POST student_login', 'POST', '/student/login/',
+                            {'name': name, 'campus': 'Ebene'}, expect=302)
+            await self.think()
+
+            await self.step(connection, 'GET balance_page', 'GET', '/balance/')
+            pieces = self.pieces_for(cost)
+            for value in pieces:
+                await self.think(0.25)
+                field = 'add_note' if value in NOTES else 'add_coin'
+                await self.step(connection, 'POST balance_page (insert)', 'POST', '/balance/', {field: value})
+            response = await self.step(connection, 'POST balance_page (confirm)', 'POST', '/balance/',
+                                       {'confirm_balance': '1'})
+            if b'successfully added' not in response.body:
+                raise JourneyFailed("POST balance_page (confirm): money not added")
+            self.inserted[name] += Money.parse(sum(pieces))
+            await self.think()
+
+            await self.step(connection, 'GET student_dashboard', 'GET', '/student/dashboard/')
+            await self.think()
+            form = {'product_id': [p.id for p in cart], 'qty': list(cart.values())}
+            response = await self.step(connection, 'POST student_dashboard (preview)', 'POST',
+                                       '/student/dashboard/', {'preview_order': '1', **form})
+            if b'name="confirm_order"' not in response.body:
+                return self.refused('POST student_dashboard (preview)', response)
+            await self.think()
+
+            response = await self.step(connection, 'POST student_dashboard (confirm)', 'POST',
+                                       '/student/dashboard/', {'confirm_order': '1', **form}, expect=None)
+            if response.status != 302:
+                return self.refused('POST student_dashboard (confirm)', response)
+            for product, qty in cart.items():
+                self.bought[name][product.pk] += qty
+
+            response = await self.step(connection, 'GET receipt', 'GET', '/receipt/')
+            if f"Total Purchase: Rs {cost}".encode() not in response.body:
+                self.violations.append({'check': 'receipt', 'student': name,
+                                        'detail': f"receipt does not show the total of Rs {cost}"})
+            self.outcomes['completed'] += 1
+        except JourneyFailed as e:
+            self.outcomes['failed'] += 1
+            self.failures[str(e)] += 1
+        finally:
+            await connection.close()
+
+    def refused(self, view, response):
+        """A preview or confirm the dashboard turned down."""
+        if ERROR_PAGE in response.body:
+            raise JourneyFailed(f"{view}: error page")
+        match = ERROR_MESSAGE.search(response.body.decode())
+        message = match.group(1).strip() if match else "no error shown"
+        if message.startswith('Not enough stock'):
+            self.outcomes['sold_out'] += 1
+        else:
+            self.outcomes['refused'] += 1
+            self.failures[f"refused: {message}"] += 1
+
+    # -------- Checks --------
+    def check_stock(self):
+        """Every unit is still on the shelf, held by a preview or sold; never more sold than stocked."""
+        held = dict(StockHold.objects.filter(product__in=self.products)
+                    .values_list('product').annotate(Sum('qty')))
+        for product in Product.objects.filter(pk__in=[p.pk for p in self.products]):
+            revenue = Order.objects.filter(product=product).aggregate(total=Sum('total_purchase'))['total']
+            sold = (revenue or Money()).cents // product.price.cents
+            stock = self.options['stock']
+            if sold > stock:
+                self.violations.append({'check': 'oversell', 'product': product.product_id,
+                                        'detail': f"sold {sold} of {stock}"})
+            elif product.qty + held.get(product.pk, 0) + sold != stock:
+                self.violations.append({'check': 'stock', 'product': product.product_id,
+                                        'detail': f"{product.qty} on shelf + {held.get(product.pk, 0)} held "
+                                                  f"+ {sold} sold != {stock}"})
+
+    def check_cash_box(self, start):
+        """The cash box moved by exactly the recorded insertions minus the change paid out."""
+        columns = [piece_column(value) for value in DENOMINATIONS]
+        students = Student.objects.filter(name__startswith=STUDENT_PREFIX)
+        inserted = AmountInserted.objects.filter(student__in=students).aggregate(*(Sum(c) for c in columns))
+        returned = ChangeReturn.objects.filter(student__in=students).aggregate(*(Sum(c) for c in columns))
+        end = dict(CashBox.objects.values_list('denomination', 'count'))
+        for value, column in zip(DENOMINATIONS, columns):
+            moved = (inserted[f"{column}__sum"] or 0) - (returned[f"{column}__sum"] or 0)
+            if end.get(value, 0) - start.get(value, 0) != moved:
+                self.violations.append({'check': 'cash_box', 'denomination': value,
+                                        'detail': f"box moved {end.get(value, 0) - start.get(value, 0)}, "
+                                                  f"records say {moved}"})
+
+    def check_students(self):
+        """The database has every insertion and purchase the kiosks saw succeed, and nothing else."""
+        students = dict(Student.objects.filter(name__startswith=STUDENT_PREFIX).values_list('name', 'pk'))
+        for name in set(self.inserted) | set(self.bought) | set(students):
+            pk = students.get(name)
+            recorded = AmountInserted.objects.filter(student=pk).aggregate(total=Sum('total_amount'))['total']
+            if (recorded or Money()) != self.inserted[name]:
+                self.violations.append({'check': 'insertions', 'student': name,
+                                        'detail': f"recorded Rs {recorded or Money()}, inserted Rs {self.inserted[name]}"})
+
+            expected = {product.pk: product.price * qty for product in self.products
+                        if (qty := self.bought[name][product.pk])}
+            orders = dict(Order.objects.filter(student=pk).values_list('product').annotate(Sum('total_purchase')))
+            if orders != expected:
+                self.violations.append({'check': 'orders', 'student': name,
+                                        'detail': f"{len(orders)} products ordered, kiosk bought {len(expected)}"})
+
+    # -------- Results --------
+    def results(self, elapsed):
+        views = summarize(self.samples, elapsed)
+        journeys = sum(self.outcomes.values())
+        return {
+            'profile': self.options['profile'],
+            'kiosks': self.options['kiosks'],
+            'workers': self.options['workers'],
+            'think_time': self.options['think_time'],
+            'products': self.options['products'],
+            'stock': self.options['stock'],
+            'mix_skew': self.options['mix_skew'],
+            'seed': self.options['seed'],
+            'elapsed_s': round(elapsed, 2),
+            'requests_per_s': views.get('all', {}).get('rps', 0),
+            'journeys_per_min': round(journeys / elapsed * 60, 1),
+            'journeys': {key: self.outcomes[key] for key in ('completed', 'sold_out', 'refused', 'failed')},
+            'failures': dict(self.failures),
+            'views': views,
+            'violations': self.violations,
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{results['kiosks']} kiosks on {results['profile']} x{results['workers']}, "
+                          f"{results['elapsed_s']}s, think time {results['think_time']}s")
+        self.stdout.write(f"{'view':<34}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"{'queries':>9}{'errors':>8}")
+        for view, row in sorted(results['views'].items(), key=lambda item: item[0] == 'all'):
+            self.stdout.write(f"{view:<34}{row['count']:>7}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                              f"{row['p99_ms']:>9}{row.get('queries_mean', '-'):>9}{row['errors']:>8}")
+        self.stdout.write(f"{results['requests_per_s']} requests/s, {results['journeys_per_min']} journeys/min: "
+                          + ", ".join(f"{count} {key}" for key, count in results['journeys'].items()))
+        for reason, count in results['failures'].items():
+            self.stdout.write(self.style.WARNING(f"  {count} x {reason}"))
+        for violation in results['violations']:
+            self.stdout.write(self.style.ERROR(f"  {violation['check']}: {violation['detail']}"))
+        if not results['violations']:
+            self.stdout.write(self.style.SUCCESS("No oversells or consistency violations."))
@@ -0,0 +1,120 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from machine.loadgen import scratch_database
+from machine.models import Student, Product, AmountInserted, ChangeReturn, Order
+from machine.money import Money
+
+
+REPORT_INDEXES = [
+    (model, index)
+    for model in (Order, AmountInserted, ChangeReturn)
+    for index in model._meta.indexes
+]
+
+
+class Command(BaseCommand):
+    help = ("Seed transactions into a scratch database and show EXPLAIN plans and timings "
+            "for the report queries with and without the report indexes. The configured "
+            "database is not touched.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--rows', type=int, default=50000,
+                            help="Orders to seed; insertions and change returns get the same number.")
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.seed(options['students'], options['products'], options['rows'])
+            with_indexes = self.run_reports(options['iterations'])
+            self.remove_indexes()
+            without_indexes = self.run_reports(options['iterations'])
+
+        self.stdout.write("")
+        self.stdout.write(f"{'query':<28}{'no index':>12}{'indexed':>12}")
+        for name, (before, _) in without_indexes.items():
+            after = with_indexes[name][0]
+            self.stdout.write(f"{name:<28}{before:>10.3f}ms{after:>10.3f}ms")
+
+        for label, results in (("without indexes", without_indexes), ("with indexes", with_indexes)):
+            self.stdout.write("")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Plans {label}"))
+            for name, (_, plan) in results.items():
+                self.stdout.write(f"{name}:")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+    @transaction.atomic
+    def seed(self, student_count, product_count, rows):
+        rng = random.Random(0)
+        now = timezone.now()
+        students = Student.objects.bulk_create([
+            Student(name=f"Bench student {i}", campus='Ebene') for i in range(student_count)
+        ])
+        products = Product.objects.bulk_create([
+            Product(product_id=f"BENCH{i:05d}", name=f"Bench product {i}", qty=50,
+                    price=Money(2500), category='Cake')
+            for i in range(product_count)
+        ])
+
+        def when():
+            return now - timedelta(minutes=rng.randrange(60 * 24 * 365))
+
+        Order.objects.bulk_create([
+            Order(student=rng.choice(students), product=rng.choice(products),
+                  date_time=when(), total_purchase=Money(2500))
+            for _ in range(rows)
+        ], batch_size=2000)
+        AmountInserted.objects.bulk_create([
+            AmountInserted(student=rng.choice(students), date_time=when(),
+                           notes_50=1, total_amount=Money(5000))
+            for _ in range(rows)
+        ], batch_size=2000)
+        ChangeReturn.objects.bulk_create([
+            ChangeReturn(student=rng.choice(students), date_time=when(),
+                         coins_20=1, total_return=Money(2000))
+            for _ in range(rows)
+        ], batch_size=2000)
+
+        self.student = students[0]
+        self.product = products[0]
+        self.since = now - timedelta(days=30)
+        self.stdout.write(f"seeded {student_count} students, {product_count} products, {rows} rows per table")
+
+    def report_queries(self):
+        student, product, since = self.student, self.product, self.since
+        return {
+            'student orders': Order.objects.filter(student=student, date_time__gte=since)
+                                           .order_by('-date_time'),
+            'product sales': Order.objects.filter(product=product, date_time__gte=since)
+                                          .values('product').annotate(sold=Count('id'), revenue=Sum('total_purchase')),
+            'student insertions': AmountInserted.objects.filter(student=student, date_time__gte=since)
+                                                       .values('student').annotate(total=Sum('total_amount')),
+            'student change': ChangeReturn.objects.filter(student=student, date_time__gte=since)
+                                                  .values('student').annotate(total=Sum('total_return')),
+        }
+
+    def run_reports(self, iterations):
+        # SQLite keeps prepared statements per connection, and a cached plan
+        # would outlive the indexes it was built with.
+        connection.close()
+        results = {}
+        for name, queryset in self.report_queries().items():
+            plan = queryset.explain()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                list(queryset.all())
+            results[name] = ((time.perf_counter() - start) / iterations * 1000, plan)
+        return results
+
+    def remove_indexes(self):
+        # Only ever run on the scratch database, which is dropped afterwards.
+        with connection.schema_editor() as editor:
+            for model, index in REPORT_INDEXES:
+                editor.remove_index(model, index)
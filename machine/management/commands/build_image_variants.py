@@ -0,0 +1,35 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from machine.images import build_variants, needs_variants
+from machine.models import Product
+
+
+class Command(BaseCommand):
+    help = "Build the AVIF/WebP thumbnails of product images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild every product's variants.")
+
+    def handle(self, *args, **options):
+        built = skipped = failed = 0
+        original_bytes = variant_bytes = 0
+        for product in Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk'):
+            if not options['force'] and not needs_variants(product):
+                skipped += 1
+                continue
+            try:
+                variants = build_variants(product, force=options['force'])
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f"{product.product_id or product.pk} ({product.image.name}): {e}")
+                continue
+            built += 1
+            original_bytes += product.image.size
+            variant_bytes += default_storage.size(variants['avif'][0][1])
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built}, skipped {skipped}, failed {failed}."))
+        if built:
+            self.stdout.write(
+                f"Originals {original_bytes / 1024:.1f} KB, 1x AVIF tiles {variant_bytes / 1024:.1f} KB "
+                f"({original_bytes / max(variant_bytes, 1):.1f}x smaller)."
+            )
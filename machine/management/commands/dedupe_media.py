@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from machine.catalog import bump_catalog_version
+from machine.images import VARIANT_DIR
+from machine.models import Product
+from machine.storage import content_digest, image_references, product_image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move product images to content-hashed names so identical files are stored once, "
+        "point every product at the shared copy and delete the old duplicates. "
+        "--gc also deletes image and variant files that no product uses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without touching anything.")
+        parser.add_argument('--gc', action='store_true', help="Also delete unreferenced files under products/.")
+
+    def handle(self, *args, **options):
+        self.storage = product_image_storage
+        self.dry_run = options['dry_run']
+        self.written = 0
+
+        renamed = self.hash_images()
+        if renamed and not self.dry_run:
+            self.repoint_products(renamed)
+        freed = self.delete_unused(renamed) - self.written
+        if options['gc']:
+            freed += self.collect_garbage()
+
+        verb = "Would free" if self.dry_run else "Freed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(renamed)} images renamed to {len(set(renamed.values()))} blobs. {verb} {freed / 1024:.1f} KB."
+        ))
+
+    def hash_images(self):
+        """``{old name: content-hashed name}`` for every product image not stored under its hash yet."""
+        renamed = {}
+        names = (Product.objects.exclude(image='').exclude(image__isnull=True)
+                 .values_list('image', flat=True).distinct())
+        for name in names:
+            if not self.storage.exists(name):
+                self.stderr.write(f"Missing file: {name}")
+                continue
+            with self.storage.open(name, 'rb') as f:
+                hashed = self.storage.hashed_name(name, content_digest(f))
+                if hashed != name:
+                    if hashed not in renamed.values() and not self.storage.exists(hashed):
+                        self.written += self.storage.size(name)
+                        if not self.dry_run:
+                            self.storage.save(name, f)
+                    renamed[name] = hashed
+        return renamed
+
+    @transaction.atomic
+    def repoint_products(self, renamed):
+        now = timezone.now()
+        products = list(Product.objects.filter(image__in=list(renamed)))
+        for product in products:
+            old = product.image.name
+            product.image.name = renamed[old]
+            product.updated_at = now
+            if (product.image_variants or {}).get('source') == old:
+                # Same bytes, so the variants still apply.
+                product.image_variants = {**product.image_variants, 'source': renamed[old]}
+        Product.objects.bulk_update(products, ['image', 'image_variants', 'updated_at'], batch_size=500)
+        bump_catalog_version()
+
+    def delete_unused(self, renamed):
+        freed = 0
+        for old in renamed:
+            if self.dry_run or image_references(old) == 0:
+                freed += self.storage.size(old)
+                if not self.dry_run:
+                    self.storage.delete(old)
+        return freed
+
+    def collect_garbage(self):
+        used = set(Product.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True))
+        for variants in Product.objects.values_list('image_variants', flat=True):
+            for fmt in ('avif', 'webp'):
+                used.update(path for scale, path in (variants or {}).get(fmt, []))
+
+        freed = 0
+        for directory in ('products', VARIANT_DIR):
+            if not self.storage.exists(directory):
+                continue
+            for filename in self.storage.listdir(directory)[1]:
+                name = f"{directory}/{filename}"
+                if name not in used:
+                    freed += self.storage.size(name)
+                    if not self.dry_run:
+                        self.storage.delete(name)
+                    self.stdout.write(f"unreferenced: {name}")
+        return freed
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from machine.exports import CHUNK_SIZE, EXPORT_MODELS, FORMATS, ExportError, export_chunks
+from machine.management.commands.rebuild_rollups import parse_moment
+
+
+class Command(BaseCommand):
+    help = "Stream a transaction table to CSV or NDJSON, oldest first, in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=list(EXPORT_MODELS))
+        parser.add_argument('--format', dest='fmt', choices=list(FORMATS), default='csv')
+        parser.add_argument('--since', type=parse_moment, help="Only rows on or after this date.")
+        parser.add_argument('--until', type=parse_moment, help="Only rows before this date.")
+        parser.add_argument('--output', '-o', help="File to write; default stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            chunks = export_chunks(options['table'], options['fmt'], options['since'],
+                                   options['until'], options['chunk_size'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                out.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
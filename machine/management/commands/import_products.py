@@ -0,0 +1,41 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from machine.catalog import CatalogImportError, upsert_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a CSV (header: product_id,name,qty,price,category) "
+        "or a JSON list, keyed on product_id. Blank cells leave the field unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without writing them.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                if path.lower().endswith('.json'):
+                    rows = json.load(f)
+                else:
+                    rows = list(csv.DictReader(f))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        if not isinstance(rows, list):
+            raise CommandError("The JSON file must hold a list of products.")
+
+        try:
+            summary = upsert_products(rows, dry_run=options['dry_run'])
+        except CatalogImportError as e:
+            for error in e.errors:
+                self.stderr.write(error)
+            raise CommandError(f"{len(e.errors)} invalid rows; nothing was imported.")
+
+        prefix = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}: {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged."
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from machine.sync import TOMBSTONE_TTL, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = f"Delete deletion records older than {TOMBSTONE_TTL.days} days (run from cron)."
+
+    def handle(self, *args, **options):
+        pruned = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} tombstones."))
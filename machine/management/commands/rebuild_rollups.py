@@ -0,0 +1,41 @@
+from argparse import ArgumentTypeError
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from machine.rollups import first_transaction, rebuild_rollups
+
+
+def parse_moment(value):
+    """A date (midnight local time) or an ISO date-time from the command line."""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ArgumentTypeError(f"invalid date: {value!r}")
+    if timezone.is_naive(moment):
+        if len(value) <= 10:
+            moment = datetime.combine(moment.date(), time.min)
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales and cash rollups for a time window (default: all history) from the raw tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_moment, help="Start of the window, e.g. 2026-10-01.")
+        parser.add_argument('--until', type=parse_moment, help="End of the window (exclusive); default now.")
+
+    def handle(self, *args, **options):
+        until = options['until'] or timezone.now()
+        since = options['since'] or first_transaction()
+        if since is None:
+            self.stdout.write("No transactions to roll up.")
+            return
+        if since >= until:
+            raise CommandError("--since must be before --until.")
+
+        sales, cash = rebuild_rollups(since, until)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt rollups from {since:%Y-%m-%d %H:%M} to {until:%Y-%m-%d %H:%M}: "
+            f"{sales} sales rows, {cash} cash rows."
+        ))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from machine.change import refill_cash_box
+from machine.models import CashBox
+
+
+class Command(BaseCommand):
+    help = (
+        "Reset the cash box to the change float after it has been topped up or "
+        "banked: every note and coin is set to --count pieces (CASH_FLOAT by default)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=settings.CASH_FLOAT,
+                            help="Pieces of each denomination now in the machine.")
+
+    def handle(self, *args, **options):
+        refill_cash_box(options['count'])
+        for box in CashBox.objects.all():
+            self.stdout.write(str(box))
+        self.stdout.write(self.style.SUCCESS(f"Cash box refilled with {options['count']} of each denomination."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from machine.reservations import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Put the stock of expired preview holds back on the shelf (run from cron)."
+
+    def handle(self, *args, **options):
+        released = sweep_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds."))
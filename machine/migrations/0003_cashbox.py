@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_cash_box(apps, schema_editor):
+    CashBox = apps.get_model('machine', 'CashBox')
+    # Start with the configured float so the first sales can be given change.
+    CashBox.objects.bulk_create([
+        CashBox(denomination=value, count=settings.CASH_FLOAT)
+        for value in (200, 100, 50, 25, 20, 10, 5, 1)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0002_stockhold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashBox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('denomination', models.PositiveIntegerField(unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'cash box',
+                'ordering': ['-denomination'],
+            },
+        ),
+        migrations.RunPython(create_cash_box, migrations.RunPython.noop),
+    ]
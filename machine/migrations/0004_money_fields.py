@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:13
+
+import machine.money
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0003_cashbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='amountinserted',
+            name='total_amount',
+            field=machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='changereturn',
+            name='total_return',
+            field=machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='amount_inserted',
+            field=machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='balance',
+            field=machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='change_amount',
+            field=machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total_purchase',
+            field=machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=machine.money.MoneyField(decimal_places=2, max_digits=10),
+        ),
+    ]
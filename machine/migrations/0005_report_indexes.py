@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+def merge_duplicate_students(apps, schema_editor):
+    """Fold students with the same name and campus into the oldest row."""
+    Student = apps.get_model('machine', 'Student')
+    duplicates = (
+        Student.objects.values('name', 'campus')
+        .annotate(count=models.Count('id'), keep=models.Min('id'))
+        .filter(count__gt=1)
+    )
+    for dup in duplicates:
+        extra = Student.objects.filter(name=dup['name'], campus=dup['campus']).exclude(id=dup['keep'])
+        for model in ('AmountInserted', 'ChangeReturn', 'Order', 'StockHold'):
+            apps.get_model('machine', model).objects.filter(student__in=extra).update(student_id=dup['keep'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0004_money_fields'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='amountinserted',
+            index=models.Index(fields=['student', 'date_time'], name='amountins_student_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changereturn',
+            index=models.Index(fields=['student', 'date_time'], name='changeret_student_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['student', 'date_time'], name='order_student_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['product', 'date_time'], name='order_product_dt_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_students, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='student',
+            constraint=models.UniqueConstraint(fields=('name', 'campus'), name='machine_student_name_campus'),
+        ),
+    ]
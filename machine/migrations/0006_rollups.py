@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:20
+
+import django.db.models.deletion
+import machine.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0005_report_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('denomination', models.PositiveIntegerField()),
+                ('inserted', models.IntegerField(default=0)),
+                ('returned', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'denomination'), name='machine_cashrollup_hour_denom')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', machine.money.MoneyField(decimal_places=2, default=machine.money.Money, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='machine.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'product'), name='machine_salesrollup_hour_product')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:28
+
+import machine.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0008_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=machine.storage.get_product_image_storage, upload_to='products/'),
+        ),
+    ]
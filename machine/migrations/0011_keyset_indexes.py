@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0010_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='amountinserted',
+            index=models.Index(fields=['date_time', 'id'], name='amountins_dt_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changereturn',
+            index=models.Index(fields=['date_time', 'id'], name='changeret_dt_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['date_time', 'id'], name='order_dt_id_idx'),
+        ),
+    ]
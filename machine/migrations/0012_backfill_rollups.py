@@ -0,0 +1,59 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+
+# Cash box columns as of this migration, keyed by denomination.
+DENOMINATION_COLUMNS = {
+    200: 'notes_200', 100: 'notes_100', 50: 'notes_50', 25: 'notes_25',
+    20: 'coins_20', 10: 'coins_10', 5: 'coins_5', 1: 'coins_1',
+}
+
+
+def backfill_rollups(apps, schema_editor):
+    """Roll up the history from before the rollup tables existed."""
+    Order = apps.get_model('machine', 'Order')
+    AmountInserted = apps.get_model('machine', 'AmountInserted')
+    ChangeReturn = apps.get_model('machine', 'ChangeReturn')
+    SalesRollup = apps.get_model('machine', 'SalesRollup')
+    CashRollup = apps.get_model('machine', 'CashRollup')
+    hour = TruncHour('date_time', tzinfo=dt_timezone.utc)
+
+    SalesRollup.objects.all().delete()
+    CashRollup.objects.all().delete()
+
+    sales = (
+        Order.objects.filter(product__isnull=False)
+        .annotate(bucket=hour)
+        .values('bucket', 'product_id')
+        .annotate(count=Count('id'), total=Sum('total_purchase'))
+    )
+    SalesRollup.objects.bulk_create([
+        SalesRollup(hour=row['bucket'], product_id=row['product_id'],
+                    orders=row['count'], revenue=row['total'])
+        for row in sales
+    ])
+
+    cash = defaultdict(lambda: {'inserted': 0, 'returned': 0})
+    sums = {column: Sum(column) for column in DENOMINATION_COLUMNS.values()}
+    for model, counter in ((AmountInserted, 'inserted'), (ChangeReturn, 'returned')):
+        for row in model.objects.annotate(bucket=hour).values('bucket').annotate(**sums):
+            for value, column in DENOMINATION_COLUMNS.items():
+                if row[column]:
+                    cash[(row['bucket'], value)][counter] += row[column]
+    CashRollup.objects.bulk_create([
+        CashRollup(hour=bucket, denomination=value, **counts)
+        for (bucket, value), counts in cash.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('machine', '0011_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
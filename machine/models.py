@@ -1,5 +1,8 @@
+from django.core.files.storage import default_storage
 from django.db import models
 from django.utils import timezone
+from .money import Money, MoneyField
+from .storage import get_product_image_storage
 
 #  Student 
 class Student(models.Model):
@@ -10,6 +13,12 @@ class Student(models.Model):
     name = models.CharField(max_length=100)
     campus = models.CharField(max_length=50, choices=CAMPUS_CHOICES)
     join_in = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'campus'], name='machine_student_name_campus'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.campus}"
@@ -24,14 +33,35 @@ class Product(models.Model):
 
     product_id = models.CharField(max_length=20, unique=True, blank=True, null=True)
     name = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to='products/', storage=get_product_image_storage, blank=True, null=True)
+    # AVIF/WebP thumbnails of ``image``, written by machine.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     qty = models.PositiveIntegerField(default=0)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = MoneyField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.category})"
 
+    def image_variant_urls(self):
+        """``[(mime type, [(url, scale), ...])]``, best format first; empty until the variants of the current image exist."""
+        variants = self.image_variants or {}
+        if not self.image or variants.get('source') != self.image.name:
+            return []
+        return [
+            (f"image/{fmt}", [(default_storage.url(path), scale) for scale, path in variants[fmt]])
+            for fmt in ('avif', 'webp') if variants.get(fmt)
+        ]
+
+    @property
+    def image_sources(self):
+        """``[(mime type, srcset)]`` for the <source> tags of a <picture>."""
+        return [
+            (mime, ', '.join(f"{url} {scale}x" for url, scale in urls))
+            for mime, urls in self.image_variant_urls()
+        ]
+
 
 # Amount Inserted 
 class AmountInserted(models.Model):
@@ -45,14 +75,22 @@ class AmountInserted(models.Model):
     coins_10 = models.PositiveIntegerField(default=0)
     coins_5 = models.PositiveIntegerField(default=0)
     coins_1 = models.PositiveIntegerField(default=0)
-    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_amount = MoneyField(max_digits=10, decimal_places=2, default=Money)
     denominations = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'date_time'], name='amountins_student_dt_idx'),
+            # Keyset pagination (TransactionCursorPagination) and exports.
+            models.Index(fields=['date_time', 'id'], name='amountins_dt_id_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        self.total_amount = (
+        self.total_amount = Money(100 * (
             self.notes_200*200 + self.notes_100*100 + self.notes_50*50 + self.notes_25*25 +
             self.coins_20*20 + self.coins_10*10 + self.coins_5*5 + self.coins_1*1
-        )
+        ))
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -71,14 +109,22 @@ class ChangeReturn(models.Model):
     coins_10 = models.PositiveIntegerField(default=0)
     coins_5 = models.PositiveIntegerField(default=0)
     coins_1 = models.PositiveIntegerField(default=0)
-    total_return = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_return = MoneyField(max_digits=10, decimal_places=2, default=Money)
     denominations = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'date_time'], name='changeret_student_dt_idx'),
+            # Keyset pagination (TransactionCursorPagination) and exports.
+            models.Index(fields=['date_time', 'id'], name='changeret_dt_id_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        self.total_return = (
+        self.total_return = Money(100 * (
             self.notes_200*200 + self.notes_100*100 + self.notes_50*50 + self.notes_25*25 +
             self.coins_20*20 + self.coins_10*10 + self.coins_5*5 + self.coins_1*1
-        )
+        ))
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -90,10 +136,94 @@ class Order(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, blank=True, null=True)
     date_time = models.DateTimeField(default=timezone.now)
-    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    total_purchase = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    change_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    amount_inserted = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    balance = MoneyField(max_digits=10, decimal_places=2, default=Money)
+    total_purchase = MoneyField(max_digits=10, decimal_places=2, default=Money)
+    change_amount = MoneyField(max_digits=10, decimal_places=2, default=Money)
+    amount_inserted = MoneyField(max_digits=10, decimal_places=2, default=Money)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'date_time'], name='order_student_dt_idx'),
+            models.Index(fields=['product', 'date_time'], name='order_product_dt_idx'),
+            # Keyset pagination (TransactionCursorPagination) and exports.
+            models.Index(fields=['date_time', 'id'], name='order_dt_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.name} - Rs {self.total_purchase} (Change: Rs {self.change_amount})"
+
+
+#  Stock Hold 
+class StockHold(models.Model):
+    """Stock taken out of Product.qty while a student previews an order."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    qty = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.product_id} x{self.qty} held for student {self.student_id}"
+
+
+#  Cash Box 
+class CashBox(models.Model):
+    """How many pieces of each note/coin the machine holds for giving change."""
+    denomination = models.PositiveIntegerField(unique=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-denomination']
+        verbose_name_plural = 'cash box'
+
+    def __str__(self):
+        return f"Rs {self.denomination} x{self.count}"
+
+
+#  Rollups 
+class SalesRollup(models.Model):
+    """Orders and revenue per product per hour, kept up to date by machine.rollups."""
+    hour = models.DateTimeField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    orders = models.IntegerField(default=0)
+    revenue = MoneyField(max_digits=12, decimal_places=2, default=Money)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'product'], name='machine_salesrollup_hour_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.hour:%Y-%m-%d %H}:00 x{self.orders}"
+
+
+class CashRollup(models.Model):
+    """Pieces of one denomination inserted and returned as change per hour."""
+    hour = models.DateTimeField()
+    denomination = models.PositiveIntegerField()
+    inserted = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'denomination'], name='machine_cashrollup_hour_denom'),
+        ]
+
+    def __str__(self):
+        return f"Rs {self.denomination} @ {self.hour:%Y-%m-%d %H}:00 +{self.inserted} -{self.returned}"
+
+
+#  Tombstones 
+class Tombstone(models.Model):
+    """A deleted row, kept so ``?changed_since=`` clients can drop their copy (see machine.sync)."""
+    model = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'deleted_at'], name='tombstone_model_dt_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_pk} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,185 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from django.core import exceptions
+from django.db import models
+
+
+class Money:
+    """
+    An amount in rupees held as integer cents.
+
+    Immutable and slotted so the checkout loop can add and multiply amounts
+    without Decimal contexts or float rounding. Compares equal to plain
+    numbers of rupees (``Money(1000) == 10``), but only adds to Money.
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        if not isinstance(cents, int) or isinstance(cents, bool):
+            raise TypeError(f"Money takes integer cents, not {type(cents).__name__}")
+        object.__setattr__(self, 'cents', cents)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Money is immutable")
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
+
+    # -------- Conversion --------
+    @classmethod
+    def parse(cls, value):
+        """Money from a number of rupees given as Decimal, str, int or float."""
+        if isinstance(value, Money):
+            return value
+        try:
+            if isinstance(value, float):
+                # repr gives the shortest string that round-trips, so 0.1
+                # becomes 10 cents rather than 0.1000000000000000055...
+                value = repr(value)
+            amount = Decimal(value)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValueError(f"Invalid amount: {value!r}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid amount: {value!r}")
+        return cls(int((amount * 100).to_integral_value(ROUND_HALF_UP)))
+
+    @classmethod
+    def from_json(cls, value):
+        """
+        Inverse of ``to_json``. Floats are rupee amounts written to sessions
+        before Money existed.
+        """
+        if value is None:
+            return cls()
+        if isinstance(value, float):
+            return cls.parse(value)
+        return cls(int(value))
+
+    def to_json(self):
+        return self.cents
+
+    def to_decimal(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    # -------- Arithmetic --------
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        return NotImplemented
+
+    def __radd__(self, other):
+        # Lets sum() start from 0.
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __mul__(self, other):
+        if isinstance(other, int) and not isinstance(other, bool):
+            return Money(self.cents * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    # -------- Comparison --------
+    @staticmethod
+    def _cents_of(other):
+        if isinstance(other, Money):
+            return other.cents
+        if isinstance(other, (int, Decimal)) and not isinstance(other, bool):
+            return other * 100
+        return None
+
+    def __eq__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else self.cents == cents
+
+    def __lt__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else self.cents < cents
+
+    def __le__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else self.cents <= cents
+
+    def __gt__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else self.cents > cents
+
+    def __ge__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else self.cents >= cents
+
+    def __hash__(self):
+        # Same hash as the equal Decimal/int, as the comparisons promise.
+        return hash(self.to_decimal())
+
+    # -------- Display --------
+    def __str__(self):
+        sign = '-' if self.cents < 0 else ''
+        rupees, cents = divmod(abs(self.cents), 100)
+        return f"{sign}{rupees}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def __format__(self, spec):
+        if not spec:
+            return str(self)
+        return format(self.to_decimal(), spec)
+
+
+class MoneyField(models.DecimalField):
+    """A DecimalField column read and written as Money."""
+    description = "Amount of money"
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_digits', 10)
+        kwargs.setdefault('decimal_places', 2)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Money.parse(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        try:
+            return Money.parse(value)
+        except ValueError:
+            raise exceptions.ValidationError(
+                self.error_messages["invalid"],
+                code="invalid",
+                params={"value": value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        value = self.to_python(value)
+        return None if value is None else value.to_decimal()
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if hasattr(value, 'as_sql'):
+            return value
+        return connection.ops.adapt_decimalfield_value(value, self.max_digits, self.decimal_places)
+
+    def run_validators(self, value):
+        if isinstance(value, Money):
+            value = value.to_decimal()
+        super().run_validators(value)
@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TransactionCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the transaction tables, newest first.
+
+    Each page is a ``WHERE date_time < cursor ORDER BY date_time DESC, id DESC
+    LIMIT n`` query, so page cost does not grow with table size the way
+    OFFSET pagination does.
+    """
+    ordering = ('-date_time', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
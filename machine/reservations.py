@@ -0,0 +1,102 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.db.models.functions import Now
+from django.utils import timezone
+from .models import Product, StockHold
+from .catalog import bump_catalog_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Stock held by a preview goes back on the shelf after this many seconds.
+HOLD_TTL = getattr(settings, 'STOCK_HOLD_TTL', 120)
+
+
+# -------- Stock Updates --------
+def apply_stock_deltas(deltas):
+    """
+    Take ``deltas[product_id]`` units out of stock in a single UPDATE.
+
+    Negative deltas put stock back. Rows are only touched when they still hold
+    enough units (``WHERE qty >= n``), so no table lock is needed; returns
+    False when any product was short and the caller must roll back.
+    """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return True
+
+    condition = Q()
+    for pid, delta in deltas.items():
+        condition |= Q(pk=pid, qty__gte=delta) if delta > 0 else Q(pk=pid)
+
+    updated = Product.objects.filter(condition).update(
+        qty=Case(
+            *[When(pk=pid, then=F('qty') - delta) for pid, delta in deltas.items()],
+            default=F('qty'),
+            output_field=PositiveIntegerField(),
+        ),
+        updated_at=Now(),
+    )
+    bump_catalog_version()
+    return updated == len(deltas)
+
+
+def stock_deltas(cart, held):
+    """Units still to take from stock once the student's holds are used up."""
+    deltas = {pid: -qty for pid, qty in held.items()}
+    for pid, qty in cart.items():
+        deltas[pid] = deltas.get(pid, 0) + qty
+    return deltas
+
+
+# -------- Holds --------
+def claim_holds(student):
+    """
+    Delete every hold of ``student`` and return ``{product_id: qty}``.
+
+    Must run inside ``transaction.atomic``. Returns None when the sweeper
+    released one of the holds first, so the stock is no longer ours.
+    """
+    holds = list(StockHold.objects.filter(student=student).values_list('pk', 'product_id', 'qty'))
+    if not holds:
+        return {}
+
+    deleted, _ = StockHold.objects.filter(pk__in=[pk for pk, pid, qty in holds]).delete()
+    if deleted != len(holds):
+        return None
+
+    held = {}
+    for pk, pid, qty in holds:
+        held[pid] = held.get(pid, 0) + qty
+    return held
+
+
+def create_holds(student, cart):
+    expires_at = timezone.now() + timedelta(seconds=HOLD_TTL)
+    StockHold.objects.bulk_create([
+        StockHold(student=student, product_id=pid, qty=qty, expires_at=expires_at)
+        for pid, qty in cart.items()
+    ])
+
+
+def sweep_expired_holds(now=None):
+    """Put the stock of every expired hold back on the shelf."""
+    now = now or timezone.now()
+    expired = list(StockHold.objects.filter(expires_at__lte=now).values_list('pk', 'product_id', 'qty'))
+
+    released = 0
+    for pk, pid, qty in expired:
+        with transaction.atomic():
+            # A confirm may claim the hold at the same moment; whoever deletes
+            # the row owns its stock.
+            deleted, _ = StockHold.objects.filter(pk=pk).delete()
+            if deleted:
+                Product.objects.filter(pk=pid).update(qty=F('qty') + qty, updated_at=Now())
+                bump_catalog_version()
+                released += 1
+
+    if released:
+        logger.info(f"Released {released} expired stock holds")
+    return released
@@ -0,0 +1,194 @@
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Q, Sum, When
+from django.db.models.functions import TruncDay, TruncHour
+from .models import Order, AmountInserted, ChangeReturn, SalesRollup, CashRollup
+from .money import Money
+from .change import DENOMINATIONS, NOTES
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOUR = timedelta(hours=1)
+
+# AmountInserted/ChangeReturn column for each denomination.
+DENOMINATION_COLUMNS = {
+    value: f"{'notes' if value in NOTES else 'coins'}_{value}" for value in DENOMINATIONS
+}
+
+
+def hour_of(moment):
+    """Start of the UTC hour ``moment`` falls in; rollup rows are keyed by it."""
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+# -------- Incremental updates --------
+def _increment(model, key_fields, deltas, create=True):
+    """
+    Add ``deltas`` (``{key: {counter: amount}}``) to the rollup rows of
+    ``model`` in two queries, whatever the number of rows: missing rows are
+    inserted empty, then one CASE UPDATE adds every delta. Both statements are
+    safe against concurrent writers to the same rows.
+
+    Subtractions pass ``create=False``; a missing row has nothing to take away
+    from, and its product may be in the middle of being deleted.
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+
+    if create:
+        model.objects.bulk_create(
+            [model(**dict(zip(key_fields, key))) for key in deltas],
+            ignore_conflicts=True,
+        )
+
+    counters = {name for values in deltas.values() for name in values}
+    updates = {}
+    for name in counters:
+        field = model._meta.get_field(name)
+        whens = []
+        for key, values in deltas.items():
+            amount = values.get(name)
+            if not amount:
+                continue
+            if isinstance(amount, Money):
+                amount = amount.to_decimal()
+            whens.append(When(then=F(name) + amount, **dict(zip(key_fields, key))))
+        updates[name] = Case(*whens, default=F(name), output_field=field)
+
+    condition = Q()
+    for key in deltas:
+        condition |= Q(**dict(zip(key_fields, key)))
+    model.objects.filter(condition).update(**updates)
+
+
+def record_sales(orders, sign=1):
+    """Add ``orders`` (or take them away with ``sign=-1``) to the sales rollup."""
+    deltas = defaultdict(lambda: {'orders': 0, 'revenue': Money()})
+    for order in orders:
+        if order.product_id is None:
+            continue
+        bucket = deltas[(hour_of(order.date_time), order.product_id)]
+        bucket['orders'] += sign
+        bucket['revenue'] += order.total_purchase * sign
+    _increment(SalesRollup, ('hour', 'product_id'), deltas, create=sign > 0)
+
+
+def record_cash(rows, counter, sign=1):
+    """
+    Add the pieces of AmountInserted (``counter='inserted'``) or ChangeReturn
+    (``counter='returned'``) rows to the cash rollup, or take them away.
+    """
+    deltas = defaultdict(lambda: {counter: 0})
+    for row in rows:
+        hour = hour_of(row.date_time)
+        for value, column in DENOMINATION_COLUMNS.items():
+            pieces = getattr(row, column)
+            if pieces:
+                deltas[(hour, value)][counter] += pieces * sign
+    _increment(CashRollup, ('hour', 'denomination'), deltas, create=sign > 0)
+
+
+# -------- Rebuild --------
+def first_transaction():
+    """When the oldest order, insertion or change return happened, or None."""
+    firsts = [model.objects.aggregate(first=Min('date_time'))['first']
+              for model in (Order, AmountInserted, ChangeReturn)]
+    return min((first for first in firsts if first is not None), default=None)
+
+
+@transaction.atomic
+def rebuild_rollups(start, end):
+    """
+    Recompute every rollup hour overlapping ``[start, end)`` from the raw
+    tables. Returns the number of sales and cash rollup rows written.
+    """
+    start = hour_of(start)
+    end = hour_of(end - timedelta(microseconds=1)) + HOUR
+    window = {'date_time__gte': start, 'date_time__lt': end}
+    hour = TruncHour('date_time', tzinfo=dt_timezone.utc)
+
+    SalesRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+    CashRollup.objects.filter(hour__gte=start, hour__lt=end).delete()
+
+    sales = (
+        Order.objects.filter(product__isnull=False, **window)
+        .annotate(bucket=hour)
+        .values('bucket', 'product_id')
+        .annotate(count=Count('id'), total=Sum('total_purchase'))
+    )
+    sales_rows = SalesRollup.objects.bulk_create([
+        SalesRollup(hour=row['bucket'], product_id=row['product_id'],
+                    orders=row['count'], revenue=row['total'])
+        for row in sales
+    ])
+
+    cash = defaultdict(lambda: {'inserted': 0, 'returned': 0})
+    sums = {column: Sum(column) for column in DENOMINATION_COLUMNS.values()}
+    for model, counter in ((AmountInserted, 'inserted'), (ChangeReturn, 'returned')):
+        for row in model.objects.filter(**window).annotate(bucket=hour).values('bucket').annotate(**sums):
+            for value, column in DENOMINATION_COLUMNS.items():
+                if row[column]:
+                    cash[(row['bucket'], value)][counter] += row[column]
+    cash_rows = CashRollup.objects.bulk_create([
+        CashRollup(hour=bucket, denomination=value, **counts)
+        for (bucket, value), counts in cash.items()
+    ])
+
+    logger.info(f"Rebuilt rollups {start} - {end}: {len(sales_rows)} sales rows, {len(cash_rows)} cash rows")
+    return len(sales_rows), len(cash_rows)
+
+
+# -------- Reports --------
+def _bucketed(queryset, by):
+    if by == 'day':
+        return queryset.annotate(bucket=TruncDay('hour'))
+    return queryset.annotate(bucket=F('hour'))
+
+
+def _sales_rows(start, end, by):
+    return (
+        _bucketed(SalesRollup.objects.filter(hour__gte=start, hour__lt=end), by)
+        .values('bucket', 'product_id', 'product__name')
+        .annotate(orders=Sum('orders'), revenue=Sum('revenue'))
+        .order_by('bucket', 'product_id')
+    )
+
+
+def _sales_entry(row):
+    return {'period': row['bucket'], 'product': row['product_id'], 'product_name': row['product__name'],
+            'orders': row['orders'], 'revenue': row['revenue']}
+
+
+def _cash_rows(start, end, by):
+    return (
+        _bucketed(CashRollup.objects.filter(hour__gte=start, hour__lt=end), by)
+        .values('bucket', 'denomination')
+        .annotate(inserted=Sum('inserted'), returned=Sum('returned'))
+        .order_by('bucket', '-denomination')
+    )
+
+
+def _cash_entry(row):
+    return {'period': row['bucket'], 'denomination': row['denomination'],
+            'inserted': row['inserted'], 'returned': row['returned']}
+
+
+def sales_report(start, end, by='hour'):
+    """Orders and revenue per product per hour or day, read from the rollup only."""
+    return [_sales_entry(row) for row in _sales_rows(start, end, by)]
+
+
+def cash_report(start, end, by='hour'):
+    """Pieces of each denomination inserted and returned per hour or day, read from the rollup only."""
+    return [_cash_entry(row) for row in _cash_rows(start, end, by)]
+
+
+async def asales_report(start, end, by='hour'):
+    return [_sales_entry(row) async for row in _sales_rows(start, end, by)]
+
+
+async def acash_report(start, end, by='hour'):
+    return [_cash_entry(row) async for row in _cash_rows(start, end, by)]
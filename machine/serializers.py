@@ -1,27 +1,139 @@
 from rest_framework import serializers
 from .models import Student, Product, AmountInserted, ChangeReturn, Order
+from .money import Money, MoneyField
+from .change import COINS, NOTES
 
-class StudentSerializer(serializers.ModelSerializer):
+
+class MoneySerializerField(serializers.DecimalField):
+    """Money in and out of the API, written the way DRF writes decimals ("12.50")."""
+
+    def to_internal_value(self, data):
+        return Money.parse(super().to_internal_value(data))
+
+    def to_representation(self, value):
+        if isinstance(value, Money):
+            value = value.to_decimal()
+        return super().to_representation(value)
+
+    def run_validators(self, value):
+        if isinstance(value, Money):
+            value = value.to_decimal()
+        super().run_validators(value)
+
+
+def requested_expansions(request, serializer_class):
+    """Relations asked for with ``?expand=student,product`` that the serializer can inline."""
+    expandable = getattr(serializer_class.Meta, 'expandable', {})
+    if request is None or not expandable:
+        return set()
+    expand = request.query_params.get('expand', '')
+    return {name.strip() for name in expand.split(',')} & set(expandable)
+
+
+def requested_fields(request):
+    """Field names asked for with ``?fields=`` on a read request, or None."""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+class ModelSerializer(serializers.ModelSerializer):
+    """
+    Base for the API serializers. ``?fields=id,name`` on a GET limits the
+    output to those fields. Fields listed in ``Meta.expandable`` are only sent
+    when their relation is named in ``?expand=``; the viewsets select_related
+    it so expanding costs no extra queries.
+    """
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        MoneyField: MoneySerializerField,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        expanded = requested_expansions(request, type(self))
+        for relation, names in getattr(self.Meta, 'expandable', {}).items():
+            if relation not in expanded:
+                for name in names:
+                    self.fields.pop(name, None)
+
+        requested = requested_fields(request)
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class StudentSerializer(ModelSerializer):
     class Meta:
         model = Student
         fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ModelSerializer):
+    image_sources = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['image_variants']
+
+    def get_image_sources(self, product):
+        """``{mime type: srcset}`` of the AVIF/WebP thumbnails, best first."""
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request is not None else str
+        return {
+            mime: ', '.join(f"{absolute(url)} {scale}x" for url, scale in urls)
+            for mime, urls in product.image_variant_urls()
+        }
+
+class AmountInsertedSerializer(ModelSerializer):
+    student_name = serializers.CharField(source='student.name', read_only=True)
 
-class AmountInsertedSerializer(serializers.ModelSerializer):
     class Meta:
         model = AmountInserted
         fields = '__all__'
+        expandable = {'student': ['student_name']}
+
+class ChangeReturnSerializer(ModelSerializer):
+    student_name = serializers.CharField(source='student.name', read_only=True)
 
-class ChangeReturnSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChangeReturn
         fields = '__all__'
+        expandable = {'student': ['student_name']}
+
+class OrderSerializer(ModelSerializer):
+    student_name = serializers.CharField(source='student.name', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True, allow_null=True)
+    product_price = MoneySerializerField(source='product.price', read_only=True, allow_null=True,
+                                         max_digits=10, decimal_places=2)
 
-class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = '__all__'
+        expandable = {'student': ['student_name'], 'product': ['product_name', 'product_price']}
+
+
+class CashInsertionSerializer(serializers.Serializer):
+    """A whole payment from a kiosk, e.g. ``{"notes": {"200": 1}, "coins": {"5": 3}}``."""
+    notes = serializers.DictField(child=serializers.IntegerField(min_value=0), required=False, default=dict)
+    coins = serializers.DictField(child=serializers.IntegerField(min_value=0), required=False, default=dict)
+
+    def _check(self, value, allowed, kind):
+        unknown = [k for k in value if k not in {str(v) for v in allowed}]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown {kind}: {', '.join(unknown)}.")
+        return {k: n for k, n in value.items() if n}
+
+    def validate_notes(self, value):
+        return self._check(value, NOTES, 'notes')
+
+    def validate_coins(self, value):
+        return self._check(value, COINS, 'coins')
+
+    def validate(self, attrs):
+        if not attrs['notes'] and not attrs['coins']:
+            raise serializers.ValidationError("Please insert some notes or coins first.")
+        return attrs
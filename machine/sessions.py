@@ -0,0 +1,48 @@
+import time
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLUSHED_AT = '_db_flushed_at'
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cached-db sessions that coalesce database writes.
+
+    Every save goes to the session cache, which is file based and survives
+    worker restarts. The django_session row is only rewritten when the session
+    is created, when a view calls ``persist()`` (confirming money or an order)
+    or once SESSION_FLUSH_INTERVAL seconds have passed since the last write,
+    so a dozen coin clicks cost cache writes instead of a dozen UPDATEs.
+    """
+    cache_key_prefix = 'machine.sessions'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._persist = False
+
+    def persist(self):
+        """Write this session through to the database on the next save."""
+        self._persist = True
+        self.modified = True
+
+    def _db_write_due(self, must_create):
+        if must_create or self._persist or self.session_key is None:
+            return True
+        interval = getattr(settings, 'SESSION_FLUSH_INTERVAL', 30)
+        return time.time() - self._session.get(FLUSHED_AT, 0) >= interval
+
+    def save(self, must_create=False):
+        if not self._db_write_due(must_create):
+            try:
+                self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+                return
+            except Exception:
+                logger.exception("Error saving session to cache, writing to the database instead")
+
+        self._session[FLUSHED_AT] = time.time()
+        self._persist = False
+        super().save(must_create)
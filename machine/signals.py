@@ -1,5 +1,106 @@
 # signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from machine.models import Order, ChangeReturn, AmountInserted
-from decimal import Decimal
\ No newline at end of file
+from machine.models import Student, Product, Order, ChangeReturn, AmountInserted
+from machine.catalog import bump_catalog_version
+from machine.rollups import record_cash, record_sales
+from machine.conditional import mark_deleted
+from machine.images import needs_variants, schedule_variants
+from machine.storage import release_image
+from machine.sync import record_tombstone
+from decimal import Decimal
+
+
+# -------- Catalog cache --------
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+# -------- Image blobs --------
+# Images are stored once per content hash and may be shared by several
+# products; a blob is deleted when the last product stops using it.
+@receiver(pre_save, sender=Product)
+def product_image_changing(sender, instance, raw=False, **kwargs):
+    instance._previous_image = None
+    if not raw and instance.pk is not None:
+        instance._previous_image = (
+            Product.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def product_image_replaced(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if previous and previous != instance.image.name:
+        release_image(previous)
+
+
+@receiver(post_delete, sender=Product)
+def product_image_deleted(sender, instance, **kwargs):
+    release_image(instance.image.name)
+
+
+# -------- Image variants --------
+@receiver(post_save, sender=Product)
+def product_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw and needs_variants(instance):
+        schedule_variants(instance)
+
+
+# -------- Rollups --------
+# Checkout writes its orders with bulk_create, which sends no signals, and
+# records them itself. These cover everything else, including admin edits:
+# the row as it was is read before the save, and only once the save has
+# gone through is it swapped for the new one, in a single transaction.
+ROLLUP_COUNTERS = {AmountInserted: 'inserted', ChangeReturn: 'returned'}
+
+
+def _record(instance, sign):
+    if isinstance(instance, Order):
+        record_sales([instance], sign)
+    else:
+        record_cash([instance], ROLLUP_COUNTERS[type(instance)], sign)
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=AmountInserted)
+@receiver(pre_save, sender=ChangeReturn)
+def transaction_changing(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=AmountInserted)
+@receiver(post_save, sender=ChangeReturn)
+def transaction_saved(sender, instance, raw=False, **kwargs):
+    previous = instance.__dict__.pop('_rollup_previous', None)
+    if raw:
+        return
+    with transaction.atomic(savepoint=False):
+        if previous is not None:
+            _record(previous, -1)
+        _record(instance, 1)
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=AmountInserted)
+@receiver(post_delete, sender=ChangeReturn)
+def transaction_deleted(sender, instance, **kwargs):
+    _record(instance, -1)
+    mark_deleted(sender)
+
+
+# -------- Tombstones --------
+# Delta sync clients (?changed_since=) learn about deletions from these.
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=AmountInserted)
+@receiver(post_delete, sender=ChangeReturn)
+def row_deleted(sender, instance, **kwargs):
+    record_tombstone(instance)
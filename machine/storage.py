@@ -0,0 +1,81 @@
+import hashlib
+import os
+import re
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Names written by ContentAddressedStorage (and the image variants, which are
+# named after the same hash) never change content, so they can be cached
+# forever.
+IMMUTABLE_NAME = re.compile(r'(^|/)[0-9a-f]{16,64}[^/]*$')
+
+
+def content_digest(content):
+    """sha256 hex digest of a File, read in chunks."""
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each upload as ``<upload dir>/<sha256><ext>``. Saving bytes that
+    are already stored returns the existing name instead of writing a copy
+    with a random suffix, so re-uploading the same picture costs nothing.
+    Two writers racing on the same name write the same bytes, hence
+    ``allow_overwrite``.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, f"{digest}{ext}").replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = self.hashed_name(self.generate_filename(name), content_digest(content))
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+product_image_storage = ContentAddressedStorage()
+
+
+def get_product_image_storage():
+    return product_image_storage
+
+
+# -------- Reference counting --------
+def image_references(name):
+    """How many products use the stored file ``name``."""
+    from .models import Product
+    return Product.objects.filter(image=name).count()
+
+
+def release_image(name):
+    """Delete the blob ``name`` once the current transaction commits, if no product uses it any more."""
+    if not name:
+        return
+
+    def delete_if_unused():
+        if image_references(name) == 0 and product_image_storage.exists(name):
+            product_image_storage.delete(name)
+            logger.info(f"Deleted unreferenced image {name}")
+
+    transaction.on_commit(delete_if_unused)
@@ -0,0 +1,107 @@
+import base64
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Tombstone
+
+# Rows are read in (updated_at, pk) order, at most this many per response.
+SYNC_PAGE_SIZE = 1000
+MAX_SYNC_PAGE_SIZE = 5000
+
+# A row's updated_at is set when it is saved, which can be a moment before
+# its transaction commits; the cursor handed back at the end of a sync
+# reaches back this far so such rows are not missed. Clients see those rows
+# twice, which is harmless since applying a row is an upsert.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# Tombstones older than this are pruned; a cursor older than this can no
+# longer be brought up to date and the client has to start over.
+TOMBSTONE_TTL = timedelta(days=30)
+
+
+class SyncCursorError(Exception):
+    """Raised for a cursor that is malformed or too old to sync from."""
+
+    def __init__(self, message, expired=False):
+        super().__init__(message)
+        self.expired = expired
+
+
+# -------- Cursors --------
+def encode_cursor(moment, pk=None):
+    """
+    An opaque, URL-safe cursor. Without ``pk`` it means "rows updated at or
+    after ``moment``"; with ``pk`` it continues a truncated response after
+    that row.
+    """
+    raw = moment.isoformat() if pk is None else f"{moment.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(moment, pk)`` from a cursor, or ``(None, None)`` for an empty one (a full sync)."""
+    if not cursor:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except ValueError:
+        raise SyncCursorError("Invalid cursor.")
+    stamp, _, pk = raw.partition('|')
+    moment = parse_datetime(stamp)
+    if moment is None or timezone.is_naive(moment):
+        raise SyncCursorError("Invalid cursor.")
+    if moment < timezone.now() - TOMBSTONE_TTL:
+        raise SyncCursorError("Cursor expired; sync again from scratch.", expired=True)
+    return moment, pk or None
+
+
+# -------- Tombstones --------
+def record_tombstone(instance):
+    Tombstone.objects.create(model=instance._meta.label_lower, object_pk=str(instance.pk))
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than TOMBSTONE_TTL; returns how many."""
+    cutoff = (now or timezone.now()) - TOMBSTONE_TTL
+    return Tombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
+
+
+# -------- Changes --------
+def changes_since(queryset, cursor, limit=SYNC_PAGE_SIZE):
+    """
+    What changed in ``queryset`` after ``cursor``:
+    ``(rows, deleted pks, next cursor, more)``. ``more`` means the rows were
+    cut at ``limit`` and the next cursor continues from the last one.
+    Deletions are only reported to a client that already has rows.
+    """
+    since, after_pk = decode_cursor(cursor)
+    started = timezone.now()
+
+    changed = queryset.order_by('updated_at', 'pk')
+    if since is not None:
+        if after_pk is None:
+            changed = changed.filter(updated_at__gte=since)
+        else:
+            try:
+                after_pk = queryset.model._meta.pk.to_python(after_pk)
+            except ValidationError:
+                raise SyncCursorError("Invalid cursor.")
+            changed = changed.filter(Q(updated_at__gt=since) | Q(updated_at=since, pk__gt=after_pk))
+    rows = list(changed[:limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    deleted = []
+    if since is not None:
+        deleted = list(
+            Tombstone.objects.filter(model=queryset.model._meta.label_lower, deleted_at__gte=since)
+            .values_list('object_pk', flat=True).distinct()
+        )
+
+    if more:
+        next_cursor = encode_cursor(rows[-1].updated_at, rows[-1].pk)
+    else:
+        next_cursor = encode_cursor(started - SYNC_OVERLAP)
+    return rows, deleted, next_cursor, more
@@ -1,3 +1,1585 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import threading
+import time
+from io import BytesIO, StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from .models import (
+    Student, Product, Order, ChangeReturn, StockHold, CashBox, AmountInserted, SalesRollup, CashRollup
+)
+from .checkout import CheckoutError, build_cart, checkout, reserve_cart
+from .reservations import sweep_expired_holds
+from .catalog import clear_catalog_cache, get_catalog, upsert_products
+from .change import CHANGE_CACHE_SIZE, DENOMINATIONS, ChangeError, _fewest_pieces, cash_stock, make_change, record_insertion
+from .money import Money
+from .sessions import SessionStore
+from .rollups import hour_of, record_cash, record_sales
 
 
+def make_products(count, qty=10, price='10.00'):
+    return Product.objects.bulk_create([
+        Product(product_id=f"P{i:04d}", name=f"Product {i}", qty=qty,
+                price=Decimal(price), category='Cake')
+        for i in range(count)
+    ])
+
+
+def fill_cash_box(count=100, **counts):
+    CashBox.objects.all().delete()
+    CashBox.objects.bulk_create([
+        CashBox(denomination=value, count=counts.get(f"rs{value}", count))
+        for value in DENOMINATIONS
+    ])
+
+
+#  Checkout
+class CheckoutTests(TestCase):
+    def setUp(self):
+        clear_catalog_cache()
+        fill_cash_box()
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+
+    def test_checkout_decrements_stock_and_writes_orders(self):
+        products = make_products(3)
+        cart = {p.id: 2 for p in products}
+
+        result = checkout(self.student, Decimal('100.00'), cart)
+
+        self.assertEqual(result['total_purchase'], Decimal('60.00'))
+        self.assertEqual(result['change'], Decimal('40.00'))
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(ChangeReturn.objects.get().total_return, 40)
+        self.assertEqual(set(Product.objects.values_list('qty', flat=True)), {8})
+
+    def test_query_count_is_independent_of_cart_size(self):
+        small = make_products(1)
+        with self.assertNumQueries(13):
+            checkout(self.student, Decimal('1000.00'), {small[0].id: 1})
+
+        large = Product.objects.bulk_create([
+            Product(product_id=f"L{i:04d}", name=f"Large {i}", qty=10,
+                    price=Decimal('1.00'), category='Cake')
+            for i in range(25)
+        ])
+        with self.assertNumQueries(13):
+            checkout(self.student, Decimal('1000.00'), {p.id: 1 for p in large})
+
+    def test_insufficient_stock_rolls_back(self):
+        products = make_products(2, qty=1)
+        cart = {products[0].id: 1, products[1].id: 2}
+
+        with self.assertRaises(CheckoutError):
+            checkout(self.student, Decimal('100.00'), cart)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(set(Product.objects.values_list('qty', flat=True)), {1})
+
+    def test_insufficient_balance_is_refused(self):
+        products = make_products(1)
+        with self.assertRaises(CheckoutError):
+            checkout(self.student, Decimal('5.00'), {products[0].id: 1})
+
+    def test_build_cart_merges_lines_and_skips_empty(self):
+        self.assertEqual(build_cart(['1', '2', '1'], ['1', '0', '2']), {1: 3})
+        with self.assertRaises(CheckoutError):
+            build_cart(['1', '2'], ['1'])
+
+    def test_confirm_order_view(self):
+        products = make_products(2)
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session['balance'] = 50.0
+        session.save()
+
+        response = self.client.post(reverse('student_dashboard'), {
+            'confirm_order': '1',
+            'product_id': [products[0].id, products[1].id],
+            'qty': ['1', '2'],
+        })
+
+        self.assertRedirects(response, reverse('receipt'), fetch_redirect_response=False)
+        # The 50.0 above is a pre-Money float; the Rs 20 left was paid out as change.
+        self.assertEqual(self.client.session['balance'], 0)
+        self.assertEqual(self.client.session['receipt']['total_purchase'], 3000)
+        self.assertEqual(self.client.session['receipt']['change'], 2000)
+        self.assertContains(self.client.get(reverse('receipt')), 'Rs 20.00')
+
+    def test_change_is_paid_once(self):
+        product = make_products(1, price='35.00')[0]
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session.save()
+        self.client.post(reverse('balance_page'), {'add_note': '100'})
+        self.client.post(reverse('balance_page'), {'add_note': '100'})
+        self.client.post(reverse('balance_page'), {'confirm_balance': '1'})
+
+        self.client.post(reverse('student_dashboard'), {
+            'confirm_order': '1', 'product_id': [product.id], 'qty': ['1'],
+        })
+        self.assertEqual(ChangeReturn.objects.get(student=self.student).total_return, Money(16500))
+        self.assertEqual(self.client.session['balance'], 0)
+
+
+#  Stock Holds
+class StockHoldTests(TestCase):
+    def setUp(self):
+        fill_cash_box()
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        self.other = Student.objects.create(name='Ravi', campus='Ebene')
+        self.product = make_products(1, qty=3)[0]
+
+    def stock(self):
+        return Product.objects.get(pk=self.product.pk).qty
+
+    def test_preview_holds_stock_and_confirm_uses_it(self):
+        reserve_cart(self.student, Decimal('100.00'), {self.product.id: 2})
+        self.assertEqual(self.stock(), 1)
+
+        with self.assertRaises(CheckoutError):
+            checkout(self.other, Decimal('100.00'), {self.product.id: 2})
+
+        checkout(self.student, Decimal('100.00'), {self.product.id: 2})
+        self.assertEqual(self.stock(), 1)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_new_preview_replaces_previous_hold(self):
+        reserve_cart(self.student, Decimal('100.00'), {self.product.id: 3})
+        reserve_cart(self.student, Decimal('100.00'), {self.product.id: 1})
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(StockHold.objects.get().qty, 1)
+
+    def test_confirm_returns_unused_hold(self):
+        reserve_cart(self.student, Decimal('100.00'), {self.product.id: 3})
+        checkout(self.student, Decimal('100.00'), {self.product.id: 1})
+        self.assertEqual(self.stock(), 2)
+
+    def test_expired_holds_are_swept_back(self):
+        reserve_cart(self.student, Decimal('100.00'), {self.product.id: 2})
+        self.assertEqual(sweep_expired_holds(), 0)
+
+        released = sweep_expired_holds(now=timezone.now() + timedelta(hours=1))
+        self.assertEqual(released, 1)
+        self.assertEqual(self.stock(), 3)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_preview_refused_without_balance_places_no_hold(self):
+        with self.assertRaises(CheckoutError):
+            reserve_cart(self.student, Decimal('1.00'), {self.product.id: 1})
+        self.assertEqual(self.stock(), 3)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Many kiosks buying the same product at once must never oversell.
+
+    Runs against whatever database is configured; set DATABASE_URL to a
+    Postgres server to exercise real concurrent writers.
+    """
+    buyers = 20
+
+    def race(self, stock):
+        """Every buyer previews and confirms one unit at once; returns (sold, refused, errors)."""
+        fill_cash_box()
+        product = make_products(1, qty=stock)[0]
+        students = [Student.objects.create(name=f"S{i}", campus='Ebene') for i in range(self.buyers)]
+        barrier = threading.Barrier(self.buyers)
+        sold, refused, errors = [], [], []
+
+        def buy(student):
+            barrier.wait()
+            try:
+                reserve_cart(student, Decimal('100.00'), {product.id: 1})
+                checkout(student, Decimal('100.00'), {product.id: 1})
+                sold.append(student.id)
+            except CheckoutError:
+                refused.append(student.id)
+            except Exception as e:
+                errors.append(repr(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(s,)) for s in students]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        product.refresh_from_db()
+        self.assertEqual(Order.objects.count(), len(sold))
+        self.assertEqual(product.qty + StockHold.objects.filter(product=product).count(), stock - len(sold))
+        return sold, refused, errors
+
+    def test_concurrent_checkouts_never_oversell(self):
+        sold, refused, errors = self.race(stock=5)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sold), 5)
+        self.assertEqual(len(refused), self.buyers - 5)
+
+    def test_concurrent_checkouts_all_succeed_with_stock(self):
+        sold, refused, errors = self.race(stock=100)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(sold), self.buyers)
+
+
+#  Catalog Cache
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        clear_catalog_cache()
+        fill_cash_box()
+        self.products = make_products(3)
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+
+    def product_queries(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries if 'machine_product' in q['sql']]
+
+    def test_catalog_is_read_once_per_version(self):
+        with self.assertNumQueries(1):
+            get_catalog()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_catalog()), 3)
+
+    def test_product_save_invalidates_catalog(self):
+        get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.products[0].pk).update(name='Renamed')
+            product = Product.objects.get(pk=self.products[0].pk)
+            product.save()
+
+        with self.assertNumQueries(1):
+            names = [p.name for p in get_catalog()]
+        self.assertIn('Renamed', names)
+
+    def test_checkout_invalidates_catalog(self):
+        get_catalog()
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout(self.student, Decimal('100.00'), {self.products[0].id: 4})
+
+        qtys = {p.pk: p.qty for p in get_catalog()}
+        self.assertEqual(qtys[self.products[0].pk], 6)
+
+    def test_dashboard_and_api_served_from_cache(self):
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session.save()
+        self.client.get(reverse('student_dashboard'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('student_dashboard'))
+            self.client.get('/api/products/')
+        self.assertContains(response, 'Product 2')
+        self.assertEqual(self.product_queries(ctx), [])
+
+    def test_product_grid_fragment_follows_catalog_version(self):
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session.save()
+        self.assertContains(self.client.get(reverse('student_dashboard')), 'Product 1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.products[1].pk)
+            product.name = 'Fresh Cake'
+            product.save()
+
+        response = self.client.get(reverse('student_dashboard'))
+        self.assertContains(response, 'Fresh Cake')
+        self.assertNotContains(response, 'Product 1<')
+
+
+#  Change Engine
+class ChangeEngineTests(TestCase):
+    def stock(self, **counts):
+        return tuple(counts.get(f"rs{value}", 0) for value in DENOMINATIONS)
+
+    def test_fewest_pieces_from_full_stock(self):
+        change = make_change(Decimal('287'), self.stock(rs200=5, rs50=5, rs25=5, rs10=5, rs1=5))
+        self.assertEqual(change["notes"], {"200": 1, "100": 0, "50": 1, "25": 1})
+        self.assertEqual(change["coins"], {"20": 0, "10": 1, "5": 0, "1": 2})
+
+    def test_uses_what_is_in_the_box_not_greedy(self):
+        # Greedy would take the 25 and then get stuck on 5.
+        change = make_change(30, self.stock(rs25=1, rs10=3))
+        self.assertEqual(change["notes"]["25"], 0)
+        self.assertEqual(change["coins"]["10"], 3)
+
+    def test_impossible_change_is_refused(self):
+        with self.assertRaises(ChangeError):
+            make_change(7, self.stock(rs5=3))
+        with self.assertRaises(ChangeError):
+            make_change(Decimal('2.50'), self.stock(rs1=10))
+
+    def test_repeat_plan_for_same_box_is_cached(self):
+        stock = self.stock(rs25=4, rs10=10, rs1=20)
+        make_change(73, stock)
+        hits = _fewest_pieces.cache_info().hits
+        with mock.patch('machine.change._change_table') as build:
+            self.assertEqual(make_change(73, list(stock)), make_change(73, stock))
+        build.assert_not_called()
+        self.assertEqual(_fewest_pieces.cache_info().hits, hits + 2)
+        self.assertLessEqual(_fewest_pieces.cache_info().currsize, CHANGE_CACHE_SIZE)
+
+    def test_checkout_refused_when_box_cannot_pay(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        product = make_products(1)[0]
+        fill_cash_box(count=0)
+
+        with self.assertRaises(CheckoutError):
+            checkout(student, Decimal('15.00'), {product.id: 1})
+        self.assertEqual(Product.objects.get(pk=product.pk).qty, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_insertion_credits_and_change_debits_cash_box(self):
+        fill_cash_box(count=0)
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        product = make_products(1, price='10.00')[0]
+        session = self.client.session
+        session['student_id'] = student.id
+        session.save()
+
+        self.client.post(reverse('balance_page'), {'add_note': '50'})
+        self.client.post(reverse('balance_page'), {'add_coin': '10'})
+        self.client.post(reverse('balance_page'), {'add_coin': '10'})
+        self.client.post(reverse('balance_page'), {'confirm_balance': '1'})
+        self.assertEqual(cash_stock(), self.stock(rs50=1, rs10=2))
+        self.assertEqual(AmountInserted.objects.get().total_amount, 70)
+
+        checkout(student, Decimal('70.00'), {product.id: 1})
+        self.assertEqual(cash_stock(), self.stock(rs10=1))
+        self.assertEqual(ChangeReturn.objects.get().total_return, 60)
+
+    def test_freshly_migrated_box_gives_change(self):
+        # No fill_cash_box(): the migration seeds the box with CASH_FLOAT.
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        product = make_products(1, price='35.00')[0]
+
+        result = checkout(student, Decimal('100.00'), {product.id: 1})
+        self.assertEqual(result['change'], Decimal('65.00'))
+        self.assertEqual(ChangeReturn.objects.get().total_return, 65)
+
+    def test_refill_command_resets_the_float(self):
+        fill_cash_box(count=0, rs50=3)
+        CashBox.objects.filter(denomination=1).delete()
+
+        call_command('refill_cash_box', '--count', '7', stdout=StringIO())
+        self.assertEqual(cash_stock(), (7,) * len(DENOMINATIONS))
+
+    def test_unknown_denomination_is_rejected(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        session = self.client.session
+        session['student_id'] = student.id
+        session.save()
+
+        response = self.client.post(reverse('balance_page'), {'add_note': '7'})
+        self.assertContains(response, 'Invalid note.')
+
+
+#  Cash Record Audit
+class AuditCashRecordsTests(TestCase):
+    def test_flags_and_fixes_mismatching_rows(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        good = AmountInserted.objects.create(student=student, notes_50=1, coins_5=2,
+                                             denominations={"notes": {"50": 1}, "coins": {"5": 2}})
+        bad_total = AmountInserted.objects.create(student=student, notes_100=1,
+                                                  denominations={"notes": {"100": 1}, "coins": {}})
+        AmountInserted.objects.filter(pk=bad_total.pk).update(total_amount=90)
+        bad_json = ChangeReturn.objects.create(student=student, coins_10=3, denominations={})
+
+        out = StringIO()
+        call_command('audit_cash_records', stdout=out)
+        self.assertIn("amountinserted: 2 rows checked, 1 flagged", out.getvalue())
+        self.assertIn("changereturn: 1 rows checked, 1 flagged", out.getvalue())
+
+        call_command('audit_cash_records', '--fix', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(AmountInserted.objects.get(pk=bad_total.pk).total_amount, 100)
+        self.assertEqual(ChangeReturn.objects.get(pk=bad_json.pk).denominations["coins"]["10"], 3)
+        self.assertEqual(AmountInserted.objects.get(pk=good.pk).denominations,
+                         {"notes": {"50": 1}, "coins": {"5": 2}})
+
+        out = StringIO()
+        call_command('audit_cash_records', stdout=out)
+        self.assertNotIn("1 flagged", out.getvalue())
+
+
+#  Money
+class MoneyTests(TestCase):
+    def test_parse_and_display(self):
+        self.assertEqual(Money.parse('12.5').cents, 1250)
+        self.assertEqual(Money.parse(0.1).cents, 10)
+        self.assertEqual(Money.parse(Decimal('7')).cents, 700)
+        self.assertEqual(str(Money(-1205)), '-12.05')
+        self.assertEqual(f"{Money(1250):.1f}", '12.5')
+        with self.assertRaises(ValueError):
+            Money.parse('abc')
+
+    def test_arithmetic_stays_exact(self):
+        total = sum([Money.parse('0.10')] * 3)
+        self.assertEqual(total, Money(30))
+        self.assertEqual(Money(250) * 3 - Money(50), Money(700))
+        self.assertTrue(Money(100) == 1 and Money(150) > Decimal('1.25'))
+        with self.assertRaises(TypeError):
+            Money(100) + 1
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            Money(100).cents = 5
+
+    def test_session_round_trip(self):
+        self.assertEqual(Money.from_json(Money(1999).to_json()), Money(1999))
+        self.assertEqual(Money.from_json(19.99), Money(1999))
+        self.assertEqual(Money.from_json(None), Money())
+
+    def test_model_field_and_api(self):
+        product = make_products(1, price='12.50')[0]
+        self.assertEqual(Product.objects.get(pk=product.pk).price, Money(1250))
+
+        response = self.client.get(f'/api/products/{product.pk}/')
+        self.assertEqual(response.json()['price'], '12.50')
+
+        response = self.client.patch(f'/api/products/{product.pk}/', {'price': '9.99'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Product.objects.get(pk=product.pk).price.cents, 999)
+
+
+#  Sessions
+class CoalescingSessionTests(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        fill_cash_box()
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session.save()
+
+    def session_writes(self, ctx):
+        return [q['sql'] for q in ctx.captured_queries
+                if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')]
+
+    def test_coin_clicks_stay_in_cache_until_confirm(self):
+        with CaptureQueriesContext(connection) as ctx:
+            for coin in ['20', '20', '10', '5', '1', '1']:
+                self.client.post(reverse('balance_page'), {'add_coin': coin})
+        self.assertEqual(self.session_writes(ctx), [])
+        self.assertEqual(self.client.session['temp_total'], 5700)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('balance_page'), {'confirm_balance': '1'})
+        self.assertEqual(len(self.session_writes(ctx)), 1)
+
+    def test_cached_state_survives_a_new_store(self):
+        # A restarted worker builds a fresh store and must see the clicks.
+        self.client.post(reverse('balance_page'), {'add_note': '100'})
+        key = self.client.session.session_key
+        store = SessionStore(key)
+        self.assertEqual(store['temp_denominations']['notes'], {'100': 1})
+
+    @override_settings(SESSION_FLUSH_INTERVAL=0)
+    def test_flush_interval_writes_through(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse('balance_page'), {'add_coin': '5'})
+        self.assertEqual(len(self.session_writes(ctx)), 1)
+
+
+#  Cash Insertion API
+class CashInsertionApiTests(TestCase):
+    def setUp(self):
+        fill_cash_box(count=0)
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session['balance'] = Money(5000).to_json()
+        session.save()
+
+    def post(self, data):
+        return self.client.post('/api/insertions/', data, content_type='application/json')
+
+    def test_batch_creates_one_row_and_returns_balance(self):
+        response = self.post({"notes": {"200": 1}, "coins": {"5": 3, "1": 0}})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['inserted'], '215.00')
+        self.assertEqual(response.json()['balance'], '265.00')
+        row = AmountInserted.objects.get()
+        self.assertEqual((row.notes_200, row.coins_5), (1, 3))
+        self.assertEqual(self.client.session['balance'], 26500)
+        self.assertEqual(cash_stock(), tuple(1 if v == 200 else 3 if v == 5 else 0 for v in DENOMINATIONS))
+
+    def test_rejects_unknown_or_empty_batches(self):
+        self.assertEqual(self.post({"notes": {"500": 1}}).status_code, 400)
+        self.assertEqual(self.post({"coins": {"5": -1}}).status_code, 400)
+        self.assertEqual(self.post({}).status_code, 400)
+        self.assertFalse(AmountInserted.objects.exists())
+
+    def test_requires_a_student(self):
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.post({"coins": {"5": 1}}).status_code, 403)
+
+    def test_requires_the_csrf_token(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        client.cookies = self.client.cookies
+        refused = client.post('/api/insertions/', {"coins": {"5": 1}}, content_type='application/json')
+        self.assertEqual(refused.status_code, 403)
+        self.assertIn('CSRF', refused.json()['detail'])
+        self.assertFalse(AmountInserted.objects.exists())
+
+        # The refusal hands out the cookie, so a client can retry with the token.
+        token = client.cookies['csrftoken'].value
+        accepted = client.post('/api/insertions/', {"coins": {"5": 1}}, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(accepted.status_code, 201)
+
+    def test_insertion_landing_mid_request_is_not_lost(self):
+        from . import views_api
+        real = views_api.record_insertion
+
+        def interleaved(student, denoms):
+            # Another kiosk tab's payment completes while this one is in flight.
+            views_api.record_insertion = real
+            self.assertEqual(self.post({"notes": {"100": 1}}).status_code, 201)
+            return real(student, denoms)
+
+        with mock.patch.object(views_api, 'record_insertion', interleaved):
+            self.assertEqual(self.post({"coins": {"5": 1}}).status_code, 201)
+        self.assertEqual(self.client.session['balance'], 5000 + 10000 + 500)
+
+
+#  API Pagination
+class ApiPaginationTests(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        now = timezone.now()
+        Order.objects.bulk_create([
+            Order(student=self.student, date_time=now - timedelta(minutes=i), total_purchase=Money(100 * i))
+            for i in range(25)
+        ])
+
+    def test_orders_are_cursor_paginated_newest_first(self):
+        seen = []
+        url = '/api/orders/?page_size=10'
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        expected = list(Order.objects.order_by('-date_time', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_query_does_not_count_or_offset(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/orders/?page_size=5')
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_pages_are_read_from_the_keyset_index(self):
+        for path, index in (('orders', 'order_dt_id_idx'), ('amountinserted', 'amountins_dt_id_idx'),
+                            ('changereturn', 'changeret_dt_id_idx')):
+            second_page = self.client.get(f'/api/{path}/?page_size=1').json()['next'] or f'/api/{path}/'
+            for url in (f'/api/{path}/?page_size=5', second_page):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.get(url)
+                page_sql = next(q['sql'] for q in ctx.captured_queries if 'ORDER BY' in q['sql'])
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {page_sql}')
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_fields_limits_output(self):
+        data = self.client.get('/api/orders/?fields=id,total_purchase').json()
+        self.assertEqual(set(data['results'][0]), {'id', 'total_purchase'})
+
+        student = self.client.get(f'/api/students/{self.student.id}/?fields=name').json()
+        self.assertEqual(student, {'name': 'Asha'})
+
+    def test_fields_ignored_on_writes(self):
+        response = self.client.post('/api/students/?fields=id',
+                                    {'name': 'Ravi', 'campus': 'Ebene'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['name'], 'Ravi')
+
+
+class ExpandedApiTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        students = Student.objects.bulk_create([Student(name=f'S{i}', campus='Ebene') for i in range(60)])
+        products = make_products(60)
+        Order.objects.bulk_create([
+            Order(student=s, product=p, date_time=now - timedelta(minutes=i), total_purchase=Money(1000))
+            for i, (s, p) in enumerate(zip(students, products))
+        ])
+        AmountInserted.objects.bulk_create([
+            AmountInserted(student=s, date_time=now - timedelta(minutes=i)) for i, s in enumerate(students)
+        ])
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_expand_inlines_related_names(self):
+        row = self.client.get('/api/orders/?expand=student,product&page_size=1').json()['results'][0]
+        order = Order.objects.get(pk=row['id'])
+        self.assertEqual(row['student_name'], order.student.name)
+        self.assertEqual(row['product_name'], order.product.name)
+        self.assertEqual(row['product_price'], '10.00')
+
+        plain = self.client.get('/api/orders/?page_size=1').json()['results'][0]
+        self.assertNotIn('student_name', plain)
+        self.assertNotIn('product_name', plain)
+
+    def test_expanded_page_costs_the_same_at_any_size(self):
+        for url in ('/api/orders/?expand=student,product', '/api/amountinserted/?expand=student',
+                    '/api/orders/?expand=student&fields=id,student_name'):
+            self.assertEqual(self.queries_for(f'{url}&page_size=5'),
+                             self.queries_for(f'{url}&page_size=50'), url)
+
+    def test_admin_changelists_join_students(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        for url in ('/admin/machine/order/', '/admin/machine/amountinserted/'):
+            small = self.queries_for(f'{url}?student__id__exact={Student.objects.first().id}')
+            full = self.queries_for(url)
+            self.assertEqual(small, full, url)
+
+
+class ReportIndexTests(TestCase):
+    def test_student_name_and_campus_are_unique(self):
+        from django.db import IntegrityError, transaction
+        Student.objects.create(name='Asha', campus='Ebene')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Student.objects.create(name='Asha', campus='Ebene')
+
+    def test_student_range_query_uses_composite_index(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        plan = Order.objects.filter(student=student, date_time__gte=timezone.now()).explain()
+        self.assertIn('order_student_dt_idx', plan)
+
+
+class BenchReportQueriesTests(TransactionTestCase):
+    # The command switches the connection to a scratch database, which
+    # cannot happen inside a TestCase transaction.
+    def test_bench_command_leaves_the_database_alone(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        indexes = connection.introspection.get_constraints(connection.cursor(), Order._meta.db_table)
+        out = StringIO()
+        call_command('bench_report_queries', rows=50, students=5, products=2, iterations=1, stdout=out)
+        self.assertIn('Plans with indexes', out.getvalue())
+        self.assertEqual(list(Student.objects.all()), [student])
+        self.assertFalse(Order.objects.exists())
+        from .models import Tombstone
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertEqual(connection.introspection.get_constraints(connection.cursor(), Order._meta.db_table),
+                         indexes)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        clear_catalog_cache()
+        fill_cash_box()
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        self.products = make_products(2)
+
+    def rollup_state(self):
+        sales = sorted(SalesRollup.objects.values_list('hour', 'product_id', 'orders', 'revenue'))
+        cash = sorted(CashRollup.objects.exclude(inserted=0, returned=0)
+                      .values_list('hour', 'denomination', 'inserted', 'returned'))
+        return [row for row in sales if row[2]], cash
+
+    def test_checkout_and_insertions_update_rollups(self):
+        record_insertion(self.student, {'notes': {'100': 1}, 'coins': {}})
+        checkout(self.student, Decimal('100.00'), {self.products[0].id: 2, self.products[1].id: 1})
+        checkout(self.student, Decimal('50.00'), {self.products[0].id: 1})
+
+        sales = {r.product_id: r for r in SalesRollup.objects.all()}
+        self.assertEqual(sales[self.products[0].id].orders, 2)
+        self.assertEqual(sales[self.products[0].id].revenue, Money(3000))
+        self.assertEqual(sales[self.products[1].id].revenue, Money(1000))
+
+        cash = {r.denomination: r for r in CashRollup.objects.all()}
+        self.assertEqual(cash[100].inserted, 1)
+        self.assertEqual(cash[50].returned, 1)   # 70 change = 50 + 20
+        self.assertEqual(cash[20].returned, 3)   # then 40 = 20 + 20
+
+    def test_edits_and_deletes_keep_rollups_in_step(self):
+        order = Order.objects.create(student=self.student, product=self.products[0], total_purchase=Money(1000))
+        order.total_purchase = Money(2500)
+        order.save()
+        self.assertEqual(SalesRollup.objects.get().revenue, Money(2500))
+        order.delete()
+        self.assertEqual(SalesRollup.objects.get().orders, 0)
+
+    def test_rebuild_matches_incremental(self):
+        earlier = timezone.now() - timedelta(hours=5)
+        Order.objects.create(student=self.student, product=self.products[1], date_time=earlier,
+                             total_purchase=Money(1000))
+        AmountInserted.objects.create(student=self.student, date_time=earlier, coins_5=3)
+        checkout(self.student, Decimal('100.00'), {self.products[0].id: 3})
+        incremental = self.rollup_state()
+
+        SalesRollup.objects.all().delete()
+        CashRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(self.rollup_state(), incremental)
+
+    def test_reports_read_only_rollups(self):
+        checkout(self.student, Decimal('100.00'), {self.products[0].id: 2})
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/reports/?by=day').json()
+        tables = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('"machine_order"', tables)
+        self.assertEqual(data['sales'][0]['orders'], 1)
+        self.assertEqual(data['sales'][0]['revenue'], '20.00')
+        self.assertEqual(data['sales'][0]['product_name'], 'Product 0')
+        self.assertEqual({row['denomination'] for row in data['cash']}, {50, 20, 10})
+
+    def test_reports_reject_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/reports/?by=week').status_code, 400)
+        self.assertEqual(self.client.get('/api/reports/?since=yesterday').status_code, 400)
+
+
+class RollupFailedSaveTests(TransactionTestCase):
+    def test_failed_edit_leaves_rollups_alone(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        order = Order.objects.create(student=student, product=make_products(1)[0], total_purchase=Money(1000))
+        order.total_purchase = Money(2500)
+        with mock.patch('django.db.models.Model._save_table', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                order.save()
+        self.assertEqual(SalesRollup.objects.get().revenue, Money(1000))
+
+
+class RollupBackfillMigrationTests(TransactionTestCase):
+    def test_migration_rolls_up_existing_history(self):
+        from django.db.migrations.executor import MigrationExecutor
+        executor = MigrationExecutor(connection)
+        before, after = [('machine', '0011_keyset_indexes')], [('machine', '0012_backfill_rollups')]
+        executor.migrate(before)
+        try:
+            old = executor.loader.project_state(before).apps
+            student = old.get_model('machine', 'Student').objects.create(name='Asha', campus='Ebene')
+            product = old.get_model('machine', 'Product').objects.create(
+                product_id='P0001', name='Cake', qty=5, price=Money(1000), category='Cake')
+            earlier = timezone.now() - timedelta(days=30)
+            old.get_model('machine', 'Order').objects.create(
+                student=student, product=product, date_time=earlier, total_purchase=Money(1000))
+            old.get_model('machine', 'ChangeReturn').objects.create(
+                student=student, date_time=earlier, coins_20=1, total_return=Money(2000))
+
+            executor = MigrationExecutor(connection)
+            executor.migrate(after)
+        finally:
+            executor = MigrationExecutor(connection)
+            executor.migrate(executor.loader.graph.leaf_nodes())
+
+        self.assertEqual(SalesRollup.objects.get().revenue, Money(1000))
+        self.assertEqual(CashRollup.objects.get().returned, 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        product = make_products(1)[0]
+        now = timezone.now()
+        Order.objects.bulk_create([
+            Order(student=self.student, product=product, date_time=now - timedelta(days=i),
+                  total_purchase=Money(1050))
+            for i in range(5)
+        ])
+
+    def streamed(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        import csv
+        rows = list(csv.reader(StringIO(self.streamed('/api/orders/export/'))))
+        self.assertEqual(rows[0][:3], ['id', 'student_id', 'product_id'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][rows[0].index('total_purchase')], '10.50')
+        dates = [row[rows[0].index('date_time')] for row in rows[1:]]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_export_reads_the_keyset_index_in_order(self):
+        from .exports import export_rows
+        now = timezone.now()
+        for since, until in ((None, None), (now - timedelta(days=2), now)):
+            for model, index in ((Order, 'order_dt_id_idx'), (AmountInserted, 'amountins_dt_id_idx'),
+                                 (ChangeReturn, 'changeret_dt_id_idx')):
+                with CaptureQueriesContext(connection) as ctx:
+                    list(export_rows(model, since, until))
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {ctx.captured_queries[-1]['sql']}")
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_ndjson_export_with_date_range(self):
+        import json
+        since = (timezone.now() - timedelta(days=2, hours=1)).isoformat()
+        body = self.streamed(f'/api/orders/export/?output=ndjson&since={since.replace("+", "%2B")}')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0]['student_id'], self.student.id)
+
+    def test_rows_are_read_in_chunks(self):
+        from .exports import export_chunks
+        chunks = list(export_chunks('orders', 'ndjson', chunk_size=2))
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 2, 1])
+
+    def test_bad_format_is_rejected(self):
+        self.assertEqual(self.client.get('/api/orders/export/?output=xml').status_code, 400)
+
+    def test_command_writes_export(self):
+        out = StringIO()
+        call_command('export_transactions', 'orders', '--format', 'ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+
+
+class ProductUpsertTests(TestCase):
+    def setUp(self):
+        clear_catalog_cache()
+        self.products = make_products(3)
+
+    def test_bulk_api_creates_and_updates_in_constant_queries(self):
+        rows = [
+            {'product_id': 'P0000', 'qty': 25},
+            {'product_id': 'P0001', 'price': '12.50'},
+            {'product_id': 'P0002', 'qty': 10, 'price': '10.00'},
+            {'product_id': 'NEW1', 'name': 'Cola', 'qty': 5, 'price': '15', 'category': 'Soft Drink'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/products/bulk/', rows, content_type='application/json')
+        self.assertEqual(response.json(), {'created': 1, 'updated': 2, 'unchanged': 1})
+        self.assertEqual(len(callbacks), 1)
+        writes = [q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 2)
+
+        products = Product.objects.in_bulk(field_name='product_id')
+        self.assertEqual(products['P0000'].qty, 25)
+        self.assertEqual(products['P0000'].price, Money(1000))
+        self.assertEqual(products['P0001'].price, Money(1250))
+        self.assertEqual(products['P0001'].qty, 10)
+        self.assertEqual(products['NEW1'].name, 'Cola')
+
+    def test_price_change_keeps_concurrent_stock(self):
+        # A sale lands between the read and the write; only price is written.
+        Product.objects.filter(product_id='P0001').update(qty=3)
+        upsert_products([{'product_id': 'P0001', 'price': '11.00'}])
+        product = Product.objects.get(product_id='P0001')
+        self.assertEqual((product.qty, product.price), (3, Money(1100)))
+
+    def test_invalid_rows_write_nothing(self):
+        response = self.client.post('/api/products/bulk/', [
+            {'product_id': 'P0000', 'qty': 50},
+            {'product_id': 'P0001', 'qty': -1},
+            {'product_id': 'NEW2', 'name': 'Incomplete'},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertEqual(Product.objects.get(product_id='P0000').qty, 10)
+
+    def test_import_command_reads_csv(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("product_id,name,qty,price,category\nP0000,,40,,\nP9000,Muffin,6,20.00,Cake\n")
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_products', f.name, stdout=out)
+        self.assertIn('1 created, 1 updated, 0 unchanged', out.getvalue())
+        self.assertEqual(Product.objects.get(product_id='P0000').qty, 40)
+        self.assertTrue(Product.objects.filter(product_id='P9000', name='Muffin').exists())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        clear_catalog_cache()
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        self.products = make_products(3)
+        self.order = Order.objects.create(student=self.student, product=self.products[0], total_purchase=Money(1000))
+
+    def revalidate(self, url, response):
+        headers = {'HTTP_IF_NONE_MATCH': response['ETag']}
+        if response.has_header('Last-Modified'):
+            headers['HTTP_IF_MODIFIED_SINCE'] = response['Last-Modified']
+        return self.client.get(url, **headers)
+
+    def test_unchanged_catalog_is_304_without_queries(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            second = self.revalidate('/api/products/', first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_products([{'product_id': 'P0000', 'qty': 3}])
+        self.assertEqual(self.revalidate('/api/products/', first).status_code, 200)
+
+    def test_deleted_product_is_not_a_304(self):
+        first = self.client.get('/api/products/')
+        self.assertFalse(first.has_header('Last-Modified'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[2].delete()
+        response = self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(self.revalidate('/api/products/', first).status_code, 200)
+
+    def test_transaction_list_changes_on_write_and_delete(self):
+        url = '/api/orders/?page_size=10'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.create(student=self.student, product=self.products[1], total_purchase=Money(500))
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assertEqual(self.revalidate(url, second).status_code, 200)
+
+    def test_query_string_is_part_of_the_etag(self):
+        first = self.client.get('/api/orders/')
+        response = self.client.get('/api/orders/?fields=id', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_view_uses_row_updated_at(self):
+        url = f'/api/orders/{self.order.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.order.total_purchase = Money(1500)
+        self.order.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_expanded_relations_are_part_of_the_etag(self):
+        for url in ('/api/orders/?expand=student,product', f'/api/orders/{self.order.pk}/?expand=student'):
+            first = self.client.get(url)
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+            self.student.name = f'{self.student.name}!'
+            self.student.save()
+            renamed = self.revalidate(url, first)
+            self.assertEqual(renamed.status_code, 200)
+            self.assertIn(self.student.name, renamed.content.decode())
+
+        url = '/api/orders/?expand=product'
+        first = self.client.get(url)
+        self.products[0].name = 'Renamed'
+        self.products[0].save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_revalidation_reads_only_the_page(self):
+        url = '/api/orders/?page_size=5&expand=student,product'
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('MAX(', sql)
+        self.assertIn('LIMIT 6', sql)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('order_dt_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_dashboard_is_304_until_balance_changes(self):
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session['balance'] = Money(5000).to_json()
+        session.save()
+
+        self.client.get('/student/dashboard/')  # picks up the CSRF cookie
+        first = self.client.get('/student/dashboard/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(self.revalidate('/student/dashboard/', first).status_code, 304)
+
+        session = self.client.session
+        session['balance'] = Money(6000).to_json()
+        session.save()
+        self.assertEqual(self.revalidate('/student/dashboard/', first).status_code, 200)
+
+
+def png_upload(name='cake.png', size=(600, 450), color=(200, 50, 50, 255)):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new('RGBA', size, color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings_override = override_settings(MEDIA_ROOT=media, IMAGE_VARIANTS_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        clear_catalog_cache()
+
+    def upload(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(product_id='IMG1', name='Cake', price=Money(1000),
+                                             category='Cake', image=png_upload(**kwargs))
+        product.refresh_from_db()
+        return product
+
+    def test_upload_builds_hashed_avif_and_webp_variants(self):
+        from django.core.files.storage import default_storage
+        product = self.upload()
+        variants = product.image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        self.assertEqual((variants['width'], variants['height']), (240, 180))
+        self.assertEqual([scale for scale, path in variants['avif']], [1, 2])
+        for scale, path in variants['avif'] + variants['webp']:
+            self.assertTrue(default_storage.exists(path))
+            self.assertIn(variants['digest'], path)
+            self.assertLess(default_storage.size(path), product.image.size)
+
+        mimes = [mime for mime, srcset in product.image_sources]
+        self.assertEqual(mimes, ['image/avif', 'image/webp'])
+        self.assertIn(' 2x', product.image_sources[0][1])
+
+    def test_small_images_are_not_upscaled(self):
+        product = self.upload(size=(100, 80))
+        self.assertEqual(len(product.image_variants['webp']), 1)
+        self.assertEqual((product.image_variants['width'], product.image_variants['height']), (100, 80))
+
+    def test_dashboard_and_api_expose_srcsets(self):
+        product = self.upload()
+        data = self.client.get(f'/api/products/{product.pk}/').json()
+        self.assertNotIn('image_variants', data)
+        self.assertTrue(data['image_sources']['image/avif'].startswith('http://testserver/media/'))
+
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        session = self.client.session
+        session['student_id'] = student.id
+        session.save()
+        html = self.client.get('/student/dashboard/').content.decode()
+        self.assertIn('<source type="image/avif"', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_backfill_command(self):
+        product = self.upload()
+        Product.objects.filter(pk=product.pk).update(image_variants={})
+        out = StringIO()
+        call_command('build_image_variants', stdout=out)
+        self.assertIn('Built 1', out.getvalue())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants['source'], product.image.name)
+
+        out = StringIO()
+        call_command('build_image_variants', stdout=out)
+        self.assertIn('Built 0, skipped 1', out.getvalue())
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings_override = override_settings(MEDIA_ROOT=self.media, IMAGE_VARIANTS_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create(self, product_id, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(product_id=product_id, name=product_id, price=Money(1000),
+                                          category='Cake', image=upload)
+
+    def test_same_bytes_are_stored_once(self):
+        first = self.create('A', png_upload('Monster.PNG'))
+        second = self.create('B', png_upload('Monster.PNG'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^products/[0-9a-f]{64}\.png$')
+        self.assertEqual(os.listdir(os.path.join(self.media, 'products')).count(os.path.basename(first.image.name)), 1)
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        from .storage import product_image_storage
+        first = self.create('A', png_upload())
+        second = self.create('B', png_upload())
+        name = first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(product_image_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = png_upload(color=(0, 0, 255, 255))
+            second.save()
+        self.assertFalse(product_image_storage.exists(name))
+
+    def test_hashed_media_is_served_immutable(self):
+        from django.test import RequestFactory
+        from .views import media
+        product = self.create('A', png_upload())
+        response = media(RequestFactory().get('/'), product.image.name)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+        with open(os.path.join(self.media, 'legacy.png'), 'wb') as f:
+            f.write(b'x')
+        self.assertFalse(media(RequestFactory().get('/'), 'legacy.png').has_header('Cache-Control'))
+
+    def test_dedupe_command_merges_existing_duplicates(self):
+        from django.core.files.storage import FileSystemStorage
+        legacy = FileSystemStorage()
+        names = [legacy.save('products/Monster.PNG', png_upload()) for _ in range(2)]
+        self.assertNotEqual(names[0], names[1])
+        Product.objects.bulk_create([
+            Product(product_id=f'D{i}', name='Monster', price=Money(1000), category='Cake', image=name)
+            for i, name in enumerate(names)
+        ])
+
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('2 images renamed to 1 blobs', out.getvalue())
+        images = set(Product.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        self.assertEqual(os.listdir(os.path.join(self.media, 'products')), [os.path.basename(images.pop())])
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        self.product = make_products(1)[0]
+        Order.objects.bulk_create([
+            Order(student=self.student, product=self.product, total_purchase=Money(1050))
+            for _ in range(5)
+        ])
+
+    def sync(self, url, cursor=''):
+        """Follow ``more`` to the end; returns (changed rows, deleted pks, cursor)."""
+        changed, deleted = [], []
+        while True:
+            separator = '&' if '?' in url else '?'
+            data = self.client.get(f'{url}{separator}changed_since={cursor}').json()
+            changed += data['changed']
+            deleted += data['deleted']
+            cursor = data['cursor']
+            if not data['more']:
+                return changed, deleted, cursor
+
+    def test_full_sync_pages_through_rows_saved_at_the_same_moment(self):
+        changed, deleted, _ = self.sync('/api/orders/?page_size=2&fields=id,total_purchase')
+        self.assertEqual(sorted(row['id'] for row in changed), sorted(Order.objects.values_list('id', flat=True)))
+        self.assertEqual(set(changed[0]), {'id', 'total_purchase'})
+        self.assertEqual(deleted, [])
+
+    def test_delta_has_only_changes_and_deletions(self):
+        from .sync import SYNC_OVERLAP
+        _, _, cursor = self.sync('/api/students/')
+        edited = self.student
+        gone = Student.objects.create(name='Ravi', campus='Ebene')
+        gone_pk = gone.pk
+        later = timezone.now() + SYNC_OVERLAP + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            edited.name = 'Asha K'
+            edited.save()
+            gone.delete()
+            changed, deleted, _ = self.sync('/api/students/', cursor)
+
+        self.assertEqual([row['name'] for row in changed], ['Asha K'])
+        self.assertEqual(deleted, [str(gone_pk)])
+
+    def test_products_sync_bypasses_the_catalog_list(self):
+        changed, _, cursor = self.sync('/api/products/?fields=id,qty')
+        self.assertEqual(changed, [{'id': self.product.id, 'qty': self.product.qty}])
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/products/?changed_since={cursor}')
+
+    def test_bad_and_expired_cursors(self):
+        from .sync import TOMBSTONE_TTL, encode_cursor
+        self.assertEqual(self.client.get('/api/orders/?changed_since=nonsense').status_code, 400)
+        stale = encode_cursor(timezone.now() - TOMBSTONE_TTL - timedelta(days=1))
+        self.assertEqual(self.client.get(f'/api/orders/?changed_since={stale}').status_code, 410)
+
+    def test_prune_tombstones(self):
+        from .models import Tombstone
+        from .sync import TOMBSTONE_TTL
+        Order.objects.all().delete()
+        self.assertEqual(Tombstone.objects.filter(model='machine.order').count(), 5)
+        old = Tombstone.objects.filter(model='machine.order').values_list('pk', flat=True)[:2]
+        Tombstone.objects.filter(pk__in=list(old)).update(deleted_at=timezone.now() - TOMBSTONE_TTL * 2)
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('Pruned 2 tombstones', out.getvalue())
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        clear_catalog_cache()
+        fill_cash_box()
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        self.products = make_products(3)
+        self.factory = AsyncRequestFactory()
+
+    def session(self, **data):
+        session = SessionStore()
+        session.update(data)
+        session.create()
+        return session
+
+    def get(self, path, session=None, **headers):
+        request = self.factory.get(path, headers=headers)
+        request.session = session or SessionStore()
+        return request
+
+    async def test_product_list_matches_sync_view(self):
+        from . import views_async
+        expected = (await self.async_client.get('/api/products/')).json()
+        response = await views_async.product_list(self.get('/api/products/'))
+        self.assertEqual(json.loads(response.content), expected)
+        again = await views_async.product_list(self.get('/api/products/', if_none_match=response['ETag']))
+        self.assertEqual(again.status_code, 304)
+
+    async def test_reports_match_sync_view(self):
+        from . import views_async
+        await sync_to_async(checkout)(self.student, Decimal('100.00'), {self.products[0].id: 2})
+        expected = (await self.async_client.get('/api/reports/?by=day')).json()
+        response = await views_async.report_list(self.get('/api/reports/?by=day'))
+        data = json.loads(response.content)
+        self.assertEqual((data['sales'], data['cash']), (expected['sales'], expected['cash']))
+        self.assertEqual(data['sales'][0]['revenue'], '20.00')
+        bad = await views_async.report_list(self.get('/api/reports/?by=week'))
+        self.assertEqual(bad.status_code, 400)
+
+    async def test_dashboard_get_and_revalidation(self):
+        from . import views_async
+        session = await sync_to_async(self.session)(student_id=self.student.id, balance=Money(5000).to_json())
+        response = await views_async.student_dashboard(self.get('/student/dashboard/', session))
+        self.assertContains(response, 'Product 2')
+        again = await views_async.student_dashboard(
+            self.get('/student/dashboard/', session, if_none_match=response['ETag']))
+        self.assertEqual(again.status_code, 304)
+
+        anonymous = await views_async.student_dashboard(self.get('/student/dashboard/'))
+        self.assertEqual(anonymous.status_code, 302)
+
+    async def test_dashboard_reads_no_files_on_the_event_loop(self):
+        from django.core.cache.backends.filebased import FileBasedCache
+        from . import views_async
+        session = await sync_to_async(self.session)(student_id=self.student.id, balance=Money(5000).to_json())
+        on_loop = []
+
+        def watch(method):
+            def wrapper(cache, key, *args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append((method.__name__, key))
+                except RuntimeError:
+                    pass
+                return method(cache, key, *args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(FileBasedCache, 'get', watch(FileBasedCache.get)), \
+                mock.patch.object(FileBasedCache, 'set', watch(FileBasedCache.set)):
+            response = await views_async.student_dashboard(self.get('/student/dashboard/', session))
+        self.assertContains(response, 'Product 2')
+        self.assertEqual(on_loop, [])
+
+    async def test_dashboard_post_runs_the_sync_view(self):
+        from . import views_async
+        session = await sync_to_async(self.session)(student_id=self.student.id, balance=Money(5000).to_json())
+        request = self.factory.post('/student/dashboard/', {'add_money': '25'})
+        request.session = session
+        response = await views_async.student_dashboard(request)
+        self.assertContains(response, 'Rs 25.00 added.')
+        self.assertEqual(await session.aget('balance'), 7500)
+
+    def test_receipt(self):
+        from . import views_async
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session['balance'] = Money(10000).to_json()
+        session.save()
+        self.client.post('/student/dashboard/', {'confirm_order': '1', 'product_id': [self.products[0].id], 'qty': ['2']})
+        session = SessionStore(self.client.session.session_key)
+
+        response = async_to_sync(views_async.receipt)(self.get('/receipt/', session))
+        self.assertContains(response, 'Product 0')
+        empty = async_to_sync(views_async.receipt)(self.get('/receipt/'))
+        self.assertEqual(empty.status_code, 302)
+
+    def test_whitenoise_passes_other_requests_through(self):
+        from .middleware import WhiteNoiseMiddleware
+
+        async def get_response(request):
+            return 'view'
+
+        middleware = WhiteNoiseMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(async_to_sync(middleware)(self.get('/student/dashboard/')), 'view')
+
+    def test_summarize(self):
+        from .loadgen import Sample, summarize
+        samples = [Sample('/a', n / 1000, 200) for n in range(1, 101)] + [Sample('/b', 0.5, 0)]
+        summary = summarize(samples, duration=2)
+        self.assertEqual(summary['/a']['p50_ms'], 50)
+        self.assertEqual(summary['/a']['p99_ms'], 99)
+        self.assertEqual(summary['/a']['rps'], 50)
+        self.assertEqual(summary['/b']['errors'], 1)
+        self.assertEqual(summary['all']['count'], 101)
+
+
+class KioskBenchTests(TestCase):
+    def bench(self, *args):
+        from .management.commands.bench_kiosks import Command
+        command = Command()
+        command.prepare(vars(command.create_parser('manage.py', 'bench_kiosks').parse_args(args)))
+        return command
+
+    def test_query_count_header(self):
+        student = Student.objects.create(name='Asha', campus='Ebene')
+        with override_settings(QUERY_COUNT_HEADER=True):
+            client = self.client_class()
+            session = client.session
+            session['student_id'] = student.id
+            session.save()
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get('/balance/')
+        self.assertEqual(response['X-DB-Queries'], str(len(ctx.captured_queries)))
+        self.assertNotIn('X-DB-Queries', self.client.get('/balance/'))
+
+    def test_checks_flag_oversells_and_unseen_orders(self):
+        command = self.bench('--products', '2', '--stock', '2', '--seed', '1')
+        command.seed()
+        sold, untouched = command.products
+        student = Student.objects.create(name='Bench kiosk 000', campus='Ebene')
+        Order.objects.bulk_create([Order(student=student, product=sold, total_purchase=sold.price) for _ in range(3)])
+        Product.objects.filter(pk=sold.pk).update(qty=0)
+        command.bought[student.name][sold.pk] = 2
+
+        command.check_stock()
+        command.check_students()
+        self.assertEqual({(v['check'], v.get('product', v.get('student'))) for v in command.violations},
+                         {('oversell', sold.product_id), ('orders', student.name)})
+
+    def test_carts_and_payments(self):
+        command = self.bench('--products', '5', '--max-items', '3', '--seed', '7')
+        command.seed()
+        for _ in range(50):
+            cart = command.pick_cart()
+            self.assertTrue(1 <= len(cart) <= 3)
+            cost = sum((product.price * qty for product, qty in cart.items()), Money())
+            self.assertGreaterEqual(Money.parse(sum(command.pieces_for(cost))), cost)
+
+
+#  Query Budgets
+# The most queries each view may run, however much data there is. A cold
+# catalog cache is included. Every /api/ list and detail route needs an
+# entry in API_QUERY_BUDGETS; "?expand" entries expand every relation.
+HTML_QUERY_BUDGETS = {
+    'GET home': 0,
+    'GET student_login': 0,
+    'POST student_login': 5,
+    'GET student_dashboard': 2,
+    'POST student_dashboard (add_money)': 2,
+    'POST student_dashboard (preview_order)': 10,
+    'POST student_dashboard (confirm_order)': 18,
+    'GET balance_page': 1,
+    'POST balance_page (add_note)': 1,
+    'POST balance_page (add_coin)': 1,
+    'POST balance_page (confirm_balance)': 10,
+    'GET receipt': 0,
+}
+API_QUERY_BUDGETS = {
+    'api-root': 0,
+    'student-list': 1,
+    'student-detail': 1,
+    'product-list': 1,
+    'product-detail': 2,
+    'amountinserted-list': 2,
+    'amountinserted-list?expand': 2,
+    'amountinserted-detail': 2,
+    'amountinserted-detail?expand': 2,
+    'changereturn-list': 2,
+    'changereturn-list?expand': 2,
+    'changereturn-detail': 2,
+    'changereturn-detail?expand': 2,
+    'order-list': 2,
+    'order-list?expand': 2,
+    'order-detail': 2,
+    'order-detail?expand': 2,
+    'report-list': 2,
+}
+
+
+class QueryBudgetTests(TestCase):
+    # Rows per table each view is run against; the cart grows with them too.
+    SIZES = (1, 5, 25)
+    MAX_CART = 8
+
+    def setUp(self):
+        fill_cash_box(10000)
+        self.student = Student.objects.create(name='Asha', campus='Ebene')
+        # The session row must outlive the rolled back measurements.
+        self.login()
+
+    def grow(self, size):
+        """Top every table up to ``size`` rows."""
+        students = Student.objects.count()
+        Student.objects.bulk_create([Student(name=f"Student {i}", campus='Ebene') for i in range(students, size)])
+        products = Product.objects.count()
+        Product.objects.bulk_create([
+            Product(product_id=f"P{i:04d}", name=f"Product {i}", qty=1000, price=Decimal('10.00'), category='Cake')
+            for i in range(products, size)
+        ])
+        students = list(Student.objects.order_by('pk'))
+        products = list(Product.objects.order_by('pk'))
+        for model in (Order, AmountInserted, ChangeReturn):
+            existing = model.objects.count()
+            rows = []
+            for i in range(existing, size):
+                student = students[i % len(students)]
+                if model is Order:
+                    rows.append(Order(student=student, product=products[i % len(products)], total_purchase=Money(1000)))
+                else:
+                    rows.append(model(student=student, coins_5=2, denominations={'notes': {}, 'coins': {'5': 2}}))
+            created = model.objects.bulk_create(rows)
+            if model is Order:
+                record_sales(created)
+            else:
+                record_cash(created, 'inserted' if model is AmountInserted else 'returned')
+
+    def login(self, **data):
+        session = self.client.session
+        session['student_id'] = self.student.id
+        session['balance'] = Money(100000).to_json()
+        session['temp_total'] = Money().to_json()
+        session['temp_denominations'] = {"notes": {}, "coins": {}}
+        session.update(data)
+        session.save()
+
+    def cart(self, size):
+        products = Product.objects.order_by('pk').values_list('pk', flat=True)[:min(size, self.MAX_CART)]
+        return {'product_id': list(products), 'qty': ['1'] * len(products)}
+
+    def measure(self, name, budget, request, prepare=None):
+        """
+        Run ``request(prepare(size))`` at every size, counting only the
+        request's queries; fail if it goes over ``budget`` or its count
+        changes with the size.
+        """
+        counts = []
+        with transaction.atomic():
+            for size in self.SIZES:
+                self.grow(size)
+                arg = prepare(size) if prepare else None
+                clear_catalog_cache()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = request(arg)
+                self.assertLess(response.status_code, 400, f"{name} returned {response.status_code}")
+                queries = len(ctx.captured_queries)
+                if queries > budget or (counts and queries != counts[0]):
+                    sql = '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, 1))
+                    earlier = f", {counts[0]} with {self.SIZES[0]}" if counts else ""
+                    self.fail(f"{name} ran {queries} queries with {size} rows per table "
+                              f"(budget {budget}{earlier}):\n{sql}")
+                counts.append(queries)
+            # Every view starts from the same small tables.
+            transaction.set_rollback(True)
+
+    def test_html_views(self):
+        dashboard = reverse('student_dashboard')
+        balance = reverse('balance_page')
+        receipt = {
+            'student_name': 'Asha', 'campus': 'Ebene',
+            'ordered_items': [{'name': 'Product 0', 'qty': 1, 'price': 1000, 'cost': 1000}],
+            'total_purchase': 1000, 'change': 0, 'inserted_money': 1000, 'date': '2026-10-18 12:00',
+        }
+
+        def fresh_cart(size):
+            self.login()
+            StockHold.objects.filter(student=self.student).delete()
+            return self.cart(size)
+
+        def previewed(size):
+            self.login()
+            cart = self.cart(size)
+            self.client.post(dashboard, {'preview_order': '1', **cart})
+            return cart
+
+        views = [
+            ('GET home', lambda _: self.client.get(reverse('home')), None),
+            ('GET student_login', lambda _: self.client.get(reverse('student_login')), None),
+            ('POST student_login',
+             lambda client: client.post(reverse('student_login'), {'name': 'Asha', 'campus': 'Ebene'}),
+             lambda size: self.client_class()),
+            ('GET student_dashboard', lambda _: self.client.get(dashboard), lambda size: self.login()),
+            ('POST student_dashboard (add_money)',
+             lambda _: self.client.post(dashboard, {'add_money': '50'}), lambda size: self.login()),
+            ('POST student_dashboard (preview_order)',
+             lambda cart: self.client.post(dashboard, {'preview_order': '1', **cart}), fresh_cart),
+            ('POST student_dashboard (confirm_order)',
+             lambda cart: self.client.post(dashboard, {'confirm_order': '1', **cart}), previewed),
+            ('GET balance_page', lambda _: self.client.get(balance), lambda size: self.login()),
+            ('POST balance_page (add_note)',
+             lambda _: self.client.post(balance, {'add_note': '100'}), lambda size: self.login()),
+            ('POST balance_page (add_coin)',
+             lambda _: self.client.post(balance, {'add_coin': '5'}), lambda size: self.login()),
+            ('POST balance_page (confirm_balance)',
+             lambda _: self.client.post(balance, {'confirm_balance': '1'}),
+             lambda size: self.login(temp_total=Money(2500).to_json(),
+                                     temp_denominations={'notes': {'25': 1}, 'coins': {}})),
+            ('GET receipt', lambda _: self.client.get(reverse('receipt')), lambda size: self.login(receipt=receipt)),
+        ]
+        self.assertEqual({name for name, _, _ in views}, set(HTML_QUERY_BUDGETS))
+        for name, request, prepare in views:
+            with self.subTest(name):
+                self.measure(name, HTML_QUERY_BUDGETS[name], request, prepare)
+
+    def api_routes(self):
+        """
+        ``(budget name, route name, model or None, expand)`` for every list
+        and detail route; detail routes are requested for the newest row of
+        ``model``, and relations are expanded when ``expand`` is set.
+        """
+        from .urls import router
+        yield 'api-root', 'api-root', None, ''
+        for prefix, viewset, basename in router.registry:
+            serializer = getattr(viewset, 'serializer_class', None)
+            expandable = ','.join(getattr(getattr(serializer, 'Meta', None), 'expandable', {}))
+            routes = []
+            if hasattr(viewset, 'list'):
+                routes.append((f"{basename}-list", None))
+            if hasattr(viewset, 'retrieve'):
+                routes.append((f"{basename}-detail", viewset.queryset.model))
+            for route, model in routes:
+                yield route, route, model, ''
+                if expandable:
+                    yield f"{route}?expand", route, model, expandable
+
+    def test_api_routes(self):
+        routes = list(self.api_routes())
+        missing = {name for name, *_ in routes} - set(API_QUERY_BUDGETS)
+        self.assertFalse(missing, f"No query budget for {sorted(missing)}; add them to API_QUERY_BUDGETS.")
+
+        def url(route, model, expand):
+            url = reverse(route, args=[model.objects.order_by('pk').last().pk] if model else [])
+            return f"{url}?expand={expand}" if expand else url
+
+        for name, route, model, expand in routes:
+            with self.subTest(name):
+                self.measure(name, API_QUERY_BUDGETS[name], self.client.get,
+                             lambda size: url(route, model, expand))
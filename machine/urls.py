@@ -1,18 +1,22 @@
-from django.urls import path, include
+import re
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 
-from . import views
-from .views_api import StudentViewSet, ProductViewSet , AmountInsertedViewSet, ChangeReturnViewSet, OrderViewSet
+from . import views, views_async
+from .views_api import StudentViewSet, ProductViewSet , AmountInsertedViewSet, ChangeReturnViewSet, OrderViewSet, CashInsertionViewSet, ReportViewSet
+
+# Under ASGI (ASYNC_VIEWS on) the read-heavy views are served by their async versions
+read_views = views_async if settings.ASYNC_VIEWS else views
 
 # --- Normal (HTML) views ---
 html_urlpatterns = [
     path('', views.home, name='home'),
     path('student/login/', views.student_login, name='student_login'),
-    path('student/dashboard/', views.student_dashboard, name='student_dashboard'),
+    path('student/dashboard/', read_views.student_dashboard, name='student_dashboard'),
     path('balance/', views.balance_page, name='balance_page'),
-    path('receipt/', views.receipt, name='receipt'),
+    path('receipt/', read_views.receipt, name='receipt'),
 ]
 
 # --- API routes ---
@@ -22,15 +26,22 @@ router.register(r'products', ProductViewSet)
 router.register(r'amountinserted', AmountInsertedViewSet)
 router.register(r'changereturn', ChangeReturnViewSet)
 router.register(r'orders', OrderViewSet)
+router.register(r'insertions', CashInsertionViewSet, basename='insertion')
+router.register(r'reports', ReportViewSet, basename='report')
 
 api_urlpatterns = [
     path('api/', include(router.urls)),
 ]
+if settings.ASYNC_VIEWS:
+    api_urlpatterns = [
+        path('api/products/', views_async.product_list),
+        path('api/reports/', views_async.report_list),
+    ] + api_urlpatterns
 
 # --- Combine both ---
 urlpatterns = html_urlpatterns + api_urlpatterns
 
 # --- Media/static in debug mode ---
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$", views.media, name='media')]
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,5 +1,5 @@
 from rest_framework import routers
-from .views_api import StudentViewSet, ProductViewSet  , AmountInsertedViewSet, ChangeReturnViewSet, OrderViewSet
+from .views_api import StudentViewSet, ProductViewSet  , AmountInsertedViewSet, ChangeReturnViewSet, OrderViewSet, CashInsertionViewSet, ReportViewSet
 
 
 router = routers.DefaultRouter()
@@ -8,5 +8,7 @@ router.register(r'products', ProductViewSet)
 router.register(r'amountinserted', AmountInsertedViewSet)
 router.register(r'changereturn', ChangeReturnViewSet)
 router.register(r'orders', OrderViewSet)
+router.register(r'insertions', CashInsertionViewSet, basename='insertion')
+router.register(r'reports', ReportViewSet, basename='report')
 
 urlpatterns = router.urls
@@ -1,7 +1,16 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from decimal import Decimal, InvalidOperation
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 from .models import Student, Product, AmountInserted, Order, ChangeReturn
+from .checkout import CheckoutError, build_cart, checkout, reserve_cart
+from .change import record_insertion
+from .money import Money
+from .reservations import sweep_expired_holds
+from .catalog import catalog_version, get_catalog
+from .conditional import make_etag, not_modified, set_validators
+from .storage import IMMUTABLE_NAME
 import logging
 import traceback
 
@@ -45,8 +54,8 @@ def student_login(request):
 
             # Save student info 
             request.session['student_id'] = student.id
-            request.session['balance'] = 0.0  
-            request.session['temp_total'] = 0.0
+            request.session['balance'] = Money().to_json()
+            request.session['temp_total'] = Money().to_json()
             request.session['temp_denominations'] = {"notes": {}, "coins": {}}
 
             return redirect('student_dashboard')
@@ -92,27 +101,13 @@ def student_login(request):
         })
 
 
-# -------- Calculate Change Denominations --------
-def calculate_denominations(amount):
-    try:
-        amount = int(amount)
-        notes = [200, 100, 50, 25]
-        coins = [20, 10, 5, 1]
-        note_counts = {}
-        coin_counts = {}
-        for note in notes:
-            count, amount = divmod(amount, note)
-            note_counts[str(note)] = count
-        for coin in coins:
-            count, amount = divmod(amount, coin)
-            coin_counts[str(coin)] = count
-        return {"notes": note_counts, "coins": coin_counts}
-    except Exception as e:
-        logger.error(f"Error in calculate_denominations: {str(e)}")
-        return {"notes": {}, "coins": {}}
+# -------- Student Dashboard --------
+def dashboard_etag(request, student, balance, version):
+    # The page is the student, the balance and the catalog; the CSRF
+    # secret is in the form, so a new one must not reuse an old page.
+    return make_etag(student.pk, student.name, balance.cents, version, request.META.get('CSRF_COOKIE'))
 
 
-# -------- Student Dashboard --------
 def student_dashboard(request):
     try:
         student_id = request.session.get('student_id')
@@ -123,13 +118,21 @@ def student_dashboard(request):
             return redirect('student_login')
 
         student = get_object_or_404(Student, id=student_id)
-        products = Product.objects.all()
-        balance = Decimal(request.session.get('balance', 0.0))
+        version = catalog_version()
+        balance = Money.from_json(request.session.get('balance'))
+
+        etag = dashboard_etag(request, student, balance, version)
+        if request.method == 'GET':
+            response = not_modified(request, etag, private=True)
+            if response is not None:
+                return response
+
+        products = get_catalog(version)
         
-        logger.info(f"Student: {student.name}, Balance: {balance}, Products: {products.count()}")
+        logger.info(f"Student: {student.name}, Balance: {balance}, Products: {len(products)}")
 
         selected_items = []
-        total_cost = Decimal('0.00')
+        total_cost = Money()
 
         if request.method == 'POST':
             logger.info(f"POST request to dashboard - keys: {list(request.POST.keys())}")
@@ -139,23 +142,25 @@ def student_dashboard(request):
                 add_money = request.POST.get('add_money', '').strip()
                 logger.info(f"Adding money: {add_money}")
                 try:
-                    add_money = Decimal(add_money)
+                    add_money = Money.parse(add_money)
                     if add_money <= 0:
                         raise ValueError("Amount must be positive.")
-                except (InvalidOperation, ValueError) as e:
+                except ValueError as e:
                     logger.warning(f"Invalid money amount: {add_money}")
                     return render(request, 'student_dashboard.html', {
                         'student': student,
                         'products': products,
+                        'catalog_version': version,
                         'balance': balance,
                         'error': f'Invalid amount ({str(e)})'
                     })
                 balance += add_money
-                request.session['balance'] = float(balance)
+                request.session['balance'] = balance.to_json()
                 logger.info(f"New balance: {balance}")
                 return render(request, 'student_dashboard.html', {
                     'student': student,
                     'products': products,
+                    'catalog_version': version,
                     'balance': balance,
                     'success': f'Rs {add_money:.2f} added.'
                 })
@@ -165,38 +170,33 @@ def student_dashboard(request):
                 qtys = request.POST.getlist('qty')
                 logger.info(f"Preview order - Products: {selected_products}, Quantities: {qtys}")
                 
-                if not selected_products:
+                sweep_expired_holds()
+                try:
+                    cart = build_cart(selected_products, qtys)
+                    lines, total_cost = reserve_cart(student, balance, cart)
+                except CheckoutError as e:
                     return render(request, 'student_dashboard.html', {
                         'student': student,
                         'products': products,
+                        'catalog_version': version,
                         'balance': balance,
-                        'error': 'Select at least one product.'
+                        'error': str(e)
                     })
-                for i, pid in enumerate(selected_products):
-                    product = Product.objects.get(id=pid)
-                    qty = int(qtys[i])
-                    cost = Decimal(qty) * product.price
+                for product, qty, cost in lines:
                     selected_items.append({
                         'id': product.id,
                         'name': product.name,
-                        'price': float(product.price),
+                        'price': product.price,
                         'qty': qty,
-                        'cost': float(cost)
-                    })
-                    total_cost += cost
-                if total_cost > balance:
-                    return render(request, 'student_dashboard.html', {
-                        'student': student,
-                        'products': products,
-                        'balance': balance,
-                        'error': f'Insufficient balance! Need Rs {total_cost - balance:.2f} more.'
+                        'cost': cost
                     })
                 return render(request, 'student_dashboard.html', {
                     'student': student,
                     'products': products,
+                    'catalog_version': version,
                     'balance': balance,
                     'selected_items': selected_items,
-                    'total_cost': float(total_cost),
+                    'total_cost': total_cost,
                     'preview': True
                 })
 
@@ -205,125 +205,50 @@ def student_dashboard(request):
                 selected_ids = request.POST.getlist('product_id')
                 qtys = request.POST.getlist('qty')
                 logger.info(f"Confirm order - Products: {selected_ids}, Quantities: {qtys}")
-                
-                # Validate that we have products selected
-                if not selected_ids:
-                    return render(request, 'student_dashboard.html', {
-                        'student': student,
-                        'products': products,
-                        'balance': balance,
-                        'error': 'Please select at least one product.'
-                    })
-                
-                
-                if len(qtys) < len(selected_ids):
+
+                try:
+                    cart = build_cart(selected_ids, qtys)
+                    result = checkout(student, balance, cart)
+                except CheckoutError as e:
                     return render(request, 'student_dashboard.html', {
                         'student': student,
                         'products': products,
+                        'catalog_version': version,
                         'balance': balance,
-                        'error': 'Invalid order data. Please try again.'
-                    })
-                
-                total_purchase = Decimal('0.00')
-                ordered_items = []
-
-                
-                for i, pid in enumerate(selected_ids):
-                    product = Product.objects.get(id=pid)
-                    qty = int(qtys[i]) if i < len(qtys) else 1
-                    
-                    if qty <= 0:
-                        continue
-                    
-                    if qty > product.qty:
-                        return render(request, 'student_dashboard.html', {
-                            'student': student,
-                            'products': products,
-                            'balance': balance,
-                            'error': f'Not enough stock for {product.name}.'
-                        })
-                    
-                    cost = Decimal(qty) * product.price
-                    total_purchase += cost
-                
-                # Calculate change
-                change_amount = balance - total_purchase
-                if change_amount < 0:
-                    change_amount = Decimal('0.0')
-                
-                # Now create orders and update stock
-                for i, pid in enumerate(selected_ids):
-                    product = Product.objects.get(id=pid)
-                    qty = int(qtys[i]) if i < len(qtys) else 1
-                    
-                    if qty <= 0:
-                        continue
-                        
-                    cost = Decimal(qty) * product.price
-
-                    product.qty -= qty
-                    product.save()
-
-                    # Create order with individual product cost
-                    order = Order.objects.create(
-                        student=student,
-                        product=product,
-                        balance=balance,
-                        total_purchase=cost,  
-                        change_amount=Decimal('0.00'),  
-                        amount_inserted=cost  
-                    )
-
-                    ordered_items.append({
-                        'name': product.name,
-                        'qty': qty,
-                        'price': float(product.price),
-                        'cost': float(cost)
+                        'error': str(e)
                     })
 
-                change_amount = balance - total_purchase
-                if change_amount < 0:
-                    change_amount = Decimal('0.0')
-
-                # Save change return - FIXED BUG
-                change_denoms = calculate_denominations(change_amount)
-                ChangeReturn.objects.create(
-                    student=student,
-                    notes_200=change_denoms["notes"].get("200", 0),
-                    notes_100=change_denoms["notes"].get("100", 0),
-                    notes_50=change_denoms["notes"].get("50", 0),
-                    notes_25=change_denoms["notes"].get("25", 0),
-                    coins_20=change_denoms["coins"].get("20", 0),
-                    coins_10=change_denoms["coins"].get("10", 0),
-                    coins_5=change_denoms["coins"].get("5", 0),
-                    coins_1=change_denoms["coins"].get("1", 0),
-                    denominations=change_denoms
-                )
+                total_purchase = result['total_purchase']
+                change_amount = result['change']
 
-                # Save receipt info in session
+                # Save receipt info in session. checkout() paid the rest of
+                # the balance out as change, so nothing is left to spend.
                 inserted_money = balance
-                balance -= total_purchase
-                if balance < 0:
-                    balance = Decimal('0.0')
-                request.session['balance'] = float(balance)
+                request.session['balance'] = Money().to_json()
                 request.session['receipt'] = {
                     'student_name': student.name,
                     'campus': student.campus,
-                    'ordered_items': ordered_items,
-                    'total_purchase': float(total_purchase),
-                    'change': float(change_amount),
-                    'inserted_money': float(inserted_money),
+                    'ordered_items': [
+                        {**item, 'price': item['price'].to_json(), 'cost': item['cost'].to_json()}
+                        for item in result['ordered_items']
+                    ],
+                    'total_purchase': total_purchase.to_json(),
+                    'change': change_amount.to_json(),
+                    'inserted_money': inserted_money.to_json(),
                     'date': timezone.localtime(timezone.now()).strftime("%Y-%m-%d %H:%M")
                 }
+                request.session.persist()
 
                 logger.info(f"Order completed - Total: {total_purchase}, Change: {change_amount}")
                 return redirect('receipt')
 
-        return render(request, 'student_dashboard.html', {
+        response = render(request, 'student_dashboard.html', {
             'student': student,
             'products': products,
+            'catalog_version': version,
             'balance': balance
         })
+        return set_validators(response, etag, private=True)
         
     except Exception as e:
         logger.error(f"Error in student_dashboard: {str(e)}")
@@ -343,12 +268,10 @@ def balance_page(request):
             return redirect("student_login")
 
         student = get_object_or_404(Student, id=student_id)
-        request.session.setdefault("balance", 0.0)
-        request.session.setdefault("temp_total", 0.0)
         request.session.setdefault("temp_denominations", {"notes": {}, "coins": {}})
 
-        balance = Decimal(request.session["balance"])
-        temp_total = Decimal(request.session["temp_total"])
+        balance = Money.from_json(request.session.get("balance"))
+        temp_total = Money.from_json(request.session.get("temp_total"))
         temp_denominations = request.session["temp_denominations"]
 
         success = None
@@ -360,12 +283,16 @@ def balance_page(request):
             try:
                 if "add_note" in request.POST:
                     value = request.POST["add_note"]
-                    temp_total += Decimal(value)
+                    if value not in notes:
+                        raise ValueError("Invalid note.")
+                    temp_total += Money.parse(value)
                     temp_denominations["notes"][value] = temp_denominations["notes"].get(value, 0) + 1
 
                 elif "add_coin" in request.POST:
                     value = request.POST["add_coin"]
-                    temp_total += Decimal(value)
+                    if value not in coins:
+                        raise ValueError("Invalid coin.")
+                    temp_total += Money.parse(value)
                     temp_denominations["coins"][value] = temp_denominations["coins"].get(value, 0) + 1
 
                 elif "confirm_balance" in request.POST:
@@ -373,31 +300,19 @@ def balance_page(request):
                         raise ValueError("Please insert some notes or coins first.")
 
                     balance += temp_total
-                    request.session["balance"] = float(balance)
-
-                    # Save denominations in AmountInserted 
-                    AmountInserted.objects.create(
-                        student=student,
-                        notes_200=temp_denominations["notes"].get("200", 0),
-                        notes_100=temp_denominations["notes"].get("100", 0),
-                        notes_50=temp_denominations["notes"].get("50", 0),
-                        notes_25=temp_denominations["notes"].get("25", 0),
-                        coins_20=temp_denominations["coins"].get("20", 0),
-                        coins_10=temp_denominations["coins"].get("10", 0),
-                        coins_5=temp_denominations["coins"].get("5", 0),
-                        coins_1=temp_denominations["coins"].get("1", 0),
-                        denominations=temp_denominations
-                    )
+
+                    # Save denominations in AmountInserted and put the money in the cash box
+                    record_insertion(student, temp_denominations)
+                    request.session["balance"] = balance.to_json()
+                    request.session.persist()
 
                     # Reset temp
-                    temp_total = Decimal(0)
+                    temp_total = Money()
                     temp_denominations = {"notes": {}, "coins": {}}
-                    request.session["temp_total"] = 0.0
-                    request.session["temp_denominations"] = temp_denominations
 
                     success = f"Rs {balance:.2f} successfully added!"
 
-                request.session["temp_total"] = float(temp_total)
+                request.session["temp_total"] = temp_total.to_json()
                 request.session["temp_denominations"] = temp_denominations
 
             except ValueError as ve:
@@ -424,6 +339,23 @@ def balance_page(request):
 
 
 # -------- Receipt Page --------
+def receipt_context(receipt_data):
+    """Template context for the receipt stored in the session by checkout."""
+    ordered_items = [
+        {**item, 'price': Money.from_json(item['price']), 'cost': Money.from_json(item['cost'])}
+        for item in receipt_data['ordered_items']
+    ]
+    return {
+        'student_name': receipt_data['student_name'],
+        'campus': receipt_data['campus'],
+        'ordered_items': ordered_items,
+        'total_purchase': Money.from_json(receipt_data['total_purchase']),
+        'change': Money.from_json(receipt_data['change']),
+        'inserted_money': Money.from_json(receipt_data.get('inserted_money')),
+        'date': receipt_data['date']
+    }
+
+
 def receipt(request):
     try:
         receipt_data = request.session.get('receipt')
@@ -431,17 +363,17 @@ def receipt(request):
             logger.warning("No receipt data in session")
             return redirect('student_dashboard')
 
-        return render(request, 'receipt.html', {
-            'student_name': receipt_data['student_name'],
-            'campus': receipt_data['campus'],
-            'ordered_items': receipt_data['ordered_items'],
-            'total_purchase': receipt_data['total_purchase'],
-            'change': receipt_data['change'],
-            'inserted_money': receipt_data.get('inserted_money', 0),
-            'date': receipt_data['date']
-        })
+        return render(request, 'receipt.html', receipt_context(receipt_data))
     except Exception as e:
         logger.error(f"Error in receipt: {str(e)}")
         logger.error(traceback.format_exc())
         return redirect('student_dashboard')
-    
+
+
+# -------- Media --------
+def media(request, path):
+    """Serve MEDIA_ROOT (DEBUG only); content-hashed files are cached for a year."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if IMMUTABLE_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
@@ -1,26 +1,315 @@
-from rest_framework import viewsets
+from datetime import datetime, time, timedelta
+from django.db import connection, transaction
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+from rest_framework import status, viewsets
+from rest_framework.authentication import CSRFCheck
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
 from .models import Student, Product, AmountInserted, ChangeReturn, Order
 from .serializers import (
     StudentSerializer, ProductSerializer,
-    AmountInsertedSerializer, ChangeReturnSerializer, OrderSerializer
+    AmountInsertedSerializer, ChangeReturnSerializer, OrderSerializer,
+    CashInsertionSerializer, requested_expansions, requested_fields
 )
+from .pagination import TransactionCursorPagination
+from .catalog import CatalogImportError, catalog_version, get_catalog, upsert_products
+from .conditional import last_deleted, make_etag, not_modified, set_validators
+from .change import record_insertion
+from .money import Money
+from .rollups import cash_report, sales_report
+from .exports import FORMATS, ExportError, export_chunks
+from .sync import MAX_SYNC_PAGE_SIZE, SYNC_PAGE_SIZE, SyncCursorError, changes_since
 
-class StudentViewSet(viewsets.ModelViewSet):
+DELTA_PARAM = 'changed_since'
+
+class SparseFieldsMixin:
+    """
+    Only load the columns a ``?fields=`` request will serialize, and join the
+    relations an ``?expand=`` request inlines instead of fetching them per row.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        expanded = requested_expansions(self.request, self.get_serializer_class())
+        if expanded:
+            queryset = queryset.select_related(*sorted(expanded))
+
+        requested = requested_fields(self.request)
+        if requested:
+            concrete = {f.name for f in queryset.model._meta.concrete_fields}
+            columns = (requested & concrete) | expanded | {'id'}
+            if self.pagination_class is TransactionCursorPagination:
+                columns.add('date_time')
+            if DELTA_PARAM in self.request.query_params:
+                columns.add('updated_at')
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+class DeltaSyncMixin:
+    """
+    ``GET .../?changed_since=<cursor>`` sends only what changed since an
+    earlier sync: ``{"changed": [...], "deleted": [pk, ...], "cursor": ...,
+    "more": false}``. An empty cursor starts a full sync. While ``more`` is
+    true, ask again with the new cursor; keep the last one for next time.
+    A cursor older than the tombstones gets 410 Gone.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if DELTA_PARAM in request.query_params:
+            return self.delta(request)
+        return super().list(request, *args, **kwargs)
+
+    def delta(self, request):
+        try:
+            limit = int(request.query_params.get('page_size', SYNC_PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'page_size': 'Use a whole number.'})
+        limit = min(max(limit, 1), MAX_SYNC_PAGE_SIZE)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            rows, deleted, cursor, more = changes_since(queryset, request.query_params[DELTA_PARAM], limit)
+        except SyncCursorError as e:
+            if e.expired:
+                return Response({'detail': str(e)}, status=status.HTTP_410_GONE)
+            raise ValidationError({DELTA_PARAM: str(e)})
+
+        serializer = self.get_serializer(rows, many=True)
+        return Response({'cursor': cursor, 'more': more, 'changed': serializer.data, 'deleted': deleted})
+
+
+class ConditionalMixin:
+    """
+    Answer If-None-Match/If-Modified-Since with 304 before the queryset is
+    read or serialized. A paginated list is validated by the ids and
+    updated_at of the rows on the requested page, read with the same keyset
+    query as the page itself but only those columns, plus the last deletion
+    in the table; an unpaginated list by MAX(updated_at); a single object by
+    its own updated_at. Relations inlined with ``?expand=`` count too.
+    """
+
+    def stamp_columns(self, request):
+        expanded = requested_expansions(request, self.get_serializer_class())
+        return ['updated_at'] + [f'{relation}__updated_at' for relation in sorted(expanded)]
+
+    def list_validators(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = self.stamp_columns(request)
+        if self.pagination_class is None:
+            latest = queryset.order_by().aggregate(*(Max(column) for column in columns))
+            parts = [latest[f'{column}__max'] for column in columns]
+        else:
+            # A paginator of its own, so the one serving the page is untouched.
+            paginator = self.pagination_class()
+            ordering = [field.lstrip('-') for field in paginator.ordering]
+            page = paginator.paginate_queryset(queryset.values(*ordering, *columns), request, view=self)
+            parts = [row[column] for row in page for column in ('id', *columns)]
+        deleted = last_deleted(queryset.model)
+        stamps = [part.timestamp() for part in parts if isinstance(part, datetime)] + [deleted or 0]
+        return make_etag(request.get_full_path(), *parts, deleted), max(stamps) or None
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.list_validators(request)
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = set_validators(super().list(request, *args, **kwargs), etag, last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        stamps = (self.get_queryset().filter(**{self.lookup_field: lookup})
+                  .values_list(*self.stamp_columns(request)).first())
+        if stamps is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        updated = max(stamp for stamp in stamps if stamp)
+        etag = make_etag(request.get_full_path(), *stamps)
+        response = not_modified(request, etag, updated)
+        if response is None:
+            response = set_validators(super().retrieve(request, *args, **kwargs), etag, updated)
+        return response
+
+
+def _moment_param(request, name, default):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Use YYYY-MM-DD or an ISO 8601 date-time.'})
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class ExportMixin:
+    """
+    ``GET .../export/?output=csv|ndjson&since=&until=`` streams the whole
+    table, oldest first, without building it in memory.
+    """
+    export_table = None
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        table = self.export_table
+        fmt = request.query_params.get('output', 'csv')
+        since = _moment_param(request, 'since', None)
+        until = _moment_param(request, 'until', None)
+        try:
+            chunks = export_chunks(table, fmt, since, until)
+        except ExportError as e:
+            raise ValidationError({'output': str(e)})
+
+        response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{table}.{fmt}"'
+        return response
+
+
+class StudentViewSet(DeltaSyncMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all()
     serializer_class = StudentSerializer
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(DeltaSyncMixin, ConditionalMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
-class AmountInsertedViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        if DELTA_PARAM in request.query_params:
+            return self.delta(request)
+        # Kiosks poll this constantly; serve it from the catalog cache, and
+        # validate it by the catalog version so a 304 costs no query at all.
+        # No Last-Modified: the newest updated_at cannot see a deletion, while
+        # every save and delete moves the version.
+        version = catalog_version()
+        etag = make_etag(request.get_full_path(), version)
+        response = not_modified(request, etag)
+        if response is None:
+            serializer = self.get_serializer(get_catalog(version), many=True)
+            response = set_validators(Response(serializer.data), etag)
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Upsert many products keyed on product_id in one transaction, e.g.
+        ``[{"product_id": "P001", "qty": 20, "price": "12.50"}]``.
+        ``?dry_run=1`` reports what would change without writing.
+        """
+        rows = request.data.get('products') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'products': 'Send a list of products.'})
+        try:
+            summary = upsert_products(rows, dry_run=request.query_params.get('dry_run') in ('1', 'true'))
+        except CatalogImportError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(summary)
+
+class AmountInsertedViewSet(DeltaSyncMixin, ConditionalMixin, SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = AmountInserted.objects.all()
     serializer_class = AmountInsertedSerializer
+    pagination_class = TransactionCursorPagination
+    export_table = 'amountinserted'
 
-class ChangeReturnViewSet(viewsets.ModelViewSet):
+class ChangeReturnViewSet(DeltaSyncMixin, ConditionalMixin, SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = ChangeReturn.objects.all()
     serializer_class = ChangeReturnSerializer
+    pagination_class = TransactionCursorPagination
+    export_table = 'changereturn'
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(DeltaSyncMixin, ConditionalMixin, SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = TransactionCursorPagination
+    export_table = 'orders'
+
+class CSRFProtected(BasePermission):
+    """
+    Kiosk students are anonymous Django users, and SessionAuthentication only
+    checks CSRF for logged-in users; this checks it for everyone.
+    """
+
+    def has_permission(self, request, view):
+        check = CSRFCheck(lambda request: None)
+        check.process_request(request)
+        reason = check.process_view(request, None, (), {})
+        if reason:
+            raise PermissionDenied(f"CSRF Failed: {reason}")
+        return True
+
+
+@method_decorator(ensure_csrf_cookie, name='dispatch')
+class CashInsertionViewSet(viewsets.ViewSet):
+    """
+    POST a whole payment at once instead of one add_note/add_coin request per
+    piece. Credits the logged-in student's session balance. Needs the CSRF
+    token like the kiosk forms do.
+    """
+    permission_classes = [CSRFProtected]
+
+    def create(self, request):
+        student_id = request.session.get('student_id')
+        student = Student.objects.filter(id=student_id).first() if student_id else None
+        if student is None:
+            return Response({'detail': 'No student is logged in.'}, status=status.HTTP_403_FORBIDDEN)
+
+        serializer = CashInsertionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            # Two insertions for the same session must not both add to the
+            # balance they read before the other saved. The student row lock,
+            # or on SQLite the write lock taken at BEGIN IMMEDIATE, is held
+            # until commit, and the session is re-read under it.
+            if connection.features.has_select_for_update:
+                Student.objects.select_for_update().get(pk=student.pk)
+            inserted = record_insertion(student, serializer.validated_data)
+            session = request.session.__class__(request.session.session_key)
+            balance = Money.from_json(session.get('balance')) + inserted.total_amount
+            session['balance'] = balance.to_json()
+            session.persist()
+            session.save()
+
+        return Response({
+            'id': inserted.id,
+            'inserted': str(inserted.total_amount),
+            'balance': str(balance),
+        }, status=status.HTTP_201_CREATED)
+
+
+def report_params(request):
+    """``(since, until, by)`` of a report request; the last 24 hours by hour by default."""
+    until = _moment_param(request, 'until', timezone.now())
+    since = _moment_param(request, 'since', until - timedelta(days=1))
+    by = request.query_params.get('by', 'hour')
+    if by not in ('hour', 'day'):
+        raise ValidationError({'by': 'Must be "hour" or "day".'})
+    return since, until, by
+
+
+def report_payload(since, until, by, sales, cash):
+    for row in sales:
+        row['revenue'] = str(row['revenue'])
+    return {'since': since, 'until': until, 'by': by, 'sales': sales, 'cash': cash}
+
+
+class ReportViewSet(viewsets.ViewSet):
+    """
+    Sales and cash totals per hour or day, read from the rollup tables only.
+    ``?since=2026-10-01&until=2026-10-08&by=day``; defaults to the last 24
+    hours by hour.
+    """
+
+    def list(self, request):
+        since, until, by = report_params(request)
+        return Response(report_payload(since, until, by, sales_report(since, until, by), cash_report(since, until, by)))
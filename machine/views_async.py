@@ -0,0 +1,122 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from . import views
+from .catalog import acatalog_version, aget_catalog
+from .conditional import make_etag, not_modified, set_validators
+from .models import Student
+from .money import Money
+from .rollups import acash_report, asales_report
+from .serializers import ProductSerializer
+from .views_api import DELTA_PARAM, ProductViewSet, ReportViewSet, report_params, report_payload
+import logging
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Async versions of the read-heavy views, routed in place of the sync ones
+# when ASYNC_VIEWS is on (the ASGI profile, see vending_machine/asgi.py).
+# They read through the async ORM, session and cache APIs, so a slow query
+# parks a coroutine instead of holding a worker. Anything else (writes,
+# delta syncs, the browsable API) is handed to the sync view.
+sync_product_list = sync_to_async(ProductViewSet.as_view({'get': 'list', 'post': 'create'}))
+sync_report_list = sync_to_async(ReportViewSet.as_view({'get': 'list'}))
+
+# Templates are rendered in a thread: loading them and the {% cache %}
+# fragments read files, which would stall every coroutine on the loop.
+arender = sync_to_async(render)
+
+
+def _json(data, status=200):
+    response = HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _plain_read(request):
+    """A JSON GET, as kiosks send; browsers asking for HTML get DRF's browsable API."""
+    return (request.method in ('GET', 'HEAD')
+            and 'text/html' not in request.headers.get('Accept', '')
+            and request.GET.get('format', 'json') == 'json')
+
+
+# -------- API --------
+@csrf_exempt
+async def product_list(request):
+    if not _plain_read(request) or DELTA_PARAM in request.GET:
+        return await sync_product_list(request)
+
+    # Validated by the catalog version alone, as ProductViewSet.list is.
+    version = await acatalog_version()
+    etag = make_etag(request.get_full_path(), version)
+    response = not_modified(request, etag)
+    if response is None:
+        serializer = ProductSerializer(await aget_catalog(version), many=True, context={'request': Request(request)})
+        response = set_validators(_json(serializer.data), etag)
+    return response
+
+
+@csrf_exempt
+async def report_list(request):
+    if not _plain_read(request):
+        return await sync_report_list(request)
+    try:
+        since, until, by = report_params(Request(request))
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+    sales = await asales_report(since, until, by)
+    cash = await acash_report(since, until, by)
+    return _json(report_payload(since, until, by, sales, cash))
+
+
+# -------- Student Dashboard --------
+async def student_dashboard(request):
+    if request.method != 'GET':
+        return await sync_to_async(views.student_dashboard)(request)
+    try:
+        student_id = await request.session.aget('student_id')
+        if not student_id:
+            return redirect('student_login')
+
+        student = await aget_object_or_404(Student, id=student_id)
+        version = await acatalog_version()
+        balance = Money.from_json(await request.session.aget('balance'))
+
+        etag = views.dashboard_etag(request, student, balance, version)
+        response = not_modified(request, etag, private=True)
+        if response is not None:
+            return response
+
+        products = await aget_catalog(version)
+        response = await arender(request, 'student_dashboard.html', {
+            'student': student,
+            'products': products,
+            'catalog_version': version,
+            'balance': balance
+        })
+        return set_validators(response, etag, private=True)
+    except Exception as e:
+        logger.error(f"Error in student_dashboard: {str(e)}")
+        logger.error(traceback.format_exc())
+        return await arender(request, 'error.html', {
+            'error_message': 'An error occurred. Please try logging in again.'
+        })
+
+
+# -------- Receipt Page --------
+async def receipt(request):
+    try:
+        receipt_data = await request.session.aget('receipt')
+        if not receipt_data:
+            logger.warning("No receipt data in session")
+            return redirect('student_dashboard')
+        return await arender(request, 'receipt.html', views.receipt_context(receipt_data))
+    except Exception as e:
+        logger.error(f"Error in receipt: {str(e)}")
+        logger.error(traceback.format_exc())
+        return redirect('student_dashboard')
@@ -5,6 +5,21 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Uvicorn worker profile (the ``asgi`` entry in the Procfile)::
+
+    ASYNC_VIEWS=1 gunicorn vending_machine.asgi:application \
+        -k uvicorn_worker.UvicornWorker --workers 4
+
+- ASYNC_VIEWS=1 routes the dashboard GET, receipt, product list and
+  reports to machine/views_async.py. Every other view still works and runs
+  in a thread, so start with as many workers as the WSGI profile has.
+- Keep CONN_MAX_AGE at 0 (the default). Async views open their database
+  connections in worker threads that Django does not clean up, so a
+  persistent connection would never be closed.
+- One worker holds hundreds of idle kiosk connections, since a waiting
+  request costs a coroutine instead of a thread.
+- ``python manage.py bench_asgi`` compares this profile with the WSGI one.
 """
 
 import os
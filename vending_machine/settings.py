@@ -3,6 +3,7 @@ Django settings for vending_machine project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # --- BASE DIR ---
@@ -45,8 +46,9 @@ INSTALLED_APPS = [
 
 # --- MIDDLEWARE ---
 MIDDLEWARE = [
+    'machine.middleware.QueryCountMiddleware',  # off unless QUERY_COUNT_HEADER
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  
+    'machine.middleware.WhiteNoiseMiddleware',  # whitenoise, async capable
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,6 +78,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'vending_machine.wsgi.application'
 
+# Serve the dashboard, receipt, product list and reports with the async
+# views in machine/views_async.py. Only worth it under ASGI; see asgi.py.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# Send an X-DB-Queries header with every response (load testing only).
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', '').lower() in ('1', 'true', 'yes')
+
 
 # --- DATABASES ---
 DATABASES = {
@@ -85,6 +94,58 @@ DATABASES = {
     }
 }
 
+# Point at Postgres (or any other server) with DATABASE_URL, e.g. to run the
+# concurrency tests against a real multi-writer database.
+if os.environ.get('DATABASE_URL'):
+    import dj_database_url
+    DATABASES['default'] = dj_database_url.parse(os.environ['DATABASE_URL'])
+
+# SQLite starts transactions deferred, and a transaction that read first
+# cannot take the write lock while another writer holds it: it fails with
+# "database is locked" instead of waiting. IMMEDIATE takes the lock at BEGIN,
+# so concurrent checkouts queue for up to `timeout` seconds. The tests use a
+# file too, since an in-memory database never waits for its lock.
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update(transaction_mode='IMMEDIATE', timeout=20)
+    DATABASES['default'].setdefault('TEST', {}).setdefault(
+        'NAME', os.path.join(tempfile.gettempdir(), 'vending_machine_test.sqlite3'))
+
+
+# --- CACHE ---
+# File based so the gunicorn workers on one host share the catalog version.
+# Hosts do not share it; running on more than one host needs a shared backend
+# (Redis, Memcached), or a catalog edit on one host is never seen by the others.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/tmp/vending_machine_cache'),
+    },
+    # Kept apart from 'default' so catalog churn never culls a live session.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_DIR', '/tmp/vending_machine_sessions'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+
+# --- SESSIONS ---
+# Coin clicks only touch the cache; django_session is written on confirm or
+# every SESSION_FLUSH_INTERVAL seconds.
+SESSION_ENGINE = 'machine.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_FLUSH_INTERVAL = 30
+
+
+# --- STOCK HOLDS ---
+# Seconds a preview keeps stock aside before it goes back on the shelf.
+STOCK_HOLD_TTL = 120
+
+# --- CASH BOX ---
+# Pieces of every note and coin a new cash box starts with, and what
+# `manage.py refill_cash_box` resets it to after the float is topped up.
+CASH_FLOAT = int(os.environ.get('CASH_FLOAT', 20))
+
 # --- PASSWORD VALIDATION ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
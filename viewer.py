@@ -3,7 +3,17 @@ import sys
 import shutil
 import django
 import requests
+import hashlib
 import io
+import json
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
 from tkinter import *
 from tkinter import ttk, messagebox, filedialog
 from PIL import Image, ImageTk
@@ -34,6 +44,15 @@ TABLES = {
     "Order": Order
 }
 
+# API endpoint of each table, as registered in machine/urls.py.
+API_ENDPOINTS = {
+    "Student": "students",
+    "Product": "products",
+    "AmountInserted": "amountinserted",
+    "ChangeReturn": "changereturn",
+    "Order": "orders"
+}
+
 CRUD_TABLES = ["Student", "Product"]
 
 VISIBLE_FIELDS = {
@@ -44,11 +63,376 @@ VISIBLE_FIELDS = {
     "Order": ['student', 'product', 'date_time', 'amount_inserted', 'balance', 'total_purchase']
 }
 
+# --- Background loading ---
+PAGE_SIZE = 1000     # rows per API page (the transaction tables' maximum)
+APPLY_BATCH = 10000  # fetched rows added to the row store per UI tick
+POLL_MS = 15         # how often the UI thread picks up fetched rows
+FETCH_WORKERS = 4    # worker threads, and keep-alive connections to the API host
+
+# --- Table view ---
+# Only the rows in view exist as Treeview items; everything else stays in a RowStore
+ROW_HEIGHT = 20       # pixels, ttk's default Treeview row height
+WHEEL_ROWS = 3        # rows scrolled per mouse wheel notch
+FILTER_DELAY_MS = 250
+# Repeated values in a column (student ids, prices, categories) are stored
+# once; a column stops pooling after this many distinct values
+POOL_LIMIT = 4096
+
+# --- Product thumbnails ---
+THUMB_SIZE = (48, 36)               # pixels, shown in the Product table's first column
+THUMB_MEMORY_ITEMS = 512            # decoded thumbnails kept in memory (about 7 KB each)
+THUMB_DISK_BYTES = 50 * 1024 ** 2   # on-disk thumbnail cache limit
+THUMB_DIR = os.path.join(os.path.expanduser("~"), ".vending_viewer_thumbs")
+IMAGE_WORKERS = 4                   # concurrent image downloads and decodes
+
+# --- Local cache (API mode) ---
+# Tables are kept on disk between runs and refreshed with ?changed_since=
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".vending_viewer_cache.sqlite3")
+# Shown newest first (by date_time); rows new to these go on top
+NEWEST_FIRST = {"AmountInserted", "ChangeReturn", "Order"}
+
 # --- Media directory (for local mode) ---
 if not USE_API:
     MEDIA_DIR = os.path.join(BASE_DIR, "products", "products")
     os.makedirs(MEDIA_DIR, exist_ok=True)
 
+def local_values(obj, columns):
+    """Display values of a model instance (local ORM mode)."""
+    values = []
+    for field in columns:
+        val = getattr(obj, field)
+        if isinstance(val, models.Model):
+            val = str(val)
+        elif isinstance(val, timezone.datetime):
+            val = timezone.localtime(val).strftime("%Y-%m-%d %H:%M:%S")
+        elif field == "image" and val:
+            val = os.path.basename(str(val))
+        values.append(val)
+    return values
+
+
+def sort_key(value):
+    """Numbers (and numeric text such as "12.50") first, then text, then blanks."""
+    if value is None or value == "":
+        return (2, 0)
+    try:
+        return (0, float(value))
+    except (TypeError, ValueError):
+        return (1, str(value).lower())
+
+
+class RowStore:
+    """
+    The rows of the table on screen, kept column by column (one list per
+    column, rows addressed by position) instead of as one Treeview item or
+    dict per row. Sorting and filtering build ``order``, the positions the
+    table shows; without either, rows show in the order they were added,
+    those added on top first.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.data = [[] for _ in columns]
+        self.pools = [{} for _ in columns]
+        self.keys = []       # pk of each row, None once deleted
+        self.position = {}   # pk -> row
+        self.head = []       # rows added on top, oldest first
+        self.body = []       # rows added at the end
+        self.order = None    # shown rows when sorted or filtered
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ""
+
+    def __len__(self):
+        """Rows shown."""
+        return len(self.order) if self.order is not None else len(self.head) + len(self.body)
+
+    @property
+    def count(self):
+        """Rows held, shown or not."""
+        return len(self.position)
+
+    def row_at(self, index):
+        """The row shown at ``index``."""
+        if self.order is not None:
+            return self.order[index]
+        if index < len(self.head):
+            return self.head[len(self.head) - 1 - index]
+        return self.body[index - len(self.head)]
+
+    def values(self, row):
+        return [column[row] for column in self.data]
+
+    def apply(self, entries):
+        """Apply ``(pk, values, where)`` entries from a load; ``values`` None deletes the row."""
+        for pk, values, where in entries:
+            row = self.position.get(pk)
+            if values is None:
+                if row is not None:
+                    self.remove(row)
+            elif row is not None:
+                for column, value in zip(self.data, self.pooled(values)):
+                    column[row] = value
+            else:
+                row = len(self.keys)
+                self.keys.append(pk)
+                self.position[pk] = row
+                for column, value in zip(self.data, self.pooled(values)):
+                    column.append(value)
+                (self.head if where == 0 else self.body).append(row)
+                # Sorted views are re-sorted when the load finishes
+                if self.order is not None and self.matches(row):
+                    self.order.append(row)
+
+    def pooled(self, values):
+        """``values`` with each one replaced by the copy already stored in its column, if any."""
+        for index, (pool, value) in enumerate(zip(self.pools, values)):
+            if pool is not None:
+                value = pool.setdefault(value, value)
+                if len(pool) > POOL_LIMIT:
+                    self.pools[index] = None
+            yield value
+
+    def remove(self, row):
+        del self.position[self.keys[row]]
+        self.keys[row] = None
+        for column in self.data:
+            column[row] = None
+        for rows in (self.head, self.body, self.order or ()):
+            if row in rows:
+                rows.remove(row)
+
+    def matches(self, row):
+        if not self.filter_text:
+            return True
+        return any(self.filter_text in str(column[row]).lower() for column in self.data)
+
+    def filtered(self, rows):
+        """The ``rows`` that match the filter, testing each distinct value of a column once."""
+        found = bytearray(len(self.keys))
+        for column in self.data:
+            hits = {}
+            for row in rows:
+                if not found[row]:
+                    value = column[row]
+                    hit = hits.get(value)
+                    if hit is None:
+                        hit = hits[value] = self.filter_text in str(value).lower()
+                    if hit:
+                        found[row] = 1
+        return [row for row in rows if found[row]]
+
+    def set_filter(self, text):
+        text = text.strip().lower()
+        # Typing more only narrows the rows already shown
+        narrowing = self.order is not None and self.filter_text and text.startswith(self.filter_text)
+        self.filter_text = text
+        self.refresh(narrowing)
+
+    def sort_by(self, column):
+        """Sort by ``column``, or flip the direction if it is already the sort column."""
+        self.descending = not self.descending if self.sort_column == column else False
+        self.sort_column = column
+        self.refresh()
+
+    def refresh(self, narrowing=False):
+        """Rebuild ``order`` for the current sort and filter."""
+        if self.sort_column is None and not self.filter_text:
+            self.order = None
+            return
+        rows = self.order if narrowing else self.head[::-1] + self.body
+        if self.filter_text:
+            rows = self.filtered(rows)
+        if self.sort_column is not None and not narrowing:
+            column = self.data[self.columns.index(self.sort_column)]
+            rows.sort(key=lambda row: sort_key(column[row]), reverse=self.descending)
+        self.order = rows
+
+
+class ThumbnailCache:
+    """
+    Product image thumbnails for the table. ``get`` (Tk thread) returns a
+    PhotoImage from the in-memory LRU, or None after asking a worker to
+    fetch, decode and shrink the image. Workers keep the shrunken PNGs in
+    THUMB_DIR, least recently used deleted first, so an image is downloaded
+    once. Finished thumbnails come back through ``ready`` for the Tk thread
+    to turn into PhotoImages.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="viewer-thumbs")
+        self.memory = OrderedDict()   # source -> PhotoImage, most recently used last
+        self.pending = set()          # sources being fetched
+        self.wanted = set()           # sources on screen; others are skipped by the workers
+        self.failed = set()
+        self.ready = queue.Queue()
+        os.makedirs(THUMB_DIR, exist_ok=True)
+        self.lock = threading.Lock()
+        self.disk_bytes = sum(entry.stat().st_size for entry in os.scandir(THUMB_DIR) if entry.is_file())
+
+    # Tk thread
+    def get(self, source):
+        photo = self.memory.get(source)
+        if photo is not None:
+            self.memory.move_to_end(source)
+            return photo
+        if source not in self.pending and source not in self.failed:
+            self.pending.add(source)
+            self.executor.submit(self.load, source)
+        return None
+
+    def collect(self):
+        """Turn finished thumbnails into PhotoImages; returns how many arrived."""
+        arrived = 0
+        while True:
+            try:
+                source, image = self.ready.get_nowait()
+            except queue.Empty:
+                return arrived
+            self.pending.discard(source)
+            if image is None:
+                continue
+            if image is False:
+                self.failed.add(source)
+                continue
+            self.memory[source] = ImageTk.PhotoImage(image)
+            if len(self.memory) > THUMB_MEMORY_ITEMS:
+                self.memory.popitem(last=False)
+            arrived += 1
+
+    # Worker threads
+    def load(self, source):
+        if source not in self.wanted:
+            self.ready.put((source, None))  # scrolled away; asked for again if it comes back
+            return
+        path = os.path.join(THUMB_DIR, hashlib.sha256(source.encode()).hexdigest()[:32] + ".png")
+        try:
+            if os.path.exists(path):
+                os.utime(path)  # recently used
+                with Image.open(path) as image:
+                    image.load()
+            else:
+                image = self.shrink(self.read(source))
+                image.save(path, format="PNG", optimize=True)
+                self.stored(os.path.getsize(path))
+        except Exception:
+            self.ready.put((source, False))
+            return
+        self.ready.put((source, image))
+
+    def read(self, source):
+        if source.startswith(("http://", "https://")):
+            resp = self.session.get(source, timeout=20)
+            resp.raise_for_status()
+            return resp.content
+        with open(source, "rb") as f:
+            return f.read()
+
+    def shrink(self, data):
+        image = Image.open(io.BytesIO(data))
+        image.draft("RGB", THUMB_SIZE)  # JPEGs decode straight at a reduced size
+        image = image.convert("RGBA")
+        image.thumbnail(THUMB_SIZE, Image.LANCZOS)
+        return image
+
+    def stored(self, size):
+        """Account for a new file; past THUMB_DISK_BYTES, delete the least recently used down to 80%."""
+        with self.lock:
+            self.disk_bytes += size
+            if self.disk_bytes <= THUMB_DISK_BYTES:
+                return
+            entries = sorted((entry for entry in os.scandir(THUMB_DIR) if entry.is_file()),
+                             key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if self.disk_bytes <= THUMB_DISK_BYTES * 0.8:
+                    break
+                size = entry.stat().st_size
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                self.disk_bytes -= size
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TableCache:
+    """
+    Each table's rows as of its last sync, in SQLite, so a table can be shown
+    straight away and then brought up to date with only what changed since.
+    Every call opens its own connection, so worker threads can use it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self.connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    tbl TEXT PRIMARY KEY, columns TEXT NOT NULL, cursor TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS rows (
+                    tbl TEXT NOT NULL, pk TEXT NOT NULL, sort_key TEXT, data TEXT NOT NULL,
+                    PRIMARY KEY (tbl, pk));
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def cursor(self, table, columns):
+        """The sync cursor of ``table``, or None if it has not been synced with these columns."""
+        with self.connect() as db:
+            row = db.execute("SELECT columns, cursor FROM sync_state WHERE tbl = ?", (table,)).fetchone()
+        if row is None or json.loads(row[0]) != columns:
+            return None
+        return row[1]
+
+    def rows(self, table, batch_size):
+        """Yield the cached ``(pk, values)`` of ``table`` in display order, ``batch_size`` at a time."""
+        order = "sort_key DESC, CAST(pk AS INTEGER) DESC" if table in NEWEST_FIRST else "CAST(pk AS INTEGER)"
+        with self.connect() as db:
+            result = db.execute(f"SELECT pk, data FROM rows WHERE tbl = ? ORDER BY {order}", (table,))
+            while True:
+                batch = result.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield [(pk, json.loads(data)) for pk, data in batch]
+
+    def apply(self, table, columns, changed, deleted, cursor):
+        """Store one sync response (``changed`` as ``(pk, values)``) and its cursor in one transaction."""
+        sort_index = columns.index("date_time") if table in NEWEST_FIRST else None
+        with self.connect() as db:
+            db.executemany("DELETE FROM rows WHERE tbl = ? AND pk = ?", [(table, pk) for pk in deleted])
+            db.executemany(
+                "INSERT OR REPLACE INTO rows (tbl, pk, sort_key, data) VALUES (?, ?, ?, ?)",
+                [(table, pk, None if sort_index is None else values[sort_index], json.dumps(values))
+                 for pk, values in changed]
+            )
+            db.execute("INSERT OR REPLACE INTO sync_state (tbl, columns, cursor) VALUES (?, ?, ?)",
+                       (table, json.dumps(columns), cursor))
+
+    def clear(self, table):
+        with self.connect() as db:
+            db.execute("DELETE FROM rows WHERE tbl = ?", (table,))
+            db.execute("DELETE FROM sync_state WHERE tbl = ?", (table,))
+
+    def get(self, key):
+        with self.connect() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        with self.connect() as db:
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
 class DatabaseViewer:
     def __init__(self, root):
         self.root = root
@@ -68,6 +452,20 @@ class DatabaseViewer:
         self.table_menu = ttk.OptionMenu(self.ribbon, self.table_var, "Select Table", *TABLES.keys(), command=self.on_table_change)
         self.table_menu.pack(side=LEFT, padx=5, pady=5)
 
+        self.cancel_btn = Button(self.ribbon, text="Cancel", command=self.cancel_load, state=DISABLED)
+        self.cancel_btn.pack(side=LEFT, padx=5, pady=5)
+
+        Label(self.ribbon, text="Filter", bg='darkblue', fg="white").pack(side=LEFT, padx=(15, 2))
+        self.filter_var = StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.schedule_filter())
+        Entry(self.ribbon, textvariable=self.filter_var, width=20).pack(side=LEFT, pady=5)
+        self.filter_job = None
+
+        self.status_label = Label(self.ribbon, text="", bg='darkblue', fg="white")
+        self.status_label.pack(side=RIGHT, padx=10)
+        self.progress = ttk.Progressbar(self.ribbon, mode='indeterminate', length=120)
+        self.progress.pack(side=RIGHT, padx=5)
+
         self.table_label = Label(self.ribbon, text="", bg='darkblue', fg="white", font=("Arial", 16, "bold"))
         self.table_label.place(relx=0.5, rely=0.7, anchor=CENTER)
 
@@ -79,6 +477,37 @@ class DatabaseViewer:
         self.v_scrollbar = None
         self.h_scrollbar = None
 
+        # All rows of the table on screen; the tree only shows rows first..first+visible
+        self.store = RowStore([])
+        self.first = 0
+        self.visible = 1
+        self.selected = None
+        self.image_column = None
+
+        # The table on screen, once it is complete
+        self.loaded_table = None
+
+        # Tables are fetched on worker threads over one keep-alive session;
+        # the rows come back through a queue that the Tk thread drains in
+        # batches, so the window never waits on the network
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS + IMAGE_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="viewer-load")
+        self.pending = queue.Queue()
+        self.backlog = deque()
+        self.load_id = 0
+        self.cancel_event = threading.Event()
+        self.loading = False
+        self.fetch_done = False
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.cache = TableCache(CACHE_PATH) if USE_API else None
+        self.thumbs = ThumbnailCache(self.session)
+        self.thumbs_polling = False
+        self.row_height = ROW_HEIGHT
+        ttk.Style().configure("Thumbs.Treeview", rowheight=THUMB_SIZE[1] + 4)
+
         # CRUD frame
         self.crud_frame = Frame(root)
         self.crud_frame.pack(pady=8)
@@ -86,6 +515,12 @@ class DatabaseViewer:
         self.edit_btn = Button(self.crud_frame, text="Edit", command=self.edit_record)
         self.delete_btn = Button(self.crud_frame, text="Delete", command=self.delete_record)
 
+        # Reopen the last table from the cache straight away
+        last_table = self.cache.get("last_table") if self.cache else None
+        if last_table in TABLES:
+            self.table_var.set(last_table)
+            self.load_table()
+
     def on_table_change(self, value):
         self.load_table()
 
@@ -93,9 +528,129 @@ class DatabaseViewer:
         table_name = self.table_var.get()
         if table_name not in TABLES:
             return
+        # Refreshing the table on screen only applies what changed
+        on_screen = self.tree is not None and self.loaded_table == table_name and not self.loading
+        self.cancel_load()
         self.table_label.config(text=f"{table_name}")
-        model = TABLES[table_name]
 
+        self.load_id += 1
+        self.cancel_event = threading.Event()
+        self.loading = True
+        self.fetch_done = False
+        self.executor.submit(self.fetch_rows, self.load_id, self.cancel_event,
+                             table_name, VISIBLE_FIELDS[table_name], on_screen)
+
+        self.cancel_btn.config(state=NORMAL)
+        self.progress.start(10)
+        self.status_label.config(text=f"Loading {table_name}...")
+        self.root.after(POLL_MS, self.drain_rows, self.load_id)
+
+    def fetch_rows(self, load_id, cancelled, table_name, columns, on_screen):
+        """
+        Worker thread: queue the rows of ``table_name`` for the Tk thread as
+        ``(pk, values, where)``; ``values`` None means the row was deleted.
+        """
+        def post(kind, payload=None):
+            self.pending.put((load_id, kind, payload))
+
+        try:
+            if USE_API:
+                self.cache.set("last_table", table_name)
+                cursor = self.cache.cursor(table_name, columns)
+                if cursor is None:
+                    self.cache.clear(table_name)
+                    cursor = ""  # full sync
+                    post("start", (table_name, columns))
+                elif not on_screen:
+                    # Show the cached copy at once, then bring it up to date
+                    post("start", (table_name, columns))
+                    for batch in self.cache.rows(table_name, PAGE_SIZE):
+                        if cancelled.is_set():
+                            return
+                        post("rows", [(pk, values, "end") for pk, values in batch])
+                self.sync_table(table_name, columns, cursor, cancelled, post)
+            else:
+                post("start", (table_name, columns))
+                batch = []
+                for obj in TABLES[table_name].objects.all().iterator(chunk_size=PAGE_SIZE):
+                    if cancelled.is_set():
+                        break
+                    batch.append((str(obj.pk), local_values(obj, columns), "end"))
+                    if len(batch) == PAGE_SIZE:
+                        post("rows", batch)
+                        batch = []
+                post("rows", batch)
+        except Exception as e:
+            post("error", f"Failed to fetch {table_name} data:\n{e}")
+        finally:
+            if not USE_API:
+                django.db.connection.close()
+            post("done")
+
+    def sync_table(self, table_name, columns, cursor, cancelled, post):
+        """Worker thread: fetch what changed since ``cursor``, store it in the cache and queue it."""
+        api_endpoint = API_ENDPOINTS[table_name]
+        # Only ask for the columns we show, in as few pages as the API allows
+        params = {"fields": ",".join(["id", *columns]), "page_size": PAGE_SIZE}
+        where = 0 if table_name in NEWEST_FIRST else "end"
+        while not cancelled.is_set():
+            resp = self.session.get(f"{API_BASE_URL}{api_endpoint}/", params={**params, "changed_since": cursor})
+            if resp.status_code == 410:
+                # The cached copy is older than the server remembers deletions for
+                self.cache.clear(table_name)
+                post("start", (table_name, columns))
+                cursor = ""
+                continue
+            resp.raise_for_status()
+            data = resp.json()
+            changed = [(str(obj["id"]), [obj.get(field, "") for field in columns]) for obj in data["changed"]]
+            self.cache.apply(table_name, columns, changed, data["deleted"], data["cursor"])
+            post("rows", [(pk, None, None) for pk in data["deleted"]] +
+                         [(pk, values, where) for pk, values in changed])
+            cursor = data["cursor"]
+            if not data["more"]:
+                return
+
+    def drain_rows(self, load_id):
+        """Tk thread: apply what the worker has queued, at most APPLY_BATCH rows per tick."""
+        if load_id != self.load_id:
+            return
+        while True:
+            try:
+                message_id, kind, payload = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if message_id != load_id:
+                continue  # left over from a cancelled load
+            if kind == "start":
+                self.show_tree(*payload)
+            elif kind == "rows":
+                self.backlog.extend(payload)
+            elif kind == "error":
+                self.loaded_table = None
+                messagebox.showerror("API Error", payload)
+            elif kind == "done":
+                self.fetch_done = True
+
+        if self.backlog:
+            self.store.apply([self.backlog.popleft() for _ in range(min(APPLY_BATCH, len(self.backlog)))])
+            self.render()
+
+        if self.fetch_done and not self.backlog:
+            self.store.refresh()
+            self.render()
+            self.finish_load(self.row_status())
+        else:
+            self.status_label.config(text=f"{self.row_status()}...")
+            self.root.after(POLL_MS, self.drain_rows, load_id)
+
+    def row_status(self):
+        if len(self.store) != self.store.count:
+            return f"{len(self.store):,} of {self.store.count:,} rows"
+        return f"{self.store.count:,} rows"
+
+    def show_tree(self, table_name, columns):
+        """Replace the table on screen with an empty one for ``table_name``."""
         # destroy old treeview & scrollbars
         if self.tree:
             self.tree.destroy()
@@ -104,19 +659,24 @@ class DatabaseViewer:
         if self.h_scrollbar:
             self.h_scrollbar.destroy()
 
-        columns = VISIBLE_FIELDS[table_name]
-        self.v_scrollbar = Scrollbar(self.tree_frame, orient=VERTICAL)
+        self.v_scrollbar = Scrollbar(self.tree_frame, orient=VERTICAL, command=self.on_scroll)
         self.h_scrollbar = Scrollbar(self.tree_frame, orient=HORIZONTAL)
 
+        # Products get a thumbnail in the tree column
+        self.image_column = columns.index("image") if "image" in columns else None
+        self.row_height = THUMB_SIZE[1] + 4 if self.image_column is not None else ROW_HEIGHT
+
+        # The tree never holds more rows than fit, so it does not scroll vertically itself
         self.tree = ttk.Treeview(
             self.tree_frame,
             columns=columns,
-            show='headings',
-            yscrollcommand=self.v_scrollbar.set,
+            show='tree headings' if self.image_column is not None else 'headings',
+            style='Thumbs.Treeview' if self.image_column is not None else 'Treeview',
             xscrollcommand=self.h_scrollbar.set
         )
+        if self.image_column is not None:
+            self.tree.column("#0", width=THUMB_SIZE[0] + 16, stretch=False, anchor=CENTER)
 
-        self.v_scrollbar.config(command=self.tree.yview)
         self.h_scrollbar.config(command=self.tree.xview)
 
         self.tree.grid(row=0, column=0, sticky="nsew")
@@ -126,35 +686,26 @@ class DatabaseViewer:
         self.tree_frame.grid_columnconfigure(0, weight=1)
 
         for col in columns:
-            self.tree.heading(col, text=col)
+            self.tree.heading(col, text=col, command=lambda col=col: self.sort_by(col))
             self.tree.column(col, width=120, anchor=CENTER)
 
-        # Load data
-        if USE_API:
-            api_endpoint = table_name.lower() + "s"  # pluralized
-            url = f"{API_BASE_URL}{api_endpoint}/"
-            try:
-                resp = requests.get(url)
-                resp.raise_for_status()
-                data_list = resp.json()
-                for obj in data_list:
-                    values = [obj.get(field, "") for field in columns]
-                    self.tree.insert("", "end", values=values)
-            except Exception as e:
-                messagebox.showerror("API Error", f"Failed to fetch {table_name} data:\n{e}")
-        else:
-            for obj in model.objects.all():
-                values = []
-                for field in columns:
-                    val = getattr(obj, field)
-                    if isinstance(val, models.Model):
-                        val = str(val)
-                    elif isinstance(val, timezone.datetime):
-                        val = timezone.localtime(val).strftime("%Y-%m-%d %H:%M:%S")
-                    elif field == "image" and val:
-                        val = os.path.basename(str(val))
-                    values.append(val)
-                self.tree.insert("", "end", values=values)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_by(-WHEEL_ROWS if e.delta > 0 else WHEEL_ROWS))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(WHEEL_ROWS))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.scroll_by(self.visible))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(len(self.store)))
+        self.tree.bind("<Up>", lambda e: self.step_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.step_selection(1))
+
+        self.store = RowStore(columns)
+        self.store.set_filter(self.filter_var.get())
+        self.first = 0
+        self.selected = None
+        self.loaded_table = table_name
 
         # Show/hide CRUD buttons
         if table_name in CRUD_TABLES:
@@ -166,6 +717,148 @@ class DatabaseViewer:
             self.edit_btn.pack_forget()
             self.delete_btn.pack_forget()
 
+    # --- Virtual scrolling ---
+    def render(self):
+        """Show rows first..first+visible of the store as the tree's only items."""
+        if self.tree is None:
+            return
+        total = len(self.store)
+        self.first = max(0, min(self.first, total - self.visible))
+        last = min(self.first + self.visible, total)
+
+        self.tree.delete(*self.tree.get_children())
+        rows = [self.store.row_at(index) for index in range(self.first, last)]
+        if self.image_column is None:
+            for row in rows:
+                self.tree.insert("", "end", iid=self.store.keys[row], values=self.store.values(row))
+        else:
+            images = self.store.data[self.image_column]
+            self.thumbs.wanted = {self.image_source(images[row]) for row in rows if images[row]}
+            for row in rows:
+                photo = self.thumbs.get(self.image_source(images[row])) if images[row] else None
+                self.tree.insert("", "end", iid=self.store.keys[row], values=self.store.values(row),
+                                 image=photo or "")
+            if self.thumbs.pending and not self.thumbs_polling:
+                self.thumbs_polling = True
+                self.root.after(POLL_MS, self.collect_thumbnails)
+        if self.selected is not None and self.tree.exists(self.selected):
+            self.tree.selection_set(self.selected)
+
+        if total:
+            self.v_scrollbar.set(self.first / total, last / total)
+        else:
+            self.v_scrollbar.set(0, 1)
+
+    def image_source(self, value):
+        """Where the image of a Product row is: its media URL, or a file in local mode."""
+        if USE_API:
+            return urljoin(API_BASE_URL, str(value))
+        return os.path.join(MEDIA_DIR, os.path.basename(str(value)))
+
+    def collect_thumbnails(self):
+        """Tk thread: show thumbnails as the workers finish them."""
+        if self.thumbs.collect() and self.tree is not None and self.image_column is not None:
+            self.render()
+        if self.thumbs.pending:
+            self.root.after(POLL_MS, self.collect_thumbnails)
+        else:
+            self.thumbs_polling = False
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: ``moveto fraction`` or ``scroll n units|pages``."""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.store)))
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.visible)
+        else:
+            self.scroll_by(int(amount))
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.first + rows)
+        return "break"  # the tree's own bindings would scroll its few items
+
+    def scroll_to(self, first):
+        self.first = first
+        self.render()
+        return "break"
+
+    def on_resize(self, event):
+        visible = max(1, event.height // self.row_height - 1)  # less the heading row
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def on_select(self, event):
+        # Scrolling the selected row out of view empties the selection; keep it
+        selection = self.tree.selection()
+        if selection:
+            self.selected = selection[0]
+
+    def step_selection(self, step):
+        """Up/Down: move the selection, scrolling when it leaves the window."""
+        children = self.tree.get_children()
+        if not children:
+            return "break"
+        if self.selected in children:
+            index = self.first + children.index(self.selected) + step
+        else:
+            index = self.first
+        index = max(0, min(index, len(self.store) - 1))
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.visible:
+            self.first = index - self.visible + 1
+        self.selected = self.store.keys[self.store.row_at(index)]
+        self.render()
+        self.tree.focus(self.selected)
+        return "break"
+
+    # --- Sorting and filtering ---
+    def sort_by(self, column):
+        self.store.sort_by(column)
+        arrow = " \u25bc" if self.store.descending else " \u25b2"
+        for col in self.store.columns:
+            self.tree.heading(col, text=col + (arrow if col == column else ""))
+        self.first = 0
+        self.render()
+
+    def schedule_filter(self):
+        """Filter once typing pauses for FILTER_DELAY_MS."""
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_job = None
+        self.store.set_filter(self.filter_var.get())
+        self.first = 0
+        self.render()
+        if not self.loading:
+            self.status_label.config(text=self.row_status())
+
+    def finish_load(self, status):
+        self.loading = False
+        self.backlog.clear()
+        self.progress.stop()
+        self.cancel_btn.config(state=DISABLED)
+        self.status_label.config(text=status)
+
+    def cancel_load(self):
+        """Stop the load in progress; the rows already shown stay."""
+        if not self.loading:
+            return
+        self.cancel_event.set()
+        self.load_id += 1  # anything the worker still sends is dropped
+        # A partial table is rebuilt next time, not patched
+        self.loaded_table = None
+        self.finish_load(f"Cancelled after {self.store.count:,} rows")
+
+    def close(self):
+        self.cancel_load()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.thumbs.shutdown()
+        self.root.destroy()
+
     def add_record(self):
         table_name = self.table_var.get()
         if table_name == "Student":
@@ -196,10 +889,10 @@ class DatabaseViewer:
         record_id = record_values[0]
 
         if USE_API:
-            api_endpoint = table_name.lower() + "s"
+            api_endpoint = API_ENDPOINTS[table_name]
             url = f"{API_BASE_URL}{api_endpoint}/{record_id}/"
             try:
-                resp = requests.delete(url)
+                resp = self.session.delete(url)
                 if resp.status_code in (200, 204):
                     messagebox.showinfo("Deleted", "Record deleted successfully")
                     self.load_table()
@@ -240,7 +933,7 @@ class DatabaseViewer:
             }
             try:
                 if USE_API:
-                    resp = requests.post(f"{API_BASE_URL}students/", json=data)
+                    resp = self.session.post(f"{API_BASE_URL}students/", json=data)
                     resp.raise_for_status()
                 else:
                     Student.objects.create(**data)
@@ -258,7 +951,7 @@ class DatabaseViewer:
         student_id = record_values[0]
         if USE_API:
             try:
-                resp = requests.get(f"{API_BASE_URL}students/{student_id}/")
+                resp = self.session.get(f"{API_BASE_URL}students/{student_id}/")
                 resp.raise_for_status()
                 student = resp.json()
             except Exception as e:
@@ -287,7 +980,7 @@ class DatabaseViewer:
             }
             try:
                 if USE_API:
-                    resp = requests.put(f"{API_BASE_URL}students/{student_id}/", json=data)
+                    resp = self.session.put(f"{API_BASE_URL}students/{student_id}/", json=data)
                     resp.raise_for_status()
                 else:
                     obj = Student.objects.get(pk=student_id)
@@ -347,7 +1040,7 @@ class DatabaseViewer:
                 }
 
                 if USE_API:
-                    resp = requests.post(f"{API_BASE_URL}products/", json=data)
+                    resp = self.session.post(f"{API_BASE_URL}products/", json=data)
                     resp.raise_for_status()
                 else:
                     Product.objects.create(**data)
@@ -366,7 +1059,7 @@ class DatabaseViewer:
         product_id = record_values[0]
         if USE_API:
             try:
-                resp = requests.get(f"{API_BASE_URL}products/{product_id}/")
+                resp = self.session.get(f"{API_BASE_URL}products/{product_id}/")
                 resp.raise_for_status()
                 product = resp.json()
             except Exception as e:
@@ -423,7 +1116,7 @@ class DatabaseViewer:
                 }
 
                 if USE_API:
-                    resp = requests.put(f"{API_BASE_URL}products/{product_id}/", json=data)
+                    resp = self.session.put(f"{API_BASE_URL}products/{product_id}/", json=data)
                     resp.raise_for_status()
                 else:
                     obj = Product.objects.get(product_id=product_id)